@@ -3,8 +3,39 @@
 
 统一的图像生成能力，支持多个第三方供应商
 """
-from .skill import run, run_sync
-from .schema import ImageGenerationRequest, ImageGenerationResult
+import importlib
 
 __version__ = "1.0.0"
-__all__ = ["run", "run_sync", "ImageGenerationRequest", "ImageGenerationResult"]
+
+# 按需导入的名称 -> 所在模块（导入包本身不加载 asyncio、Provider 和 PyYAML）
+_LAZY = {
+    "run": ".skill",
+    "run_sync": ".skill",
+    "run_stream": ".skill",
+    "run_batch": ".skill",
+    "run_batch_sync": ".skill",
+    "BatchStats": ".skill",
+    "ImageGenerationRequest": ".schema",
+    "ImageGenerationResult": ".schema",
+    "ImageGenerationProgress": ".schema",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
+
+
+__all__ = [
+    "run",
+    "run_sync",
+    "run_stream",
+    "run_batch",
+    "run_batch_sync",
+    "BatchStats",
+    "ImageGenerationRequest",
+    "ImageGenerationResult",
+    "ImageGenerationProgress",
+]
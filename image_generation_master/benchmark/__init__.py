@@ -0,0 +1,15 @@
+"""
+基准测试工具
+本地模拟服务（stub_server）和吞吐量 / 延迟 / 资源占用测量（runner）
+"""
+from .stub_server import StubServer, StubSettings
+from .runner import run_benchmark, measure, percentile, format_report
+
+__all__ = [
+    "StubServer",
+    "StubSettings",
+    "run_benchmark",
+    "measure",
+    "percentile",
+    "format_report",
+]
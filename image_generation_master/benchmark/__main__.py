@@ -0,0 +1,7 @@
+"""
+python -m image_generation_master.benchmark
+"""
+from .runner import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+导入耗时测量
+用 python -X importtime 在全新的解释器中多次导入目标模块，取累计耗时的中位数，可设置预算用于 CI 检查
+
+使用方法：
+    python -m image_generation_master.benchmark.import_time
+    python -m image_generation_master.benchmark.import_time --module image_generation_master.skill --budget-ms 200
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+DEFAULT_MODULES = ("image_generation_master", "image_generation_master.skill")
+
+# 包所在目录（子进程的 PYTHONPATH）
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """解析 -X importtime 的输出，返回 [(模块名, 自身耗时 us, 累计耗时 us)]"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        entries.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return entries
+
+
+def measure_import(module: str, runs: int = 5, python: Optional[str] = None) -> Dict[str, Any]:
+    """
+    测量在全新解释器中导入 module 的耗时
+
+    Args:
+        module: 模块名
+        runs: 重复次数（取中位数）
+        python: 解释器路径，默认为当前解释器
+
+    Returns:
+        dict: module、median_ms、min_ms、max_ms、modules（导入的模块数）、
+              top（中位数那次运行中自身耗时最多的模块 [(名称, 毫秒)]）
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [_ROOT, env.get("PYTHONPATH")]))
+    samples = []
+    for _ in range(max(1, runs)):
+        proc = subprocess.run(
+            [python or sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr}")
+        entries = _parse_importtime(proc.stderr)
+        total = next((cumulative for name, _, cumulative in reversed(entries) if name == module), 0)
+        samples.append((total, entries))
+
+    samples.sort(key=lambda sample: sample[0])
+    totals = [total for total, _ in samples]
+    _, entries = samples[len(samples) // 2]
+    top = sorted(entries, key=lambda entry: entry[1], reverse=True)[:10]
+    return {
+        "module": module,
+        "median_ms": statistics.median(totals) / 1000,
+        "min_ms": totals[0] / 1000,
+        "max_ms": totals[-1] / 1000,
+        "modules": len(entries),
+        "top": [(name, self_us / 1000) for name, self_us, _ in top],
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="测量模块导入耗时")
+    parser.add_argument("--module", nargs="+", default=list(DEFAULT_MODULES), help="要测量的模块")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的测量次数")
+    parser.add_argument("--budget-ms", type=float, help="中位数超过该值（毫秒）时以退出码 1 结束")
+    parser.add_argument("--top", action="store_true", help="列出自身耗时最多的模块")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for module in args.module:
+        result = measure_import(module, args.runs)
+        status = ""
+        if args.budget_ms is not None:
+            over = result["median_ms"] > args.budget_ms
+            over_budget = over_budget or over
+            status = f"  ❌ 超出预算 {args.budget_ms:.0f}ms" if over else "  ✅"
+        print(
+            f"{module}: 中位数 {result['median_ms']:.1f}ms（{result['min_ms']:.1f}~{result['max_ms']:.1f}ms，"
+            f"{result['modules']} 个模块）{status}"
+        )
+        if args.top:
+            for name, ms in result["top"]:
+                print(f"    {ms:7.2f}ms  {name}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+基准测试
+在独立子进程中启动柏拉图 / GrsAI 模拟服务，通过 BLT_BASE_URL / GRSAI_BASE_URL 把客户端指向它们，
+分别测量 run() 和 run_batch() 的吞吐量、延迟分位数、CPU 时间和内存占用
+
+使用方法：
+    python -m image_generation_master.benchmark --requests 500 --concurrency 32 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .stub_server import StubSettings, serve_stubs
+
+# 场景名称 -> (供应商, 模型)
+SCENARIOS = {
+    "blt": ("blt", "nano-banana"),
+    "grsai": ("grsai", "nano-banana"),
+    "grsai-completions": ("grsai", "sora-image"),
+}
+
+MODES = ("run", "batch")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩法计算分位数（p 取 0~100）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(-(-p * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _cpu_seconds() -> float:
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss() -> int:
+    """进程的峰值常驻内存（字节），无法获取时为 0"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss() -> int:
+    """进程当前的常驻内存（字节），无法获取时为 0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _make_inputs(scenario: str, count: int, n: int, tag: str) -> Iterator[dict]:
+    provider, model = SCENARIOS[scenario]
+    for i in range(count):
+        # 每条提示词不同且关闭缓存，保证每个请求都真正发往服务端
+        yield {
+            "prompt": f"benchmark {tag} {i}",
+            "provider": provider,
+            "model": model,
+            "n": n,
+            "cache": False,
+        }
+
+
+async def _bench_run(inputs: Iterator[dict], concurrency: int, latencies: List[float]) -> List[dict]:
+    """用 run() 并发执行，最多 concurrency 个请求同时进行"""
+    from .. import run
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item: dict) -> dict:
+        async with semaphore:
+            start = time.monotonic()
+            result = await run(item)
+            latencies.append(time.monotonic() - start)
+            return result
+
+    return await asyncio.gather(*(one(item) for item in inputs))
+
+
+async def _bench_batch(inputs: Iterator[dict], concurrency: int, latencies: List[float]) -> List[dict]:
+    """用 run_batch() 执行，延迟为从拉取输入到产出结果的时间"""
+    from .. import run_batch
+
+    pulled: Dict[int, float] = {}
+
+    def tracked() -> Iterator[dict]:
+        for index, item in enumerate(inputs):
+            pulled[index] = time.monotonic()
+            yield item
+
+    results = []
+    async for index, result in run_batch(tracked(), concurrency=concurrency, per_provider={}):
+        latencies.append(time.monotonic() - pulled.pop(index))
+        results.append(result)
+    return results
+
+
+async def measure(
+    mode: str,
+    make_inputs: Callable[[], Iterator[dict]],
+    concurrency: int
+) -> Dict[str, Any]:
+    """
+    执行一轮测量
+
+    Args:
+        mode: run 或 batch
+        make_inputs: 返回输入迭代器的函数
+        concurrency: 并发数
+
+    Returns:
+        dict: 请求数、成功数、吞吐量、延迟分位数（毫秒）、CPU 时间和内存
+    """
+    bench = _bench_run if mode == "run" else _bench_batch
+    latencies: List[float] = []
+    cpu_start = _cpu_seconds()
+    start = time.monotonic()
+    results = await bench(make_inputs(), concurrency, latencies)
+    elapsed = time.monotonic() - start
+    cpu = _cpu_seconds() - cpu_start
+
+    succeeded = sum(1 for r in results if r.get("success"))
+    return {
+        "requests": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "cpu_seconds": cpu,
+        "cpu_ms_per_request": cpu * 1000 / len(results) if results else 0.0,
+        "rss_mb": _current_rss() / 1024 / 1024,
+        "peak_rss_mb": _peak_rss() / 1024 / 1024,
+    }
+
+
+async def run_benchmark(
+    scenarios: List[str],
+    modes: List[str],
+    requests: int,
+    concurrency: int,
+    n: int = 1,
+    warmup: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    对每个场景和模式执行测量（调用前需已将 BLT_BASE_URL / GRSAI_BASE_URL 指向模拟服务）
+
+    Returns:
+        List[dict]: 每轮测量的结果，包含 scenario 和 mode 字段
+    """
+    from ..providers import reload_provider
+
+    # 按当前环境变量重建 Provider 实例
+    for provider in {SCENARIOS[name][0] for name in scenarios}:
+        await reload_provider(provider)
+
+    reports = []
+    for scenario in scenarios:
+        for mode in modes:
+            if warmup:
+                await measure(mode, lambda: _make_inputs(scenario, warmup, n, f"warmup-{mode}"), concurrency)
+            report = await measure(mode, lambda: _make_inputs(scenario, requests, n, mode), concurrency)
+            report.update(scenario=scenario, mode=mode)
+            reports.append(report)
+    return reports
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    """格式化为文本表格"""
+    columns = [
+        ("场景", "scenario", "{}"),
+        ("模式", "mode", "{}"),
+        ("请求", "requests", "{}"),
+        ("失败", "failed", "{}"),
+        ("吞吐(req/s)", "throughput", "{:.1f}"),
+        ("p50(ms)", "p50_ms", "{:.1f}"),
+        ("p95(ms)", "p95_ms", "{:.1f}"),
+        ("p99(ms)", "p99_ms", "{:.1f}"),
+        ("CPU(ms/req)", "cpu_ms_per_request", "{:.2f}"),
+        ("RSS(MB)", "rss_mb", "{:.1f}"),
+        ("峰值RSS(MB)", "peak_rss_mb", "{:.1f}"),
+    ]
+    rows = [[title for title, _, _ in columns]]
+    for report in reports:
+        rows.append([fmt.format(report[key]) for _, key, fmt in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def start_stubs(settings: StubSettings) -> Tuple[multiprocessing.Process, Dict[str, str]]:
+    """在子进程中启动模拟服务，返回 (进程, {"blt": url, "grsai": url})"""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(target=serve_stubs, args=(settings, ready), daemon=True)
+    process.start()
+    try:
+        urls = ready.get(timeout=30)
+    except Exception:
+        process.terminate()
+        raise RuntimeError("模拟服务启动失败")
+    return process, urls
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="图像生成客户端基准测试（使用本地模拟服务）")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="测试场景")
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=list(MODES), help="run() 或 run_batch()")
+    parser.add_argument("--requests", type=int, default=200, help="每轮请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发数")
+    parser.add_argument("--n", type=int, default=1, help="每个请求生成的图片数")
+    parser.add_argument("--warmup", type=int, default=10, help="每轮之前的预热请求数（不计入结果）")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="模拟服务随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务错误率（0~1）")
+    parser.add_argument("--error-status", type=int, default=503, help="模拟错误的状态码")
+    parser.add_argument("--payload-size", type=int, default=0, help="响应填充字节数")
+    parser.add_argument("--sse-events", type=int, default=5, help="GrsAI SSE 进度帧数量")
+    parser.add_argument("--json", metavar="PATH", help="同时把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    settings = StubSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        payload_size=args.payload_size,
+        sse_events=args.sse_events
+    )
+    process, urls = start_stubs(settings)
+    os.environ["BLT_BASE_URL"] = urls["blt"]
+    os.environ["GRSAI_BASE_URL"] = urls["grsai"]
+    os.environ["BLT_API_KEY"] = "benchmark-key"
+    os.environ["GRSAI_API_KEY"] = "benchmark-key"
+    print(f"🚀 模拟服务: blt={urls['blt']} grsai={urls['grsai']}")
+
+    try:
+        reports = asyncio.run(run_benchmark(
+            args.scenario, args.mode, args.requests, args.concurrency, args.n, args.warmup
+        ))
+    finally:
+        process.terminate()
+        process.join()
+
+    print(format_report(reports))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings.to_dict(), "results": reports}, f, ensure_ascii=False, indent=2)
+        print(f"✅ 结果已写入 {args.json}")
@@ -0,0 +1,304 @@
+"""
+本地模拟服务
+模拟柏拉图 /v1/images/generations（JSON）和 GrsAI /v1/draw/completions、/v1/draw/nano-banana（SSE 流），
+可配置延迟、错误率和响应大小，用于在不调用真实 API 的情况下测量客户端自身的开销和吞吐量
+
+单独运行（然后通过 BLT_BASE_URL / GRSAI_BASE_URL 指向它）：
+    python -m image_generation_master.benchmark.stub_server --kind grsai --port 8802 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Optional, Dict, Any, Tuple
+
+BLT_ENDPOINTS = ("/v1/images/generations",)
+GRSAI_ENDPOINTS = ("/v1/draw/completions", "/v1/draw/nano-banana")
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class StubSettings:
+    """
+    模拟服务的行为配置
+
+    Args:
+        latency: 每个请求的基础延迟（秒）；SSE 流会把延迟平均分摊到各个进度帧之间
+        jitter: 额外的随机延迟上限（秒），实际延迟为 latency + uniform(0, jitter)
+        error_rate: 返回错误状态码的概率（0~1）
+        error_status: 错误时返回的状态码（429 时附带 Retry-After: 0）
+        payload_size: 最终结果中附加的填充字节数，用于模拟较大的响应
+        sse_events: GrsAI SSE 流在最终结果之前的进度帧数量
+        seed: 随机数种子，None 表示不固定
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        payload_size: int = 0,
+        sse_events: int = 5,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.payload_size = payload_size
+        self.sse_events = sse_events
+        self.seed = seed
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "payload_size": self.payload_size,
+            "sse_events": self.sse_events,
+            "seed": self.seed,
+        }
+
+
+class StubServer:
+    """
+    基于 asyncio 的 keep-alive HTTP/1.1 模拟服务
+
+    使用示例：
+        server = StubServer("grsai", StubSettings(latency=0.2))
+        await server.start()
+        os.environ["GRSAI_BASE_URL"] = server.url
+        ...
+        await server.close()
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        settings: Optional[StubSettings] = None,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        if kind not in ("blt", "grsai"):
+            raise ValueError(f"未知的模拟服务类型: {kind}")
+        self.kind = kind
+        self.settings = settings or StubSettings()
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(self.settings.seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        """服务的基础 URL"""
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        """开始监听（port 为 0 时自动分配端口）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """停止监听"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        """持续运行直到被取消"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def stats(self) -> Dict[str, int]:
+        """返回已处理的请求数和注入的错误数"""
+        return {"requests": self.requests, "errors": self.errors}
+
+    def _delay(self) -> float:
+        settings = self.settings
+        return settings.latency + (self._random.uniform(0, settings.jitter) if settings.jitter else 0.0)
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        method, path = lines[0].split(" ")[:2]
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                self.requests += 1
+                await self._dispatch(writer, method, path, headers, body)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, writer, method: str, path: str, headers: Dict[str, str], body: bytes):
+        endpoints = BLT_ENDPOINTS if self.kind == "blt" else GRSAI_ENDPOINTS
+        if method != "POST" or path not in endpoints:
+            self._write_json(writer, 404, {"error": f"未知的端点: {method} {path}"})
+            return
+        if not headers.get("authorization", "").startswith("Bearer "):
+            self._write_json(writer, 401, {"error": "缺少 API Key"})
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._write_json(writer, 400, {"error": "请求体不是合法 JSON"})
+            return
+
+        if self.settings.error_rate and self._random.random() < self.settings.error_rate:
+            self.errors += 1
+            await asyncio.sleep(self._delay())
+            extra = {"Retry-After": "0"} if self.settings.error_status == 429 else None
+            self._write_json(writer, self.settings.error_status, {"error": "模拟错误"}, extra)
+            return
+
+        if self.kind == "blt":
+            await asyncio.sleep(self._delay())
+            count = int(payload.get("n") or 1)
+            self._write_json(writer, 200, {
+                "created": 0,
+                "data": [{"url": f"{self.url}/images/{self.requests}-{i}.png"} for i in range(count)],
+                "padding": "x" * self.settings.payload_size,
+            })
+        else:
+            await self._write_sse(writer, payload)
+
+    async def _write_sse(self, writer: asyncio.StreamWriter, payload: Dict[str, Any]):
+        """分块发送 GrsAI 风格的 SSE 进度帧和最终结果"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        events = max(0, self.settings.sse_events)
+        step = self._delay() / (events + 1)
+        for index in range(events):
+            await asyncio.sleep(step)
+            if writer.is_closing():
+                # 客户端已断开（如取消了请求）
+                return
+            progress = {"status": "running", "progress": int(100 * (index + 1) / (events + 1))}
+            self._write_chunk(writer, b"data: " + json.dumps(progress).encode() + b"\n\n")
+            await writer.drain()
+        await asyncio.sleep(step)
+
+        count = int(payload.get("variants") or 1)
+        final = {
+            "status": "succeeded",
+            "progress": 100,
+            "results": [{"url": f"{self.url}/images/{self.requests}-{i}.png"} for i in range(count)],
+            "padding": "x" * self.settings.payload_size,
+        }
+        self._write_chunk(writer, b"data: " + json.dumps(final).encode() + b"\n\n")
+        writer.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    @staticmethod
+    def _write_json(writer: asyncio.StreamWriter, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        for name, value in (headers or {}).items():
+            head.append(f"{name}: {value}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+
+def serve_stubs(settings: StubSettings, ready, host: str = "127.0.0.1"):
+    """
+    在当前进程中同时运行柏拉图和 GrsAI 模拟服务，直到进程被终止
+
+    供基准测试在独立子进程中启动模拟服务，避免服务端开销计入客户端的 CPU 统计。
+
+    Args:
+        settings: 模拟服务配置
+        ready: 启动后放入 {"blt": url, "grsai": url} 的队列
+        host: 监听地址
+    """
+    async def main():
+        servers = [StubServer("blt", settings, host), StubServer("grsai", settings, host)]
+        for server in servers:
+            await server.start()
+        ready.put({server.kind: server.url for server in servers})
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+    asyncio.run(main())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="柏拉图 / GrsAI 本地模拟服务")
+    parser.add_argument("--kind", choices=["blt", "grsai"], required=True, help="模拟的平台")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=0, help="监听端口（0 表示自动分配）")
+    parser.add_argument("--latency", type=float, default=0.05, help="基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="错误率（0~1）")
+    parser.add_argument("--error-status", type=int, default=503, help="错误状态码")
+    parser.add_argument("--payload-size", type=int, default=0, help="响应填充字节数")
+    parser.add_argument("--sse-events", type=int, default=5, help="SSE 进度帧数量")
+    args = parser.parse_args(argv)
+
+    settings = StubSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        payload_size=args.payload_size,
+        sse_events=args.sse_events
+    )
+
+    async def serve():
+        server = StubServer(args.kind, settings, args.host, args.port)
+        await server.start()
+        print(f"🚀 {args.kind} 模拟服务: {server.url}", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,9 @@
 #   ./generate.sh "一只可爱的橘猫"
 #   ./generate.sh "赛博朋克城市" --model flux-pro --size 1024x1024
 #   ./generate.sh "风景画" --aspect-ratio 16:9 --n 2
+#
+# 如果常驻服务（python3 -m image_generation_master.server）正在运行，
+# 请求会通过 Unix 套接字（$IMAGE_GEN_SOCKET）发给服务，否则在进程内执行
 ###############################################################################
 
 # 默认值
@@ -126,10 +129,45 @@ fi
 
 JSON_INPUT="$JSON_INPUT }"
 
+# 常驻服务运行时直接通过 Unix 套接字调用，免去解释器启动和导入开销
+SOCKET_PATH="${IMAGE_GEN_SOCKET:-$HOME/.cache/image_generation_master/daemon.sock}"
+
+if [ -S "$SOCKET_PATH" ] && command -v curl >/dev/null 2>&1; then
+    # 只有确定请求没有被服务执行时才回退到进程内执行，避免同一请求生成（并计费）两次：
+    # 连接被拒绝（curl 退出码 7，服务已退出但套接字文件残留）或 /readyz 返回 503（启动中或正在停止）
+    READY=$(curl -s -o /dev/null -w "%{http_code}" --unix-socket "$SOCKET_PATH" "http://localhost/readyz")
+    CURL_EXIT=$?
+    if [ $CURL_EXIT -ne 7 ] && [ "$READY" != "503" ]; then
+        RESPONSE=$(curl -s --unix-socket "$SOCKET_PATH" \
+            -H "Content-Type: application/json" \
+            --data-binary "$JSON_INPUT" \
+            -w "\n%{http_code}" \
+            "http://localhost/run?pretty=1")
+        CURL_EXIT=$?
+        HTTP_CODE="${RESPONSE##*$'\n'}"
+        RESULT="${RESPONSE%$'\n'*}"
+        if [ $CURL_EXIT -eq 0 ] && [ "$HTTP_CODE" = "200" ]; then
+            echo "$RESULT"
+            echo ""
+            echo "✅ 生成完成！"
+            exit 0
+        fi
+        if [ $CURL_EXIT -ne 7 ]; then
+            # 请求可能已经发给上游，返回服务的错误响应而不是重新执行
+            if [ $CURL_EXIT -eq 0 ] && [ -n "$RESULT" ]; then
+                echo "$RESULT"
+            else
+                echo "{\"success\": false, \"images\": [], \"provider\": null, \"model\": null, \"message\": \"常驻服务请求失败（curl 退出码 $CURL_EXIT）\"}"
+            fi
+            exit 1
+        fi
+    fi
+fi
+
 # 获取脚本所在目录
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
-# 调用 Python 代码
+# 未运行常驻服务时在进程内执行
 cd "$SCRIPT_DIR/.." || exit 1
 
 python3 -c "
@@ -1,18 +1,33 @@
 """
-模型适配器包初始化
+模型适配器包初始化（各模块在首次使用时才导入）
 """
-from .blt_adapters import (
-    build_request as blt_build_request,
-    get_supported_models as blt_get_supported_models
-)
-from .grsai_mapper import (
-    get_endpoint_for_model,
-    get_supported_models as grsai_get_supported_models
-)
+import importlib
+
+# 名称 -> (所在模块, 模块中的名称)
+_LAZY = {
+    "blt_build_request": (".blt_adapters", "build_request"),
+    "blt_get_supported_models": (".blt_adapters", "get_supported_models"),
+    "blt_supports_native_n": (".blt_adapters", "supports_native_n"),
+    "get_endpoint_for_model": (".grsai_mapper", "get_endpoint_for_model"),
+    "grsai_get_supported_models": (".grsai_mapper", "get_supported_models"),
+    "grsai_supports_native_n": (".grsai_mapper", "supports_native_n"),
+    "get_equivalent_models": (".equivalence", "get_equivalent_models"),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module, attr = _LAZY[name]
+    return getattr(importlib.import_module(module, __name__), attr)
+
 
 __all__ = [
     "blt_build_request",
     "blt_get_supported_models",
+    "blt_supports_native_n",
     "get_endpoint_for_model",
-    "grsai_get_supported_models"
+    "grsai_get_supported_models",
+    "grsai_supports_native_n",
+    "get_equivalent_models"
 ]
@@ -32,6 +32,9 @@ def register_adapter(*names: str):
 class BaseAdapter(ABC):
     """适配器基类"""
     
+    # 接口是否支持 n 参数（不支持时由编排层拆分为多个单图请求）
+    supports_n: bool = True
+    
     @abstractmethod
     def build_payload(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -52,6 +55,8 @@ class BaseAdapter(ABC):
 class NanoBananaAdapter(BaseAdapter):
     """Nano Banana 系列模型适配器"""
     
+    supports_n = False
+    
     def build_payload(self, request: Dict[str, Any]) -> Dict[str, Any]:
         payload_data = {
             "model": request["model"],
@@ -141,6 +146,8 @@ class FluxKontextAdapter(BaseAdapter):
 class FluxAdapter(BaseAdapter):
     """Flux 系列模型适配器"""
     
+    supports_n = False
+    
     def build_payload(self, request: Dict[str, Any]) -> Dict[str, Any]:
         # 与 FluxKontext 一致：优先使用 size；若仅传入 aspect_ratio 则做映射
         size = request.get("size")
@@ -192,6 +199,12 @@ def build_request(request: Dict[str, Any]) -> Dict[str, Any]:
     return adapter.build_payload(request)
 
 
+def supports_native_n(model: str) -> bool:
+    """检查模型接口是否支持一次生成多张图片（未知模型返回 True，错误由 build_request 报告）"""
+    adapter = ADAPTER_REGISTRY.get(model)
+    return adapter is None or adapter.supports_n
+
+
 def get_supported_models() -> list:
     """返回所有支持的模型名称"""
     return list(ADAPTER_REGISTRY.keys())
@@ -0,0 +1,52 @@
+"""
+跨平台等价模型表
+声明不同供应商上可以相互替代的模型，用于故障转移
+"""
+from typing import List, Tuple
+
+from ..utils.config_loader import get_config
+
+
+# === 等价模型组 ===
+# 同一组内的 (供应商, 模型) 生成效果相当，可以互相替代
+EQUIVALENT_MODEL_GROUPS: List[List[Tuple[str, str]]] = [
+    [("blt", "nano-banana"), ("grsai", "nano-banana")],
+    [("blt", "sora_image"), ("grsai", "sora-image")],
+]
+
+
+def _parse_entry(entry: str) -> Tuple[str, str]:
+    """解析配置中的 "provider:model" 条目"""
+    provider, sep, model = entry.partition(":")
+    if not sep or not provider or not model:
+        raise ValueError(f"等价模型条目格式应为 'provider:model'，实际为: {entry}")
+    return provider.strip().lower(), model.strip()
+
+
+def get_equivalent_groups() -> List[List[Tuple[str, str]]]:
+    """返回内置等价组与配置 routing.equivalents 中声明的等价组"""
+    groups = list(EQUIVALENT_MODEL_GROUPS)
+    for group in get_config().get_routing_equivalents():
+        groups.append([_parse_entry(entry) for entry in group])
+    return groups
+
+
+def get_equivalent_models(provider: str, model: str) -> List[Tuple[str, str]]:
+    """
+    获取与指定模型等价的其他平台模型
+
+    Args:
+        provider: 供应商名称
+        model: 模型名称
+
+    Returns:
+        List[Tuple[provider, model]]: 等价模型列表（不含自身，按声明顺序）
+    """
+    target = (provider.lower(), model)
+    result: List[Tuple[str, str]] = []
+    for group in get_equivalent_groups():
+        if target in group:
+            for item in group:
+                if item != target and item not in result:
+                    result.append(item)
+    return result
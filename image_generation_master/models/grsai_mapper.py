@@ -49,7 +49,8 @@ def get_endpoint_for_model(model: str) -> str:
             f"不支持的模型: {model}，"
             f"支持的模型: {supported}"
         )
-    return endpoint
+    # 返回纯字符串：Python 3.11+ 中 str 混入的 Enum 在 f-string 里会格式化为成员名
+    return GrsaiEndpoint(endpoint).value
 
 
 def get_supported_models() -> list:
@@ -65,3 +66,13 @@ def is_nano_banana_endpoint(model: str) -> bool:
 def is_completions_endpoint(model: str) -> bool:
     """检查模型是否使用 completions 端点"""
     return MODEL_ENDPOINT_MAPPING.get(model) == GrsaiEndpoint.COMPLETIONS
+
+
+def supports_native_n(model: str) -> bool:
+    """
+    检查模型端点是否支持一次生成多张图片
+
+    completions 端点通过 variants 参数支持，nano-banana 端点每次只返回一张；
+    未知模型返回 True（错误由 get_endpoint_for_model 报告）
+    """
+    return MODEL_ENDPOINT_MAPPING.get(model) != GrsaiEndpoint.NANO_BANANA
@@ -1,25 +1,57 @@
 """
 Providers 包初始化
-自动注册所有可用的 Provider
+自动注册所有可用的 Provider（具体实现在首次使用时才导入）
 """
+import importlib
+
 from .base import BaseProvider
-from .blt_provider import BltProvider
-from .grsai_provider import GrsaiProvider
+from .health import get_health_tracker
+from .hedging import get_hedge_policy
 from .registry import (
     register_provider,
     get_provider,
-    list_providers
+    aget_provider,
+    resolve_provider_name,
+    get_failover_chain,
+    list_providers,
+    startup_providers,
+    warmup_providers,
+    reload_provider,
+    close_providers
 )
 
 # 自动注册所有 Provider
-register_provider("blt", BltProvider)
-register_provider("grsai", GrsaiProvider)
+register_provider("blt", ".blt_provider:BltProvider")
+register_provider("grsai", ".grsai_provider:GrsaiProvider")
+
+# 按需导入的名称 -> 所在模块
+_LAZY = {
+    "BltProvider": ".blt_provider",
+    "GrsaiProvider": ".grsai_provider",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
+
 
 __all__ = [
     "BaseProvider",
+    "get_health_tracker",
+    "get_hedge_policy",
     "BltProvider",
     "GrsaiProvider",
     "register_provider",
     "get_provider",
+    "aget_provider",
+    "resolve_provider_name",
+    "get_failover_chain",
     "list_providers",
+    "startup_providers",
+    "warmup_providers",
+    "reload_provider",
+    "close_providers",
 ]
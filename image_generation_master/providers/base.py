@@ -2,8 +2,23 @@
 Provider 抽象基类
 定义所有图像生成供应商必须实现的接口
 """
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from typing import Optional, List, Tuple
 from ..schema import ImageGenerationRequest, ImageGenerationResult
+from ..utils.config_loader import get_config
+from ..utils.result_cache import get_result_cache, make_cache_key
+from ..utils.singleflight import get_singleflight
+from ..utils.retry import get_retry_policy
+from ..utils.circuit_breaker import get_circuit_breakers
+from ..utils.rate_limiter import get_rate_limiters
+from ..utils.adaptive_concurrency import get_adaptive_limiters
+from ..utils.key_pool import get_key_pools
+from ..utils.image_store import get_image_store
+from ..utils.reference_images import get_reference_encoder, is_local_reference
+from ..utils.metrics import QUEUE_WAIT, SINGLEFLIGHT_SHARED
+from ..utils.tracing import span
 
 
 class BaseProvider(ABC):
@@ -18,6 +33,9 @@ class BaseProvider(ABC):
     # Provider 支持的模型列表（用于验证）
     supported_models: list = []
     
+    # 端点是否接受 data URI 形式的参考图片（为 True 时本地文件和字节会被编码后放入载荷）
+    accepts_inline_images: bool = False
+    
     @abstractmethod
     async def generate(self, request: ImageGenerationRequest) -> ImageGenerationResult:
         """
@@ -31,6 +49,212 @@ class BaseProvider(ABC):
         """
         pass
     
+    async def _call_api(self, payload: dict, endpoint: str, api_key: Optional[str] = None) -> dict:
+        """
+        调用供应商 API（由使用 _execute 的子类实现）
+        
+        Args:
+            payload: 最终请求载荷
+            endpoint: API 端点路径
+            api_key: 本次调用从 Key 池中分配的 API Key
+            
+        Returns:
+            dict: API 原始响应
+        """
+        raise NotImplementedError
+    
+    def _parse_response(self, api_response: dict, model: Optional[str]) -> ImageGenerationResult:
+        """
+        将 API 原始响应解析为统一结果（由使用 _execute 的子类实现）
+        """
+        raise NotImplementedError
+    
+    async def _execute(
+        self,
+        request: ImageGenerationRequest,
+        endpoint: str,
+        payload: dict,
+        model: Optional[str]
+    ) -> ImageGenerationResult:
+        """
+        发送已构建好的载荷并解析结果
+        
+        子类在 generate() 中完成参数标准化和载荷构建后调用此方法，
+        缓存、相同请求合并、熔断、限流、并发控制、重试等通用逻辑统一在这里处理。
+        调用最终失败时抛出的异常带有 attempts 属性（已尝试次数）。
+        request.cache 为 False 时表示需要全新结果，同时跳过缓存和请求合并。
+        启用下载时，解析出的图片会并发下载到本地，路径和大小记录在 result.files。
+        
+        Args:
+            request: 统一请求（用于读取单次请求的开关）
+            endpoint: API 端点路径
+            payload: 最终请求载荷
+            model: 结果中记录的模型名称
+            
+        Returns:
+            ImageGenerationResult: 生成结果
+        """
+        cache = get_result_cache()
+        use_cache = cache.enabled if request.cache is None else request.cache
+        dedupe = request.cache is not False and get_config().get_dedupe_enabled()
+        key = make_cache_key(self.name, endpoint, payload) if use_cache or dedupe else None
+        cache_key = key if use_cache else None
+        
+        if cache_key:
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                result = ImageGenerationResult(
+                    success=True,
+                    images=cached["images"],
+                    provider=self.name,
+                    model=cached.get("model", model),
+                    raw_response=cached.get("raw_response"),
+                    cached=True
+                )
+                # 缓存中记录的本地文件仍存在时直接复用
+                await self._materialize(request, result, cached.get("files"))
+                return result
+        
+        config = get_config()
+        breaker = None
+        if config.get_circuit_enabled():
+            breaker = get_circuit_breakers().get(self.name, endpoint)
+            # 端点已熔断时立即失败，不进入重试
+            breaker.check()
+        adaptive = get_adaptive_limiters().get(self.name, model) if config.get_adaptive_enabled() else None
+        
+        keys = get_key_pools().get(self.name, self.get_api_keys())
+        
+        async def attempt(api_key, queued):
+            wait = time.monotonic() - queued
+            QUEUE_WAIT.observe(wait, provider=self.name)
+            with span(f"{self.name}._call_api", endpoint=endpoint, queue_wait=wait):
+                if breaker is None:
+                    return await self._call_api(payload, endpoint, api_key)
+                return await breaker.call(lambda: self._call_api(payload, endpoint, api_key))
+        
+        async def send():
+            # 每次尝试（含重试）都重新分配 Key，并经过限流和并发控制
+            key = keys.acquire() if keys else None
+            api_key = key.key if key else None
+            queued = time.monotonic()
+            error = None
+            try:
+                async with get_rate_limiters().acquire(self.name, api_key, model):
+                    if adaptive is None:
+                        return await attempt(api_key, queued)
+                    return await adaptive.call(lambda: attempt(api_key, queued))
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if key:
+                    keys.release(key, error)
+        
+        async def call():
+            return await get_retry_policy(self.name).call(send)
+        
+        if dedupe:
+            # 相同载荷的进行中请求共享同一次 API 调用，各自独立解析结果
+            (api_response, attempts), shared = await get_singleflight().do(key, call)
+            if shared:
+                SINGLEFLIGHT_SHARED.inc(provider=self.name)
+        else:
+            api_response, attempts = await call()
+        with span(f"{self.name}._parse_response"):
+            result = self._parse_response(api_response, model)
+        result.attempts = attempts
+        await self._materialize(request, result)
+        
+        if cache_key and result.success:
+            await cache.aset(cache_key, {
+                "images": result.images,
+                "model": result.model,
+                "raw_response": result.raw_response,
+                "files": result.files,
+            })
+        return result
+    
+    async def _materialize(
+        self,
+        request: ImageGenerationRequest,
+        result: ImageGenerationResult,
+        known: Optional[List[dict]] = None
+    ):
+        """
+        按请求开关（未指定时跟随配置）把成功结果的图片下载到本地
+        
+        Args:
+            request: 统一请求
+            result: 解析后的结果，下载信息写入 result.files
+            known: 之前保存过的文件条目
+        """
+        download = get_config().get_download_enabled() if request.download is None else request.download
+        if download and result.success and result.images:
+            result.files = await get_image_store().materialize(result.images, known)
+    
+    async def startup(self):
+        """
+        启动钩子
+        注册表在首次通过 aget_provider()、startup_providers() 或 warmup_providers() 交出实例前调用一次，
+        并发的首次请求等待同一次调用；抛出异常时下次获取会重试。子类可在此初始化长期持有的资源
+        """
+        pass
+    
+    async def warmup(self):
+        """
+        预热钩子
+        子类可在此提前建立连接等，以降低首个请求的延迟
+        """
+        pass
+    
+    async def aclose(self):
+        """
+        关闭钩子
+        实例被替换或注册表关闭时调用。实现不应中断仍在进行中的请求
+        """
+        pass
+    
+    def get_api_keys(self) -> List[Tuple[str, float]]:
+        """返回可用的 API Key 列表 [(key, weight)]，由 _execute 按 Key 池分配"""
+        return []
+    
+    def endpoint_for(self, model: Optional[str]) -> Optional[str]:
+        """
+        返回模型请求的 API 端点路径，用于按端点查询熔断状态
+        
+        Returns:
+            Optional[str]: 端点路径，未知时返回 None
+        """
+        return None
+    
+    def supports_native_n(self, model: Optional[str]) -> bool:
+        """
+        模型端点是否支持一次生成多张图片（n 参数）
+
+        返回 False 时，编排层把 n>1 的请求拆分为多个并发的单图子请求
+        """
+        return True
+    
+    async def reference_images(self, request: ImageGenerationRequest) -> List[str]:
+        """
+        返回放入载荷的参考图片列表
+        
+        URL 原样保留；file:// 路径、os.PathLike 和图片字节编码为 data URI（按内容哈希缓存）。
+        读取文件和编码在线程池中进行，不阻塞事件循环。
+        
+        Raises:
+            ValueError: 包含本地参考图片但端点不接受 data URI
+        """
+        images = request.image_urls
+        if not any(is_local_reference(item) for item in images):
+            return images
+        if not self.accepts_inline_images:
+            raise ValueError(f"{self.name} 不支持本地参考图片，请传入图片 URL")
+        with span("encode_reference_images", images=len(images)):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, get_reference_encoder().encode_all, images)
+    
     def supports_model(self, model: str) -> bool:
         """检查 Provider 是否支持指定模型"""
         if not self.supported_models:
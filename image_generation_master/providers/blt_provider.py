@@ -3,21 +3,24 @@
 使用适配器模式支持多种模型
 """
 import json
-import urllib.request
-import urllib.error
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from ..schema import ImageGenerationRequest, ImageGenerationResult
 from .base import BaseProvider
-from ..models.blt_adapters import build_request
+from ..models.blt_adapters import build_request, supports_native_n
 from ..utils.param_mapper import normalize_size_and_ratio
 from ..utils.config_loader import get_config
+from ..utils.http_client import get_http_client, HttpError, HttpStatusError
+from ..utils.connection_pool import get_pool_manager
+from ..utils.metrics import track_upstream, classify_error
+from ..utils.tracing import span
 
 
 class BltProvider(BaseProvider):
     """柏拉图平台图像生成 Provider"""
 
     name = "blt"
+    accepts_inline_images = True
 
     def __init__(self):
         """初始化 Provider"""
@@ -25,6 +28,28 @@ class BltProvider(BaseProvider):
         self.api_base_url = self.config.get_blt_base_url()
         self.api_endpoint = "/v1/images/generations"
         self.api_url = f"{self.api_base_url}{self.api_endpoint}"
+        # 按基础 URL 共享的长连接池
+        self.pool = get_pool_manager().get_pool(self.api_base_url)
+
+    async def warmup(self):
+        """预先建立到 API 主机的连接"""
+        await get_http_client().warmup(self.api_base_url, timeout=self.config.get_timeout())
+
+    async def aclose(self):
+        """关闭空闲连接（进行中的请求不受影响）"""
+        self.pool.close()
+
+    def get_api_keys(self) -> List[Tuple[str, float]]:
+        """从配置文件或环境变量获取 API Key 列表"""
+        return self.config.get_blt_api_keys()
+
+    def endpoint_for(self, model: Optional[str]) -> Optional[str]:
+        """所有模型共用同一个生成端点"""
+        return self.api_endpoint
+
+    def supports_native_n(self, model: Optional[str]) -> bool:
+        """按模型适配器判断（nano-banana、flux 系列不支持 n 参数）"""
+        return supports_native_n(model or self.config.get_default_model())
 
     async def generate(self, request: ImageGenerationRequest) -> ImageGenerationResult:
         """
@@ -38,9 +63,10 @@ class BltProvider(BaseProvider):
         """
         try:
             # 标准化参数
-            size, aspect_ratio = normalize_size_and_ratio(
-                request.size, request.aspect_ratio
-            )
+            with span("normalize_size_and_ratio"):
+                size, aspect_ratio = normalize_size_and_ratio(
+                    request.size, request.aspect_ratio
+                )
 
             # 构建请求数据
             request_data = {
@@ -51,18 +77,16 @@ class BltProvider(BaseProvider):
                 "n": request.n,
             }
 
-            # 添加图片 URL
+            # 添加参考图片（本地文件和字节编码为 data URI）
             if request.image_urls:
-                request_data["image"] = request.image_urls
+                request_data["image"] = await self.reference_images(request)
 
             # 使用适配器构建最终请求参数
-            payload = build_request(request_data)
-
-            # 发送 API 请求（同步方式）
-            api_response = self._call_api(payload)
+            with span("build_request", model=request_data["model"]):
+                payload = build_request(request_data)
 
-            # 解析响应
-            return self._parse_response(api_response, request.model)
+            # 发送 API 请求并解析响应
+            return await self._execute(request, self.api_endpoint, payload, request.model)
 
         except Exception as e:
             return ImageGenerationResult(
@@ -70,24 +94,26 @@ class BltProvider(BaseProvider):
                 images=[],
                 provider=self.name,
                 model=request.model,
-                message=f"BltProvider 错误: {str(e)}"
+                message=f"BltProvider 错误: {str(e)}",
+                attempts=getattr(e, "attempts", 0),
+                error_type=classify_error(e)
             )
 
-    def _call_api(self, payload: dict) -> dict:
+    async def _call_api(self, payload: dict, endpoint: str, api_key: Optional[str] = None) -> dict:
         """
         调用柏拉图 API
 
         Args:
             payload: 请求参数
+            endpoint: API 端点路径
+            api_key: 本次调用使用的 API Key
 
         Returns:
             dict: API 响应
 
         Raises:
-            RuntimeError: HTTP 请求错误
+            HttpError: HTTP 请求错误
         """
-        # 从配置文件或环境变量获取 API Key
-        api_key = self.config.get_blt_api_key()
         if not api_key:
             raise ValueError("未设置 BLT_API_KEY 环境变量或配置文件")
 
@@ -97,23 +123,29 @@ class BltProvider(BaseProvider):
             "Authorization": f"Bearer {api_key}"
         }
 
-        req = urllib.request.Request(
-            self.api_url,
-            method="POST",
-            headers=headers,
-            data=body
-        )
-
         timeout = self.config.get_timeout()
 
-        try:
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                return json.loads(resp.read().decode("utf-8"))
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode("utf-8", errors="replace")
-            raise RuntimeError(f"柏拉图 API 请求失败 ({e.code}): {error_msg}") from e
-        except urllib.error.URLError as e:
-            raise RuntimeError(f"柏拉图 API 连接失败: {e.reason}") from e
+        with track_upstream(self.name, endpoint) as upstream:
+            upstream.sent(len(body))
+            try:
+                resp = await get_http_client().request(
+                    "POST",
+                    f"{self.api_base_url}{endpoint}",
+                    headers=headers,
+                    body=body,
+                    timeout=timeout
+                )
+                upstream.received(resp.bytes_received)
+                return resp.json()
+            except HttpStatusError as e:
+                upstream.received(len(e.body))
+                raise HttpStatusError(
+                    f"柏拉图 API 请求失败 ({e.status}): {e.text()}",
+                    status=e.status,
+                    headers=e.headers
+                ) from e
+            except HttpError as e:
+                raise type(e)(f"柏拉图 API 连接失败: {e}") from e
 
     def _parse_response(
         self,
@@ -3,31 +3,124 @@ GrsAI 平台 Provider 实现（标准库版本）
 支持多端点映射
 """
 import json
-import urllib.request
-import urllib.error
-from typing import Optional
+from typing import Optional, List, Tuple
 
-from ..schema import ImageGenerationRequest, ImageGenerationResult
+from ..schema import ImageGenerationRequest, ImageGenerationResult, ImageGenerationProgress
 from .base import BaseProvider
 from ..models.grsai_mapper import (
     get_endpoint_for_model,
     is_nano_banana_endpoint,
-    is_completions_endpoint
+    is_completions_endpoint,
+    supports_native_n
 )
 from ..utils.param_mapper import normalize_size_and_ratio
 from ..utils.config_loader import get_config
+from ..utils.http_client import get_http_client, HttpError, HttpStatusError
+from ..utils.connection_pool import get_pool_manager
+from ..utils.sse import SSEDecoder
+from ..utils import progress
+from ..utils.metrics import track_upstream, classify_error
+from ..utils.tracing import span
+
+
+# 未出现任何 SSE 事件时，为兜底 JSON 解析最多保留的响应字节数
+_RAW_FALLBACK_LIMIT = 1024 * 1024
+
+
+def _pick_data(event) -> Optional[str]:
+    """
+    挑选候选帧：去掉 [DONE] 行，保留以 { 开头的 data，不做 JSON 解析
+    """
+    data = event.data
+    if "[DONE]" in data:
+        data = "\n".join(line for line in data.split("\n") if line.strip() != "[DONE]")
+    data = data.strip()
+    return data if data.startswith("{") else None
+
+
+def _load_frame(data: str) -> Optional[dict]:
+    """
+    解析候选帧
+
+    多个 data 行未用空行分隔时会被合并为一个事件，整体无法解析时取最后一个可解析的行；
+    都无法解析时返回 None
+    """
+    texts = [data]
+    if "\n" in data:
+        texts.extend(reversed(data.split("\n")))
+    for text in texts:
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(frame, dict):
+            return frame
+    return None
+
+
+class _LastFrame:
+    """
+    SSE 流中的最后一个结果帧
+
+    只保留最新两帧的原始文本，流结束时才解析：最新帧不完整或无法解析时退回前一帧
+    """
+
+    __slots__ = ("_latest", "_previous")
+
+    def __init__(self):
+        self._latest: Optional[str] = None
+        self._previous: Optional[str] = None
+
+    def add(self, data: str):
+        """记录新的候选帧（不解析）"""
+        self._previous = self._latest
+        self._latest = data
+
+    def result(self) -> Optional[dict]:
+        """解析并返回最新的可用帧，两帧都无法解析时返回 None"""
+        for data in (self._latest, self._previous):
+            if data is not None:
+                frame = _load_frame(data)
+                if frame is not None:
+                    return frame
+        return None
 
 
 class GrsaiProvider(BaseProvider):
     """GrsAI 平台图像生成 Provider"""
 
     name = "grsai"
+    accepts_inline_images = True
 
     def __init__(self):
         """初始化 Provider"""
         self.config = get_config()
         self.api_base_url = self.config.get_grsai_base_url()
-        self.api_url = None
+        # 按基础 URL 共享的长连接池
+        self.pool = get_pool_manager().get_pool(self.api_base_url)
+
+    async def warmup(self):
+        """预先建立到 API 主机的连接"""
+        await get_http_client().warmup(self.api_base_url, timeout=self.config.get_timeout())
+
+    async def aclose(self):
+        """关闭空闲连接（进行中的请求不受影响）"""
+        self.pool.close()
+
+    def get_api_keys(self) -> List[Tuple[str, float]]:
+        """从配置文件或环境变量获取 API Key 列表"""
+        return self.config.get_grsai_api_keys()
+
+    def endpoint_for(self, model: Optional[str]) -> Optional[str]:
+        """返回模型对应的端点（/v1/draw/completions 或 /v1/draw/nano-banana）"""
+        try:
+            return get_endpoint_for_model(model or self.config.get_default_model())
+        except ValueError:
+            return None
+
+    def supports_native_n(self, model: Optional[str]) -> bool:
+        """只有 completions 端点支持 variants，nano-banana 端点每次生成一张"""
+        return supports_native_n(model or self.config.get_default_model())
 
     async def generate(self, request: ImageGenerationRequest) -> ImageGenerationResult:
         """
@@ -45,30 +138,31 @@ class GrsaiProvider(BaseProvider):
 
             # 获取端点
             endpoint = get_endpoint_for_model(model)
-            self.api_url = f"{self.api_base_url}{endpoint}"
 
             # 标准化参数
-            size, aspect_ratio = normalize_size_and_ratio(
-                request.size, request.aspect_ratio
-            )
-
-            # 根据端点类型构建请求
-            if is_nano_banana_endpoint(model):
-                payload = self._build_nano_banana_payload(
-                    request, aspect_ratio
-                )
-            elif is_completions_endpoint(model):
-                payload = self._build_completions_payload(
-                    request, size
+            with span("normalize_size_and_ratio"):
+                size, aspect_ratio = normalize_size_and_ratio(
+                    request.size, request.aspect_ratio
                 )
-            else:
-                raise ValueError(f"未知的端点: {endpoint}")
 
-            # 发送 API 请求（同步方式）
-            api_response = self._call_api(payload)
+            # 参考图片（本地文件和字节编码为 data URI）
+            references = await self.reference_images(request) if request.image_urls else None
 
-            # 解析响应
-            return self._parse_response(api_response, model)
+            # 根据端点类型构建请求
+            with span("build_request", model=model, endpoint=endpoint):
+                if is_nano_banana_endpoint(model):
+                    payload = self._build_nano_banana_payload(
+                        request, aspect_ratio, references
+                    )
+                elif is_completions_endpoint(model):
+                    payload = self._build_completions_payload(
+                        request, size, references
+                    )
+                else:
+                    raise ValueError(f"未知的端点: {endpoint}")
+
+            # 发送 API 请求并解析响应
+            return await self._execute(request, endpoint, payload, model)
 
         except Exception as e:
             return ImageGenerationResult(
@@ -76,13 +170,16 @@ class GrsaiProvider(BaseProvider):
                 images=[],
                 provider=self.name,
                 model=request.model,
-                message=f"GrsaiProvider 错误: {str(e)}"
+                message=f"GrsaiProvider 错误: {str(e)}",
+                attempts=getattr(e, "attempts", 0),
+                error_type=classify_error(e)
             )
 
     def _build_nano_banana_payload(
         self,
         request: ImageGenerationRequest,
-        aspect_ratio: str
+        aspect_ratio: str,
+        references: Optional[List[str]] = None
     ) -> dict:
         """
         构建 nano-banana 端点的请求参数
@@ -90,6 +187,7 @@ class GrsaiProvider(BaseProvider):
         Args:
             request: 统一请求
             aspect_ratio: 宽高比
+            references: 已编码的参考图片列表（见 reference_images()）
 
         Returns:
             dict: 请求参数
@@ -98,19 +196,21 @@ class GrsaiProvider(BaseProvider):
             "model": request.model,
             "prompt": request.prompt,
             "aspectRatio": aspect_ratio,
-            "shutProgress": True  # 关闭进度回复
+            # 只有 run_stream() 需要进度帧，其余情况关闭进度回复
+            "shutProgress": not progress.streaming()
         }
 
-        # 添加图片 URL
-        if request.image_urls:
-            payload["urls"] = request.image_urls
+        # 添加参考图片
+        if references:
+            payload["urls"] = references
 
         return payload
 
     def _build_completions_payload(
         self,
         request: ImageGenerationRequest,
-        size: str
+        size: str,
+        references: Optional[List[str]] = None
     ) -> dict:
         """
         构建 completions 端点的请求参数
@@ -118,6 +218,7 @@ class GrsaiProvider(BaseProvider):
         Args:
             request: 统一请求
             size: 图片尺寸
+            references: 已编码的参考图片列表（见 reference_images()）
 
         Returns:
             dict: 请求参数
@@ -127,30 +228,31 @@ class GrsaiProvider(BaseProvider):
             "prompt": request.prompt,
             "size": size,
             "variants": request.n,
-            "shutProgress": True  # 关闭进度回复
+            # 只有 run_stream() 需要进度帧，其余情况关闭进度回复
+            "shutProgress": not progress.streaming()
         }
 
-        # 添加图片 URL
-        if request.image_urls:
-            payload["urls"] = request.image_urls
+        # 添加参考图片
+        if references:
+            payload["urls"] = references
 
         return payload
 
-    def _call_api(self, payload: dict) -> dict:
+    async def _call_api(self, payload: dict, endpoint: str, api_key: Optional[str] = None) -> dict:
         """
         调用 GrsAI API
 
         Args:
             payload: 请求参数
+            endpoint: API 端点路径
+            api_key: 本次调用使用的 API Key
 
         Returns:
             dict: API 响应
 
         Raises:
-            RuntimeError: HTTP 请求错误
+            HttpError: HTTP 请求错误
         """
-        # 从配置文件或环境变量获取 API Key
-        api_key = self.config.get_grsai_api_key()
         if not api_key:
             raise ValueError("未设置 GRSAI_API_KEY 环境变量或配置文件")
 
@@ -160,57 +262,105 @@ class GrsaiProvider(BaseProvider):
             "Authorization": f"Bearer {api_key}"
         }
 
-        req = urllib.request.Request(
-            self.api_url,
-            method="POST",
-            headers=headers,
-            data=body
-        )
-
         timeout = self.config.get_timeout()
 
-        try:
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                # GrsAI 返回 SSE 流式响应，需要解析
-                response_text = resp.read().decode("utf-8")
-                return self._parse_sse_response(response_text)
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode("utf-8", errors="replace")
-            raise RuntimeError(f"GrsAI API 请求失败 ({e.code}): {error_msg}") from e
-        except urllib.error.URLError as e:
-            raise RuntimeError(f"GrsAI API 连接失败: {e.reason}") from e
-
-    def _parse_sse_response(self, response_text: str) -> dict:
+        with track_upstream(self.name, endpoint) as upstream:
+            upstream.sent(len(body))
+            try:
+                async with get_http_client().stream(
+                    "POST",
+                    f"{self.api_base_url}{endpoint}",
+                    headers=headers,
+                    body=body,
+                    timeout=timeout
+                ) as resp:
+                    # GrsAI 返回 SSE 流式响应，边读边解析
+                    try:
+                        with span("sse.stream"):
+                            return await self._read_sse_response(resp, payload.get("model"))
+                    finally:
+                        upstream.received(resp.bytes_received)
+            except HttpStatusError as e:
+                upstream.received(len(e.body))
+                raise HttpStatusError(
+                    f"GrsAI API 请求失败 ({e.status}): {e.text()}",
+                    status=e.status,
+                    headers=e.headers
+                ) from e
+            except HttpError as e:
+                raise type(e)(f"GrsAI API 连接失败: {e}") from e
+
+    async def _read_sse_response(self, resp, model: Optional[str] = None) -> dict:
         """
-        解析 SSE 流式响应
+        增量读取并解析 SSE 流式响应
+
+        只保留最新两个候选帧的原始文本，流结束后才做 JSON 解析，内存占用与流长度无关。
+        最后一帧不完整或无法解析时，退回前一帧。
+        有进度接收方（run_stream）时，每个帧到达即解析并发出进度事件。
 
         Args:
-            response_text: SSE 响应文本
+            resp: HttpResponse 流式响应
+            model: 进度事件中记录的模型名称
 
         Returns:
             dict: 解析后的 JSON 数据
         """
-        lines = response_text.strip().split('\n')
-        valid_result = None
-
-        for line in lines:
-            line = line.strip()
-            if line.startswith('data: '):
-                json_str = line.replace('data: ', '').strip()
-                # 跳过结束标记
-                if json_str == '[DONE]':
-                    continue
-                # 解析 JSON，使用最后一个有效的结果
-                try:
-                    valid_result = json.loads(json_str)
-                except json.JSONDecodeError:
-                    continue
-
-        if valid_result:
-            return valid_result
+        decoder = SSEDecoder()
+        frames = _LastFrame()
+        # 非 SSE 响应（如直接返回的错误 JSON）的兜底缓冲
+        raw = bytearray()
+        seen_event = False
+        report = progress.streaming()
+
+        def accept(event):
+            data = _pick_data(event)
+            if data is None:
+                return
+            frames.add(data)
+            if report:
+                frame = _load_frame(data)
+                if frame is not None:
+                    self._emit_progress(frame, model)
+
+        async for chunk in resp.iter_chunks():
+            if not seen_event and len(raw) <= _RAW_FALLBACK_LIMIT:
+                raw += chunk
+            for event in decoder.feed(chunk):
+                accept(event)
+                seen_event = True
+            if seen_event and raw:
+                raw = bytearray()
+
+        for event in decoder.flush():
+            accept(event)
+            seen_event = True
+
+        frame = frames.result()
+        if frame is not None:
+            return frame
+        if seen_event:
+            raise json.JSONDecodeError("SSE 响应中没有可解析的结果帧", "", 0)
+
+        # 如果没有找到有效的 data: 前缀，尝试直接解析整个响应
+        if len(raw) > _RAW_FALLBACK_LIMIT:
+            raise ValueError("响应不是 SSE 格式且内容过大")
+        return json.loads(raw.decode("utf-8").strip())
+
+    def _emit_progress(self, frame: dict, model: Optional[str]):
+        """根据一个进度帧发出进度事件"""
+        results = frame.get("results")
+        if isinstance(results, list):
+            images = [r.get("url") for r in results if isinstance(r, dict) and r.get("url")]
         else:
-            # 如果没有找到有效的 data: 前缀，尝试直接解析整个响应
-            return json.loads(response_text.strip())
+            images = [frame["url"]] if frame.get("url") else []
+        percent = frame.get("progress")
+        progress.emit(ImageGenerationProgress(
+            provider=self.name,
+            model=model,
+            status=frame.get("status"),
+            progress=percent if isinstance(percent, (int, float)) else None,
+            images=images
+        ))
 
     def _parse_response(
         self,
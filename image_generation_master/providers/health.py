@@ -0,0 +1,79 @@
+"""
+Provider 健康度统计
+以指数加权移动平均（EWMA）跟踪各供应商的成功率和延迟，用于路由决策
+"""
+import time
+from typing import Dict, Any, Optional
+
+
+class _Health:
+    """单个供应商的健康度"""
+
+    __slots__ = ("success_rate", "latency", "samples", "last_failure")
+
+    def __init__(self):
+        self.success_rate = 1.0
+        self.latency: Optional[float] = None
+        self.samples = 0
+        self.last_failure: Optional[float] = None
+
+
+class HealthTracker:
+    """
+    供应商健康度跟踪器
+
+    score 为成功率的 EWMA，取值 0~1；没有样本的供应商视为完全健康。
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._health: Dict[str, _Health] = {}
+
+    def record(self, provider: str, success: bool, latency: float):
+        """
+        记录一次请求结果
+
+        Args:
+            provider: 供应商名称
+            success: 是否成功
+            latency: 耗时（秒）
+        """
+        health = self._health.setdefault(provider, _Health())
+        value = 1.0 if success else 0.0
+        health.success_rate += self.alpha * (value - health.success_rate)
+        if health.latency is None:
+            health.latency = latency
+        else:
+            health.latency += self.alpha * (latency - health.latency)
+        health.samples += 1
+        if not success:
+            health.last_failure = time.time()
+
+    def score(self, provider: str) -> float:
+        """返回供应商的健康分"""
+        health = self._health.get(provider)
+        return health.success_rate if health else 1.0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有供应商的健康度"""
+        return {
+            name: {
+                "score": health.success_rate,
+                "latency": health.latency,
+                "samples": health.samples,
+                "last_failure": health.last_failure,
+            }
+            for name, health in self._health.items()
+        }
+
+    def reset(self):
+        """清空统计"""
+        self._health.clear()
+
+
+_tracker = HealthTracker()
+
+
+def get_health_tracker() -> HealthTracker:
+    """获取全局健康度跟踪器"""
+    return _tracker
@@ -0,0 +1,107 @@
+"""
+对冲请求策略
+请求超过一定时间仍未完成时，向第二个供应商（或同一端点）发出重复请求，先成功者胜出
+"""
+import math
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+from ..utils.config_loader import get_config
+
+
+class HedgePolicy:
+    """
+    对冲策略
+
+    - 触发延迟：样本足够时取该模型成功延迟的分位数，否则使用固定延迟
+    - 预算：被对冲的请求数不超过总请求数的 max_ratio
+    """
+
+    def __init__(
+        self,
+        delay: float = 30.0,
+        percentile: Optional[float] = 0.95,
+        min_samples: int = 20,
+        max_ratio: float = 0.1,
+        window: int = 200
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.window = window
+        self._latencies: Dict[Tuple[str, str], deque] = {}
+
+        self.requests = 0
+        self.hedged = 0
+        self.denied = 0
+        self.hedge_wins = 0
+
+    def observe(self, provider: str, model: str, latency: float):
+        """记录一次成功请求的延迟"""
+        samples = self._latencies.get((provider, model))
+        if samples is None:
+            samples = self._latencies[(provider, model)] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def latency_percentile(self, provider: str, model: str) -> Optional[float]:
+        """返回该模型的延迟分位数，样本不足时返回 None"""
+        samples = self._latencies.get((provider, model))
+        if not self.percentile or not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return ordered[max(index, 0)]
+
+    def delay_for(self, provider: str, model: str) -> float:
+        """返回发出对冲请求前的等待时间（秒）"""
+        value = self.latency_percentile(provider, model)
+        return self.delay if value is None else value
+
+    def note_request(self):
+        """记录一个可能被对冲的请求"""
+        self.requests += 1
+
+    def try_acquire(self) -> bool:
+        """
+        申请对冲预算
+
+        Returns:
+            bool: 是否允许发出对冲请求
+        """
+        if self.hedged + 1 > self.max_ratio * self.requests:
+            self.denied += 1
+            return False
+        self.hedged += 1
+        return True
+
+    def note_hedge_win(self):
+        """记录一次对冲请求先于首选请求成功"""
+        self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回对冲统计"""
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "denied": self.denied,
+            "hedge_wins": self.hedge_wins,
+            "hedge_ratio": self.hedged / self.requests if self.requests else 0.0,
+        }
+
+
+_policy: Optional[HedgePolicy] = None
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """获取全局对冲策略（首次调用时按配置创建）"""
+    global _policy
+    if _policy is None:
+        config = get_config()
+        _policy = HedgePolicy(
+            delay=config.get_hedging_delay(),
+            percentile=config.get_hedging_percentile(),
+            min_samples=config.get_hedging_min_samples(),
+            max_ratio=config.get_hedging_max_ratio()
+        )
+    return _policy
@@ -1,31 +1,51 @@
 """
 Provider 注册工厂
-负责 Provider 的注册、获取和自动路由
+负责 Provider 的注册、获取和自动路由，并管理长期存活的 Provider 实例
 """
-from typing import Optional
+import asyncio
+import importlib
+from typing import Optional, Dict, List, Tuple, Union
 from .base import BaseProvider
+from .health import get_health_tracker
+from ..models.equivalence import get_equivalent_models
+from ..utils.config_loader import get_config
+from ..utils.circuit_breaker import get_circuit_breakers
+from ..utils.tracing import span
 
 
 class ProviderRegistry:
     """
     Provider 注册表
     管理所有可用的图像生成供应商
+    
+    每个 Provider 只创建一个实例并长期复用，以便保留连接池、限流器、统计等状态。
+    通过 aget() 获取的实例保证已调用过一次 startup()
     """
     
     def __init__(self):
         self._providers = {}
+        self._instances: Dict[str, BaseProvider] = {}
+        # 名称 -> (实例, 该实例 startup() 的任务)
+        self._startups: Dict[str, Tuple[BaseProvider, asyncio.Future]] = {}
     
-    def register(self, name: str, provider_class: type):
+    def register(self, name: str, provider_class: Union[type, str]):
         """
         注册一个 Provider
         
         Args:
             name: Provider 名称（如 'blt', 'grsai'）
-            provider_class: Provider 类（必须继承 BaseProvider）
+            provider_class: Provider 类（必须继承 BaseProvider），
+                            或 "模块路径:类名" 字符串（首次使用时才导入，相对路径相对于 providers 包）
         """
-        if not issubclass(provider_class, BaseProvider):
+        if isinstance(provider_class, str):
+            if ":" not in provider_class:
+                raise ValueError(f"Provider 路径格式应为 '模块路径:类名'，实际为 '{provider_class}'")
+        elif not issubclass(provider_class, BaseProvider):
             raise TypeError(f"{provider_class.__name__} 必须继承 BaseProvider")
         self._providers[name.lower()] = provider_class
+        # 重新注册时丢弃旧实例，下次获取时按新类创建
+        self._instances.pop(name.lower(), None)
+        self._startups.pop(name.lower(), None)
     
     def get(self, name: Optional[str] = None, model: Optional[str] = None) -> BaseProvider:
         """
@@ -36,24 +56,105 @@ class ProviderRegistry:
             model: 模型名称，用于自动推断 Provider
             
         Returns:
-            BaseProvider: Provider 实例
+            BaseProvider: Provider 实例（同名 Provider 返回同一实例）。
+                          同步获取不会调用 startup()，在协程中应使用 aget()
+        """
+        with span("ProviderRegistry.get", requested=name, model=model) as current:
+            resolved = self.resolve(name, model)
+            current.set_attribute("provider", resolved)
+            return self._get_instance(resolved)
+    
+    async def aget(self, name: Optional[str] = None, model: Optional[str] = None) -> BaseProvider:
+        """
+        获取 Provider 实例，首次获取时等待其 startup() 完成
+        
+        参数与 get() 相同
+        """
+        with span("ProviderRegistry.get", requested=name, model=model) as current:
+            resolved = self.resolve(name, model)
+            current.set_attribute("provider", resolved)
+            return await self._started_instance(resolved)
+    
+    async def _started_instance(self, name: str) -> BaseProvider:
+        """
+        获取（必要时创建）Provider 单例并确保已启动
+        
+        每个实例只调用一次 startup()，并发的首次获取等待同一次调用；
+        startup() 失败时不记录，下次获取会重试。
+        """
+        instance = self._get_instance(name)
+        entry = self._startups.get(name)
+        if (
+            entry is None
+            or entry[0] is not instance
+            # 启动中的事件循环已结束（如上一次 asyncio.run() 被中断），重新启动
+            or (not entry[1].done() and entry[1].get_loop() is not asyncio.get_running_loop())
+        ):
+            entry = self._startups[name] = (instance, asyncio.ensure_future(instance.startup()))
+        try:
+            # shield：某个等待方被取消时，不影响其他等待方共享的启动任务
+            await asyncio.shield(entry[1])
+        except Exception:
+            if self._startups.get(name) is entry and entry[1].done():
+                del self._startups[name]
+            raise
+        return instance
+    
+    def _get_instance(self, name: str) -> BaseProvider:
+        """获取（必要时创建）Provider 单例"""
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = self._provider_class(name)()
+            self._instances[name] = instance
+        return instance
+    
+    def _provider_class(self, name: str) -> type:
+        """获取 Provider 类，以字符串注册的在此时导入"""
+        provider_class = self._providers[name]
+        if isinstance(provider_class, str):
+            module_name, _, class_name = provider_class.partition(":")
+            provider_class = getattr(importlib.import_module(module_name, __package__), class_name)
+            if not issubclass(provider_class, BaseProvider):
+                raise TypeError(f"{provider_class.__name__} 必须继承 BaseProvider")
+            self._providers[name] = provider_class
+        return provider_class
+    
+    def resolve(self, name: Optional[str] = None, model: Optional[str] = None) -> str:
+        """
+        解析最终使用的 Provider 名称（不创建实例）
+        
+        Args:
+            name: Provider 名称，None 或 'auto' 表示自动选择
+            model: 模型名称，用于自动推断 Provider
+            
+        Returns:
+            str: 已注册的 Provider 名称
         """
         # 自动选择模式
         if not name or name.lower() == "auto":
-            return self._auto_select(model)
+            selected = self._auto_select(model)
+            if model and self._circuit_open(selected, model):
+                # 首选端点已熔断时，改用其他平台上的同名模型
+                for provider, alt_model in get_equivalent_models(selected, model):
+                    if (
+                        alt_model == model
+                        and provider in self._providers
+                        and not self._circuit_open(provider, model)
+                    ):
+                        return provider
+            return selected
         
         # 按名称获取
-        provider_class = self._providers.get(name.lower())
-        if not provider_class:
+        if name.lower() not in self._providers:
             available = ", ".join(self._providers.keys())
             raise ValueError(
                 f"未找到 Provider: '{name}'。"
                 f"可用的 Provider: {available}"
             )
         
-        return provider_class()
+        return name.lower()
     
-    def _auto_select(self, model: Optional[str]) -> BaseProvider:
+    def _auto_select(self, model: Optional[str]) -> str:
         """
         根据模型名称自动选择 Provider
         
@@ -63,43 +164,161 @@ class ProviderRegistry:
         
         Args:
             model: 模型名称
+            
+        Returns:
+            str: Provider 名称
         """
         if model:
             # 柏拉图平台模型特征
             blt_models = ["nano", "doubao", "flux", "gpt-4o-image", "sora_image"]
             if any(model.startswith(prefix) for prefix in blt_models):
                 if "blt" in self._providers:
-                    return self._providers["blt"]()
+                    return "blt"
             
             # GrsAI 平台模型特征
             grsai_models = ["sora-image", "gpt-image", "nano-banana-fast", "nano-banana-pro"]
             if any(model.startswith(prefix) for prefix in grsai_models):
                 if "grsai" in self._providers:
-                    return self._providers["grsai"]()
+                    return "grsai"
         
         # 默认返回第一个注册的 Provider
         if self._providers:
-            first_provider = next(iter(self._providers.values()))
-            return first_provider()
+            return next(iter(self._providers))
         
         raise ValueError("没有可用的 Provider")
     
     def list_providers(self) -> list:
         """返回所有已注册的 Provider 名称"""
         return list(self._providers.keys())
+    
+    def _circuit_open(self, name: str, model: Optional[str]) -> bool:
+        """模型所在端点的熔断器是否处于拒绝状态"""
+        # 尚未创建实例的 Provider 没有发出过请求，熔断器不可能打开（也避免为此导入它）
+        if name not in self._instances or not get_config().get_circuit_enabled():
+            return False
+        endpoint = self._get_instance(name).endpoint_for(model)
+        return get_circuit_breakers().is_open(name, endpoint)
+    
+    def failover_chain(
+        self,
+        name: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        生成故障转移的尝试顺序
+        
+        首选项为正常路由的结果，其后是等价表中其他平台的模型（按健康分从高到低）。
+        首选供应商健康分低于 routing.min_health 且有更健康的候选时，更健康的候选排在前面；
+        端点已熔断的候选排在最后。
+        
+        Args:
+            name: Provider 名称，None 或 'auto' 表示自动选择
+            model: 模型名称，None 表示默认模型
+            
+        Returns:
+            List[Tuple[provider, model]]: 依次尝试的 (供应商, 模型)
+        """
+        config = get_config()
+        primary = self.resolve(name, model)
+        model = model or config.get_default_model()
+        
+        health = get_health_tracker()
+        alternatives = [
+            (provider, alt_model)
+            for provider, alt_model in get_equivalent_models(primary, model)
+            if provider in self._providers and provider != primary
+        ]
+        alternatives.sort(key=lambda item: health.score(item[0]), reverse=True)
+        
+        chain = [(primary, model)] + alternatives
+        if (
+            alternatives
+            and health.score(primary) < config.get_routing_min_health()
+            and health.score(alternatives[0][0]) > health.score(primary)
+        ):
+            chain = alternatives + [(primary, model)]
+        # 端点已熔断的候选放到最后（稳定排序，其余顺序不变）
+        chain.sort(key=lambda item: self._circuit_open(*item))
+        return chain
+    
+    async def startup(self, names: Optional[List[str]] = None):
+        """
+        创建 Provider 实例并调用其 startup() 钩子（已启动的实例不再重复调用）
+        
+        Args:
+            names: 要启动的 Provider 名称，默认全部
+        """
+        for name in names or self.list_providers():
+            await self._started_instance(name.lower())
+    
+    async def warmup(self, names: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+        """
+        预热 Provider（如提前建立连接）
+        
+        Args:
+            names: 要预热的 Provider 名称，默认全部
+            
+        Returns:
+            dict: Provider 名称 -> 错误信息（成功为 None）
+        """
+        results = {}
+        for name in names or self.list_providers():
+            try:
+                provider = await self._started_instance(name.lower())
+                await provider.warmup()
+                results[name] = None
+            except Exception as e:
+                results[name] = str(e)
+        return results
+    
+    async def reload(self, name: str) -> BaseProvider:
+        """
+        重建单个 Provider 实例（如配置变更后），重建前先重新加载配置
+        
+        新请求立即使用新实例；已经拿到旧实例的进行中请求继续使用旧实例完成，
+        其他 Provider 不受影响。
+        
+        Args:
+            name: Provider 名称
+            
+        Returns:
+            BaseProvider: 新实例
+        """
+        name = self.resolve(name)
+        get_config().reload()
+        instance = self._provider_class(name)()
+        startup = asyncio.ensure_future(instance.startup())
+        await startup
+        old = self._instances.get(name)
+        self._instances[name] = instance
+        self._startups[name] = (instance, startup)
+        if old is not None:
+            await old.aclose()
+        return instance
+    
+    async def close(self):
+        """关闭所有 Provider 实例"""
+        instances = list(self._instances.values())
+        self._instances.clear()
+        self._startups.clear()
+        for instance in instances:
+            await instance.aclose()
 
 
 # 全局注册表实例
 _registry = ProviderRegistry()
 
 
-def register_provider(name: str, provider_class: type):
+def register_provider(name: str, provider_class: Union[type, str]):
     """
     注册 Provider 的便捷函数
     
     使用示例：
         from providers.blt_provider import BltProvider
         register_provider("blt", BltProvider)
+        
+        # 延迟导入：首次获取该 Provider 时才导入模块
+        register_provider("blt", ".blt_provider:BltProvider")
     """
     _registry.register(name, provider_class)
 
@@ -121,6 +340,60 @@ def get_provider(name: Optional[str] = None, model: Optional[str] = None) -> Bas
     return _registry.get(name, model)
 
 
+async def aget_provider(name: Optional[str] = None, model: Optional[str] = None) -> BaseProvider:
+    """
+    获取 Provider 实例，首次获取时等待其 startup() 完成（在协程中应优先使用）
+    
+    使用示例：
+        provider = await aget_provider(model="nano-banana")
+    """
+    return await _registry.aget(name, model)
+
+
+def resolve_provider_name(name: Optional[str] = None, model: Optional[str] = None) -> str:
+    """
+    解析请求最终会路由到的 Provider 名称（不创建实例）
+    
+    使用示例：
+        resolve_provider_name(model="flux-pro")  # -> "blt"
+    """
+    return _registry.resolve(name, model)
+
+
 def list_providers() -> list:
     """返回所有已注册的 Provider 名称"""
     return _registry.list_providers()
+
+
+def get_failover_chain(
+    name: Optional[str] = None,
+    model: Optional[str] = None
+) -> List[Tuple[str, str]]:
+    """
+    返回故障转移时依次尝试的 (供应商, 模型) 列表
+    
+    使用示例：
+        get_failover_chain(model="nano-banana")
+        # -> [("blt", "nano-banana"), ("grsai", "nano-banana")]
+    """
+    return _registry.failover_chain(name, model)
+
+
+async def startup_providers(names: Optional[List[str]] = None):
+    """启动 Provider 实例（可选，未启动的 Provider 会在首次使用时创建并启动）"""
+    await _registry.startup(names)
+
+
+async def warmup_providers(names: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """预热 Provider，返回每个 Provider 的错误信息（成功为 None）"""
+    return await _registry.warmup(names)
+
+
+async def reload_provider(name: str) -> BaseProvider:
+    """重建单个 Provider 实例，不影响其他 Provider 的进行中请求"""
+    return await _registry.reload(name)
+
+
+async def close_providers():
+    """关闭所有 Provider 实例"""
+    await _registry.close()
@@ -17,7 +17,11 @@ class ImageGenerationRequest:
         size: Optional[str] = None,
         aspect_ratio: Optional[str] = None,
         n: int = 1,
-        image_urls: Optional[List[str]] = None,
+        image_urls: Optional[List[Any]] = None,
+        cache: Optional[bool] = None,
+        failover: Optional[bool] = None,
+        hedge: Optional[bool] = None,
+        download: Optional[bool] = None,
         **kwargs
     ):
         self.prompt = prompt
@@ -26,7 +30,16 @@ class ImageGenerationRequest:
         self.size = size
         self.aspect_ratio = aspect_ratio
         self.n = n
+        # 参考图片：URL、本地文件路径或图片字节（后两者由支持的 Provider 编码为 data URI）
         self.image_urls = image_urls or []
+        # 是否使用结果缓存：None 跟随配置，False 跳过缓存，True 强制使用
+        self.cache = cache
+        # 失败时是否切换到其他平台的等价模型：None 跟随配置
+        self.failover = failover
+        # 是否启用对冲请求：None 跟随配置
+        self.hedge = hedge
+        # 是否把结果图片下载到本地：None 跟随配置
+        self.download = download
         self.extra_params = kwargs
 
     def to_dict(self) -> Dict[str, Any]:
@@ -39,9 +52,19 @@ class ImageGenerationRequest:
             "aspect_ratio": self.aspect_ratio,
             "n": self.n,
             "image_urls": self.image_urls,
+            "cache": self.cache,
+            "failover": self.failover,
+            "hedge": self.hedge,
+            "download": self.download,
             **self.extra_params
         }
 
+    def copy(self, **overrides) -> "ImageGenerationRequest":
+        """复制请求，可覆盖部分字段"""
+        params = self.to_dict()
+        params.update(overrides)
+        return ImageGenerationRequest(**params)
+
 
 class ImageGenerationResult:
     """图像生成结果的统一数据结构"""
@@ -53,7 +76,13 @@ class ImageGenerationResult:
         provider: Optional[str] = None,
         model: Optional[str] = None,
         message: Optional[str] = None,
-        raw_response: Optional[Dict[str, Any]] = None
+        raw_response: Optional[Dict[str, Any]] = None,
+        cached: bool = False,
+        attempt_chain: Optional[List[Dict[str, Any]]] = None,
+        attempts: int = 0,
+        error_type: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        files: Optional[List[Dict[str, Any]]] = None
     ):
         self.success = success
         self.images = images or []
@@ -61,6 +90,17 @@ class ImageGenerationResult:
         self.model = model
         self.message = message
         self.raw_response = raw_response
+        self.cached = cached
+        # 依次尝试过的供应商/模型及各自结果
+        self.attempt_chain = attempt_chain or []
+        # 向上游发出的 HTTP 请求次数（含重试）
+        self.attempts = attempts
+        # 失败类型：timeout / http_error / parse_error / error；API 返回失败时为 None
+        self.error_type = error_type
+        # 请求追踪 ID（未启用追踪时为 None）
+        self.trace_id = trace_id
+        # 已下载到本地的图片：与 images 一一对应的 {url, path, size, sha256}
+        self.files = files or []
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -69,5 +109,43 @@ class ImageGenerationResult:
             "images": self.images,
             "provider": self.provider,
             "model": self.model,
-            "message": self.message
+            "message": self.message,
+            "cached": self.cached,
+            "attempt_chain": self.attempt_chain,
+            "attempts": self.attempts,
+            "error_type": self.error_type,
+            "trace_id": self.trace_id,
+            "files": self.files
+        }
+
+
+class ImageGenerationProgress:
+    """生成过程中的进度事件（run_stream() 产出）"""
+
+    def __init__(
+        self,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        status: Optional[str] = None,
+        progress: Optional[float] = None,
+        images: Optional[List[str]] = None
+    ):
+        self.provider = provider
+        self.model = model
+        # 上游报告的状态，如 running / succeeded / failed
+        self.status = status
+        # 进度百分比（0~100），上游未报告时为 None
+        self.progress = progress
+        # 已生成的部分结果 URL
+        self.images = images or []
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "type": "progress",
+            "provider": self.provider,
+            "model": self.model,
+            "status": self.status,
+            "progress": self.progress,
+            "images": self.images
         }
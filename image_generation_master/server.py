@@ -0,0 +1,619 @@
+"""
+常驻服务模式
+通过 Unix 套接字或本地 HTTP 以 JSON 协议提供 skill.run，连接池、缓存和运行指标在多次调用间保留
+
+接口：
+    POST /run       请求体为 run() 的 inputs（JSON），返回 run() 的结果；?pretty=1 时缩进输出
+    GET  /healthz   存活检查，进程能响应即返回 200
+    GET  /readyz    就绪检查，Provider 启动完成且未在停止中时返回 200，否则 503
+    GET  /metrics   Prometheus 文本格式的运行指标
+
+启动：
+    python -m image_generation_master.server                  # 监听配置中的 server.socket
+    python -m image_generation_master.server --port 8765      # 监听 127.0.0.1:8765
+    python -m image_generation_master.server --workers 4      # 预先 fork 4 个工作进程共享监听套接字
+
+多进程模式下主进程只管理工作进程：SIGHUP 重新加载配置并滚动替换工作进程，SIGTERM / SIGINT 优雅停止，
+旧工作进程都会先处理完进行中的请求再退出。
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple, Set, Callable
+from urllib.parse import urlsplit, parse_qs
+
+from .skill import run
+from .providers import startup_providers, warmup_providers, close_providers
+from .utils.config_loader import get_config
+from .utils.reference_images import check_reference_paths
+from .utils.metrics import render_metrics, get_metrics, MetricsRegistry
+
+# 请求体大小上限（参考图片应通过 URL 传递）
+MAX_BODY_SIZE = 8 * 1024 * 1024
+
+# 多进程模式下工作进程定期写出指标快照的间隔（秒），每个 /run 完成后也会立即写出
+METRICS_FLUSH_INTERVAL = 5.0
+
+# 多进程模式下工作进程异常退出后，两次重新创建之间的最短间隔（秒）
+RESPAWN_INTERVAL = 1.0
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _error_result(message: str) -> Dict[str, Any]:
+    return {"success": False, "images": [], "provider": None, "model": None, "message": message}
+
+
+class SkillServer:
+    """
+    skill.run 的常驻 HTTP/1.1 服务（支持 keep-alive）
+
+    使用示例：
+        server = SkillServer()
+        await server.start(path="/tmp/image_gen.sock")
+        await server.wait_stopped()      # 直到 stop() 被调用（如收到 SIGTERM）
+    """
+
+    def __init__(
+        self,
+        drain_timeout: Optional[float] = None,
+        warmup: Optional[bool] = None,
+        metrics_source: Optional[Callable[[], str]] = None,
+        after_run: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            drain_timeout: 停止时等待进行中请求的最长时间（秒），默认读取配置 server.drain_timeout
+            warmup: 启动时是否预热 Provider，默认读取配置 server.warmup
+            metrics_source: /metrics 的内容来源，默认为本进程的 render_metrics
+            after_run: 每个 /run 请求完成后调用（多进程模式用于写出指标快照）
+        """
+        config = get_config()
+        self.drain_timeout = drain_timeout if drain_timeout is not None else config.get_server_drain_timeout()
+        self.warmup = warmup if warmup is not None else config.get_server_warmup()
+        self.metrics_source = metrics_source or render_metrics
+        self.after_run = after_run
+        self.ready = False
+        self.draining = False
+        self.path: Optional[str] = None
+        self.address: Optional[Tuple[str, int]] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._inflight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+        # 只有自己创建的 Unix 套接字才在停止时删除（多进程模式下由主进程负责）
+        self._owns_socket = False
+
+    @property
+    def inflight(self) -> int:
+        """正在执行的 /run 请求数"""
+        return self._inflight
+
+    async def start(
+        self,
+        path: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        sock: Optional[socket.socket] = None
+    ):
+        """
+        开始监听并启动 Provider
+
+        Args:
+            path: Unix 套接字路径
+            host / port: TCP 监听地址（path 为空时使用）
+            sock: 已创建好的监听套接字（优先）
+        """
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stopped = asyncio.Event()
+
+        if sock is not None:
+            if sock.family == getattr(socket, "AF_UNIX", None):
+                # Python 3.13+ 默认在关闭时删除套接字文件，共享的套接字由创建者负责清理
+                extra = {"cleanup_socket": False} if sys.version_info >= (3, 13) else {}
+                self._server = await asyncio.start_unix_server(self._handle, sock=sock, **extra)
+            else:
+                self._server = await asyncio.start_server(self._handle, sock=sock)
+        elif path:
+            self._server = await asyncio.start_unix_server(self._handle, sock=bind_unix_socket(path))
+            self._owns_socket = True
+        else:
+            self._server = await asyncio.start_server(self._handle, host or "127.0.0.1", port or 0)
+
+        bound = self._server.sockets[0].getsockname()
+        if isinstance(bound, tuple):
+            self.address = bound[:2]
+        else:
+            self.path = bound
+
+        await startup_providers()
+        if self.warmup:
+            # 预热失败不影响就绪，首次请求时会重新建立连接
+            await warmup_providers()
+        self.ready = True
+
+    async def stop(self, timeout: Optional[float] = None):
+        """
+        优雅停止：不再接受新连接和新请求，等待进行中的生成完成（最多 timeout 秒）后关闭
+        """
+        if self._server is None or self.draining:
+            return
+        self.draining = True
+        self.ready = False
+        self._server.close()
+        try:
+            await asyncio.wait_for(
+                self._idle.wait(),
+                timeout if timeout is not None else self.drain_timeout
+            )
+        except asyncio.TimeoutError:
+            pass
+        # 关闭空闲的 keep-alive 连接
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        await close_providers()
+        if self.path and self._owns_socket:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self._stopped.set()
+
+    async def wait_stopped(self):
+        """等待 stop() 完成"""
+        await self._stopped.wait()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while not self.draining:
+                try:
+                    request = await _read_request(reader)
+                except _BadRequest as e:
+                    _write_response(writer, e.status, _json_body(_error_result(str(e))), close=True)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, content_type, payload = await self._dispatch(method, target, body)
+                close = self.draining or headers.get("connection", "").lower() == "close"
+                _write_response(writer, status, payload, content_type, close=close)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, str, bytes]:
+        url = urlsplit(target)
+        if url.path == "/healthz":
+            return 200, "application/json", _json_body({"status": "ok", "pid": os.getpid()})
+        if url.path == "/readyz":
+            status = 200 if self.ready and not self.draining else 503
+            return status, "application/json", _json_body({
+                "ready": status == 200,
+                "draining": self.draining,
+                "inflight": self._inflight,
+            })
+        if url.path == "/metrics":
+            return 200, "text/plain; version=0.0.4; charset=utf-8", self.metrics_source().encode("utf-8")
+        if url.path != "/run":
+            return 404, "application/json", _json_body(_error_result(f"未知的路径: {url.path}"))
+        if method != "POST":
+            return 405, "application/json", _json_body(_error_result("/run 只支持 POST"))
+        if self.draining:
+            return 503, "application/json", _json_body(_error_result("服务正在停止"))
+
+        try:
+            inputs = json.loads(body or b"{}")
+            if not isinstance(inputs, dict):
+                raise ValueError("请求体必须是 JSON 对象")
+            # 请求来自其他进程：只允许读取配置中列出的目录下的参考图片
+            check_reference_paths(inputs.get("image_urls") or [], get_config().get_reference_allowed_dirs())
+        except ValueError as e:
+            return 400, "application/json", _json_body(_error_result(f"无效的请求体: {e}"))
+
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            result = await run(inputs)
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+            if self.after_run is not None:
+                self.after_run()
+        pretty = parse_qs(url.query).get("pretty", ["0"])[0] not in ("", "0", "false")
+        return 200, "application/json", _json_body(result, indent=2 if pretty else None)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """读取一个请求，连接关闭时返回 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise _BadRequest(400, "请求头过大")
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) < 2:
+        raise _BadRequest(400, "无效的请求行")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise _BadRequest(400, "不支持 chunked 请求体")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise _BadRequest(400, "无效的 Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise _BadRequest(413, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return parts[0].upper(), parts[1], headers, body
+
+
+def _json_body(data: Any, indent: Optional[int] = None) -> bytes:
+    return (json.dumps(data, ensure_ascii=False, indent=indent) + "\n").encode("utf-8")
+
+
+def _write_response(
+    writer: asyncio.StreamWriter,
+    status: int,
+    body: bytes,
+    content_type: str = "application/json",
+    close: bool = False
+):
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+def bind_unix_socket(path: str) -> socket.socket:
+    """
+    创建 Unix 监听套接字（仅当前用户可访问）
+
+    残留的套接字文件（上次未正常退出）会被清理；已有服务在监听时抛出 RuntimeError。
+    """
+    path = str(Path(path).expanduser())
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise RuntimeError(f"已有服务在监听 {path}")
+        finally:
+            probe.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+    sock.listen(128)
+    return sock
+
+
+def bind_tcp_socket(host: str, port: int) -> socket.socket:
+    """创建 TCP 监听套接字"""
+    return socket.create_server((host, port), backlog=128)
+
+
+class _SharedMetrics:
+    """
+    多进程模式下的指标汇总
+
+    每个工作进程在请求完成后和定期把 get_metrics().snapshot() 写入共享目录，/metrics 由任一工作进程处理时合并目录中的
+    全部快照；工作进程退出后主进程把它的计数器和直方图并入 archive.json，重新加载后累计值不会归零。
+    """
+
+    ARCHIVE = "archive.json"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"worker-{pid}.json")
+
+    def _write(self, path: str, data: Dict[str, Any]):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _load(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def flush(self):
+        """写出当前工作进程的指标快照"""
+        self._write(self._path(os.getpid()), get_metrics().snapshot())
+
+    def render(self) -> str:
+        """合并所有工作进程（含已退出的）的指标"""
+        self.flush()
+        registry = MetricsRegistry()
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                snapshot = self._load(os.path.join(self.directory, name))
+                if snapshot:
+                    registry.merge(snapshot)
+        return registry.render()
+
+    def archive(self, pid: int):
+        """把已退出工作进程的累计指标并入归档（主进程调用）"""
+        path = self._path(pid)
+        snapshot = self._load(path)
+        if snapshot is None:
+            return
+        registry = MetricsRegistry()
+        registry.merge(self._load(os.path.join(self.directory, self.ARCHIVE)) or {})
+        registry.merge(snapshot, gauges=False)
+        self._write(os.path.join(self.directory, self.ARCHIVE), registry.snapshot())
+        os.unlink(path)
+
+
+async def _worker_main(sock: socket.socket, metrics: _SharedMetrics):
+    """工作进程：在继承的监听套接字上运行 SkillServer，收到 SIGTERM 后优雅停止"""
+    server = SkillServer(metrics_source=metrics.render, after_run=metrics.flush)
+    await server.start(sock=sock)
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(server.stop()))
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+            metrics.flush()
+
+    flusher = asyncio.ensure_future(flush_periodically())
+    try:
+        await server.wait_stopped()
+    finally:
+        flusher.cancel()
+        metrics.flush()
+
+
+class PreforkServer:
+    """
+    预派生多进程服务
+
+    主进程创建监听套接字后 fork 出 workers 个工作进程，由内核在它们之间分配连接；主进程本身不处理请求，
+    只负责：
+    - 工作进程异常退出时重新创建
+    - SIGHUP：重新加载配置，先启动新一代工作进程，再让旧进程处理完进行中的请求后退出
+    - SIGTERM / SIGINT：所有工作进程优雅停止，超过 drain_timeout 后强制结束
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        path: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None
+    ):
+        if workers < 1:
+            raise ValueError("工作进程数必须大于 0")
+        if not hasattr(os, "fork"):
+            raise RuntimeError("当前平台不支持多进程模式")
+        self.size = workers
+        self.path = str(Path(path).expanduser()) if path else None
+        self.host = host or "127.0.0.1"
+        self.port = port or 0
+        self.generation = 0
+        # pid -> 所属代数
+        self.workers: Dict[int, int] = {}
+        self._sock: Optional[socket.socket] = None
+        self._metrics: Optional[_SharedMetrics] = None
+        self._missing = 0
+        self._next_spawn = 0.0
+        self._stop_requested = False
+        self._reload_requested = False
+        self._stopping = False
+        self._kill_deadline = 0.0
+
+    @property
+    def address(self) -> str:
+        """监听地址（Unix 套接字路径或 http://host:port）"""
+        if self.path:
+            return self.path
+        host, port = self._sock.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def run(self) -> int:
+        """运行到收到 SIGTERM / SIGINT 且所有工作进程退出，返回退出码"""
+        self._sock = bind_unix_socket(self.path) if self.path else bind_tcp_socket(self.host, self.port)
+        self._metrics = _SharedMetrics(tempfile.mkdtemp(prefix="image_gen_metrics_"))
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        try:
+            for _ in range(self.size):
+                self._spawn()
+            print(f"🚀 图像生成服务已启动: {self.address}（{self.size} 个工作进程）", flush=True)
+
+            while self.workers or (self._missing and not self._stopping):
+                if self._stop_requested and not self._stopping:
+                    self._begin_stop()
+                if self._reload_requested and not self._stopping:
+                    self._reload()
+                self._reap()
+                if self._missing and not self._stopping and time.monotonic() >= self._next_spawn:
+                    self._missing -= 1
+                    self._next_spawn = time.monotonic() + RESPAWN_INTERVAL
+                    self._spawn()
+                if self._stopping and time.monotonic() > self._kill_deadline:
+                    self._signal_all(signal.SIGKILL)
+                time.sleep(0.1)
+            print("✅ 服务已停止", flush=True)
+            return 0
+        finally:
+            self._sock.close()
+            if self.path:
+                try:
+                    os.unlink(self.path)
+                except OSError:
+                    pass
+            shutil.rmtree(self._metrics.directory, ignore_errors=True)
+
+    def _on_stop(self, signum, frame):
+        self._stop_requested = True
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _spawn(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                # Ctrl+C 会发给整个进程组，由主进程统一转为 SIGTERM
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                asyncio.run(_worker_main(self._sock, self._metrics))
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        self.workers[pid] = self.generation
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            generation = self.workers.pop(pid, None)
+            if generation is None:
+                continue
+            self._metrics.archive(pid)
+            if generation == self.generation and not self._stopping:
+                print(f"⚠️  工作进程 {pid} 异常退出（状态 {status}），将重新创建", file=sys.stderr, flush=True)
+                self._missing += 1
+
+    def _reload(self):
+        self._reload_requested = False
+        get_config().reload()
+        old = list(self.workers)
+        self.generation += 1
+        self._missing = 0
+        for _ in range(self.size):
+            self._spawn()
+        for pid in old:
+            self._kill(pid, signal.SIGTERM)
+        print(f"🔄 已重新加载配置，替换 {len(old)} 个工作进程", flush=True)
+
+    def _begin_stop(self):
+        self._stopping = True
+        self._kill_deadline = time.monotonic() + get_config().get_server_drain_timeout() + 10
+        self._signal_all(signal.SIGTERM)
+
+    def _signal_all(self, signum: int):
+        for pid in list(self.workers):
+            self._kill(pid, signum)
+
+    @staticmethod
+    def _kill(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+async def serve(path: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None):
+    """启动服务并运行到收到 SIGINT / SIGTERM，然后优雅停止"""
+    server = SkillServer()
+    await server.start(path=path, host=host, port=port)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(server.stop()))
+        except (NotImplementedError, RuntimeError):
+            # Windows 不支持 add_signal_handler
+            pass
+    if hasattr(signal, "SIGHUP"):
+        # 单进程模式下 SIGHUP 只重新加载配置，新请求使用新快照
+        loop.add_signal_handler(signal.SIGHUP, get_config().reload)
+    where = server.path or "http://{}:{}".format(*server.address)
+    print(f"🚀 图像生成服务已启动: {where}", flush=True)
+    await server.wait_stopped()
+    print("✅ 服务已停止", flush=True)
+
+
+def main(argv=None):
+    config = get_config()
+    parser = argparse.ArgumentParser(description="图像生成大师常驻服务")
+    parser.add_argument("--socket", help="Unix 套接字路径（默认读取配置 server.socket）")
+    parser.add_argument("--host", help="TCP 监听地址（指定 --port 时使用，默认 127.0.0.1）")
+    parser.add_argument("--port", type=int, help="TCP 监听端口，指定后不使用 Unix 套接字")
+    parser.add_argument("--workers", type=int, help="工作进程数（默认读取配置 server.workers）")
+    args = parser.parse_args(argv)
+    workers = args.workers if args.workers is not None else config.get_server_workers()
+
+    port = args.port if args.port is not None else config.get_server_port()
+    path = None
+    if port is None or args.socket:
+        path = args.socket or config.get_server_socket()
+        if not hasattr(socket, "AF_UNIX"):
+            parser.error("当前平台不支持 Unix 套接字，请使用 --port")
+    host = args.host or config.get_server_host()
+    if workers > 1:
+        if not hasattr(os, "fork"):
+            parser.error("当前平台不支持多进程模式，请使用 --workers 1")
+        sys.exit(PreforkServer(workers, path=path, host=host, port=port).run())
+    try:
+        asyncio.run(serve(path=path, host=host, port=port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
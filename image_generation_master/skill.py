@@ -2,8 +2,24 @@
 图像生成大师 Skill 主入口
 统一编排层，负责 Provider 路由和结果返回
 """
-from .schema import ImageGenerationRequest
-from .providers import get_provider
+import asyncio
+import time
+from collections import deque, defaultdict
+from typing import Optional, Dict, Any, Iterable, AsyncIterator, Tuple, List, Union
+
+from .schema import ImageGenerationRequest, ImageGenerationResult, ImageGenerationProgress
+from .providers import (
+    BaseProvider,
+    aget_provider,
+    resolve_provider_name,
+    get_failover_chain,
+    get_health_tracker,
+    get_hedge_policy
+)
+from .utils.config_loader import get_config
+from .utils import metrics
+from .utils.progress import progress_sink
+from .utils.tracing import span
 
 
 async def run(inputs: dict) -> dict:
@@ -19,6 +35,10 @@ async def run(inputs: dict) -> dict:
             - aspect_ratio: 可选，宽高比（如 "16:9"）
             - n: 可选，生成数量（默认 1）
             - image_urls: 可选，参考图片列表
+            - cache: 可选，是否使用结果缓存（默认跟随配置）
+            - failover: 可选，失败时是否切换到其他平台的等价模型（默认跟随配置）
+            - hedge: 可选，是否启用对冲请求（默认跟随配置）
+            - download: 可选，是否把结果图片下载到本地（默认跟随配置）
     
     Returns:
         dict: 包含以下字段：
@@ -27,35 +47,319 @@ async def run(inputs: dict) -> dict:
             - provider: 实际使用的供应商
             - model: 实际使用的模型
             - message: 错误信息（如果失败）
+            - cached: 是否为缓存命中的结果
+            - attempt_chain: 依次尝试过的供应商/模型及结果
+            - attempts: 最终结果对应的上游 HTTP 请求次数（含重试）
+            - error_type: 失败类型（timeout/http_error/parse_error/error，API 返回失败时为 None）
+            - trace_id: 请求追踪 ID（未启用追踪时为 None）
+            - files: 已下载到本地的图片 [{url, path, size, sha256}]（未启用下载时为空）
+    """
+    result = await _run(inputs)
+    # 返回字典格式结果
+    return result.to_dict()
+
+
+async def _run(inputs: dict) -> ImageGenerationResult:
+    """执行一次生成请求（run() 与 run_stream() 共用），异常转换为失败结果"""
+    with span("skill.run", provider=inputs.get("provider"), model=inputs.get("model")) as root:
+        # 整个请求（含重试、对冲和故障转移）使用同一份配置快照；检查文件变化和重新加载都在这里发生
+        config = get_config()
+        with span("config"):
+            snapshot = config.snapshot()
+        with config.pin(snapshot):
+            start = time.monotonic()
+            metrics.REQUESTS_IN_FLIGHT.inc()
+            try:
+                # 创建统一请求对象
+                request = ImageGenerationRequest(**inputs)
+            
+                # 路由并调用 Provider 生成图片
+                result = await _generate(request)
+            
+                if result.success:
+                    outcome = "success"
+                else:
+                    outcome = result.error_type or "api_failed"
+                metrics.observe_request(result.provider, result.model, outcome, time.monotonic() - start)
+                result.trace_id = root.trace_id
+                return result
+            
+            except Exception as e:
+                # 统一错误处理
+                metrics.observe_request(
+                    inputs.get("provider"), inputs.get("model"), "error", time.monotonic() - start
+                )
+                return ImageGenerationResult(
+                    success=False,
+                    images=[],
+                    provider=inputs.get("provider"),
+                    model=inputs.get("model"),
+                    message=f"Skill 执行错误: {str(e)}",
+                    error_type="error",
+                    trace_id=root.trace_id
+                )
+            finally:
+                metrics.REQUESTS_IN_FLIGHT.dec()
+
+
+class _LatestProgress:
+    """只保留最新一个未消费进度事件的信箱，消费方较慢时丢弃中间进度，内存占用恒定"""
+
+    def __init__(self):
+        self.event: Optional[ImageGenerationProgress] = None
+        self.ready = asyncio.Event()
+
+    def put(self, event: ImageGenerationProgress):
+        self.event = event
+        self.ready.set()
+
+    def take(self) -> Optional[ImageGenerationProgress]:
+        event, self.event = self.event, None
+        self.ready.clear()
+        return event
+
+
+async def run_stream(inputs: dict) -> AsyncIterator[Union[ImageGenerationProgress, ImageGenerationResult]]:
+    """
+    流式入口：生成过程中产出进度事件，最后产出生成结果
+
+    支持进度回复的端点（GrsAI）会请求进度帧并在每帧到达时产出 ImageGenerationProgress；
+    其他供应商只产出最终结果。调用方提前停止迭代时取消进行中的请求。
+
+    使用示例：
+        async for event in run_stream({"prompt": "一只猫", "provider": "grsai"}):
+            if isinstance(event, ImageGenerationProgress):
+                print(event.progress, event.status)
+            else:
+                print(event.images)
+
+    Args:
+        inputs: 与 run() 相同
+
+    Yields:
+        ImageGenerationProgress: 进度事件（消费较慢时只保留最新一个）
+        ImageGenerationResult: 最后一项，生成结果
     """
+    mailbox = _LatestProgress()
+
+    async def produce() -> ImageGenerationResult:
+        with progress_sink(mailbox.put):
+            return await _run(inputs)
+
+    task = asyncio.ensure_future(produce())
+    waiter = None
     try:
-        # 创建统一请求对象
-        request = ImageGenerationRequest(**inputs)
-        
-        # 获取 Provider（自动选择或指定）
-        provider = get_provider(request.provider, request.model)
-        
-        # 调用 Provider 生成图片
-        result = await provider.generate(request)
-        
-        # 返回字典格式结果
-        return {
-            "success": result.success,
-            "images": result.images,
-            "provider": result.provider,
-            "model": result.model,
-            "message": result.message
-        }
-        
-    except Exception as e:
-        # 统一错误处理
-        return {
+        while not task.done():
+            waiter = asyncio.ensure_future(mailbox.ready.wait())
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if mailbox.event is not None:
+                yield mailbox.take()
+        if mailbox.event is not None:
+            yield mailbox.take()
+        yield task.result()
+    finally:
+        # 调用方提前停止迭代时取消仍在执行的请求
+        if waiter is not None:
+            waiter.cancel()
+        task.cancel()
+
+
+async def _provider_generate(
+    provider: BaseProvider,
+    request: ImageGenerationRequest,
+    model: str
+) -> ImageGenerationResult:
+    """
+    调用 Provider 生成图片
+
+    端点不支持原生 n 且 n>1 时，拆分为 n 个单图子请求并发执行（同时进行的数量受
+    fanout.concurrency 限制），按顺序合并图片。部分子请求失败时仍视为成功并返回已生成的图片，
+    失败数量和原因记录在 message 中；全部失败时返回失败结果。
+    """
+    config = get_config()
+    n = request.n or 1
+    if n <= 1 or provider.supports_native_n(model) or not config.get_fanout_enabled():
+        return await provider.generate(request)
+
+    # 子请求的载荷完全相同，需跳过缓存和请求合并才能各自得到新图片
+    sub_request = request.copy(n=1, cache=False)
+    semaphore = asyncio.Semaphore(min(n, config.get_fanout_concurrency()))
+
+    async def generate_one(index: int) -> ImageGenerationResult:
+        async with semaphore:
+            with span("fanout.generate", index=index):
+                return await provider.generate(sub_request)
+
+    with span("fanout", n=n) as current:
+        results = await asyncio.gather(*(generate_one(index) for index in range(n)))
+        succeeded = [result for result in results if result.success]
+        current.set_attribute("succeeded", len(succeeded))
+
+    failed = [result for result in results if not result.success]
+    base = succeeded[0] if succeeded else failed[0]
+    message = None
+    if failed:
+        message = f"{len(failed)}/{n} 个子请求失败: {failed[0].message}"
+    return ImageGenerationResult(
+        success=bool(succeeded),
+        images=[image for result in succeeded for image in result.images],
+        provider=base.provider,
+        model=base.model,
+        message=message,
+        raw_response={"responses": [result.raw_response for result in results]},
+        attempts=sum(result.attempts for result in results),
+        error_type=None if succeeded else base.error_type,
+        files=[item for result in succeeded for item in result.files]
+    )
+
+
+async def _attempt(
+    request: ImageGenerationRequest,
+    provider_name: str,
+    model: str,
+    hedge: bool = False
+) -> Tuple[ImageGenerationResult, Dict[str, Any]]:
+    """
+    向指定供应商/模型发起一次尝试
+
+    Returns:
+        Tuple[结果, 尝试记录]
+    """
+    overrides: Dict[str, Any] = {}
+    if provider_name != request.provider or model != request.model:
+        overrides.update(provider=provider_name, model=model)
+    if hedge:
+        # 对冲请求需要真正发往上游，不能命中缓存或与原请求合并
+        overrides["cache"] = False
+    attempt_request = request.copy(**overrides) if overrides else request
+
+    # 获取 Provider 并生成图片
+    provider = await aget_provider(provider_name)
+    start = time.monotonic()
+    with span(f"{provider_name}.generate", model=model, hedge=hedge) as current:
+        result = await _provider_generate(provider, attempt_request, model)
+        current.set_attribute("success", result.success)
+    latency = time.monotonic() - start
+
+    if not result.cached:
+        get_health_tracker().record(provider_name, result.success, latency)
+        if result.success:
+            get_hedge_policy().observe(provider_name, model, latency)
+
+    attempt = {
+        "provider": provider_name,
+        "model": result.model or model,
+        "success": result.success,
+        "message": result.message,
+        "latency": latency,
+        "attempts": result.attempts,
+    }
+    if hedge:
+        attempt["hedge"] = True
+    return result, attempt
+
+
+async def _hedged_attempt(
+    request: ImageGenerationRequest,
+    primary: Tuple[str, str],
+    backup: Tuple[str, str]
+) -> Tuple[List[Tuple[Optional[ImageGenerationResult], Dict[str, Any]]], List[Tuple[str, str]]]:
+    """
+    带对冲的尝试
+
+    首选请求超过对冲延迟仍未完成且预算允许时，向 backup 发出重复请求；
+    先成功者胜出，另一个被取消。
+
+    Returns:
+        Tuple[按完成顺序排列的 (结果, 尝试记录), 实际发出请求的 (供应商, 模型)]
+    """
+    policy = get_hedge_policy()
+    policy.note_request()
+
+    first_start = time.monotonic()
+    first = asyncio.ensure_future(_attempt(request, *primary))
+    done, _ = await asyncio.wait({first}, timeout=policy.delay_for(*primary))
+    if done or not policy.try_acquire():
+        return [await first], [primary]
+
+    second = asyncio.ensure_future(_attempt(request, *backup, hedge=True))
+    tasks = {
+        first: (primary, False, first_start),
+        second: (backup, True, time.monotonic()),
+    }
+    pending = set(tasks)
+    outcomes = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcomes.append(task.result())
+                if task is second and task.result()[0].success:
+                    policy.note_hedge_win()
+            if any(result.success for result, _ in outcomes):
+                break
+    finally:
+        # 取消落败的请求
+        for task in pending:
+            task.cancel()
+
+    for task in pending:
+        (provider_name, model), hedge, started = tasks[task]
+        attempt = {
+            "provider": provider_name,
+            "model": model,
             "success": False,
-            "images": [],
-            "provider": inputs.get("provider"),
-            "model": inputs.get("model"),
-            "message": f"Skill 执行错误: {str(e)}"
+            "message": "已取消（另一请求先完成）",
+            "latency": time.monotonic() - started,
+            "cancelled": True,
         }
+        if hedge:
+            attempt["hedge"] = True
+        outcomes.append((None, attempt))
+    return outcomes, [primary, backup]
+
+
+async def _generate(request: ImageGenerationRequest) -> ImageGenerationResult:
+    """
+    路由请求并调用 Provider
+
+    - 开启故障转移时，按 get_failover_chain() 的顺序依次尝试，直到成功
+    - 开启对冲时，首个尝试超过对冲延迟仍未完成会向下一个候选（没有则为同一端点）发出重复请求
+    每次尝试都会记录到结果的 attempt_chain 中，并更新供应商健康度。
+    """
+    config = get_config()
+    failover = request.failover
+    if failover is None:
+        failover = config.get_failover_enabled()
+    hedge = request.hedge
+    if hedge is None:
+        hedge = config.get_hedging_enabled()
+
+    model = request.model or config.get_default_model()
+    if failover or hedge:
+        chain = get_failover_chain(request.provider, model)
+    else:
+        chain = [(resolve_provider_name(request.provider, model), model)]
+
+    outcomes: List[Tuple[Optional[ImageGenerationResult], Dict[str, Any]]] = []
+    remaining = chain if failover else chain[:1]
+    if hedge:
+        backup = chain[1] if len(chain) > 1 else chain[0]
+        hedged, dispatched = await _hedged_attempt(request, chain[0], backup)
+        outcomes.extend(hedged)
+        # 只跳过实际发出过请求的候选；未发出对冲时 backup 仍按故障转移顺序尝试
+        remaining = [item for item in remaining if item not in dispatched]
+
+    for provider_name, attempt_model in remaining:
+        if any(result is not None and result.success for result, _ in outcomes):
+            break
+        outcomes.append(await _attempt(request, provider_name, attempt_model))
+
+    # 优先返回成功的结果，否则返回最后一个完成的结果
+    finished = [result for result, _ in outcomes if result is not None]
+    result = next((r for r in finished if r.success), finished[-1])
+    result.attempt_chain = [attempt for _, attempt in outcomes]
+    return result
 
 
 # 同步版本（如果需要）
@@ -64,5 +368,209 @@ def run_sync(inputs: dict) -> dict:
     同步版本的 Skill 入口
     使用 asyncio.run 在同步上下文中运行异步函数
     """
-    import asyncio
     return asyncio.run(run(inputs))
+
+
+class BatchStats:
+    """批量任务统计（吞吐量与延迟）"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record(self, result: dict, latency: float):
+        """记录一个已完成的请求"""
+        self.completed += 1
+        if result.get("success"):
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    @property
+    def elapsed(self) -> float:
+        """批量任务已运行的秒数"""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """吞吐量（每秒完成的请求数）"""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        """平均单请求延迟（秒）"""
+        return self.latency_total / self.completed if self.completed else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed": self.elapsed,
+            "throughput": self.throughput,
+            "latency_total": self.latency_total,
+            "latency_avg": self.avg_latency,
+            "latency_max": self.latency_max,
+        }
+
+
+def _batch_provider_key(inputs: dict) -> Optional[str]:
+    """解析批量任务中单个请求将使用的 Provider，用于分供应商限流"""
+    try:
+        return resolve_provider_name(inputs.get("provider"), inputs.get("model"))
+    except Exception:
+        # 无法解析时交给 run() 返回错误结果，这里不做限流
+        return None
+
+
+async def _timed_run(inputs: dict) -> Tuple[dict, float]:
+    """执行单个请求并返回 (结果, 耗时)"""
+    start = time.monotonic()
+    result = await run(inputs)
+    return result, time.monotonic() - start
+
+
+async def run_batch(
+    inputs: Iterable[dict],
+    concurrency: Optional[int] = None,
+    per_provider: Optional[Dict[str, int]] = None,
+    ordered: bool = False,
+    stats: Optional[BatchStats] = None
+) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    批量执行图片生成请求
+
+    请求按需从 inputs 中拉取，不会一次性创建所有任务，适合上千条提示词的任务。
+
+    使用示例：
+        stats = BatchStats()
+        async for index, result in run_batch(prompts, concurrency=16, stats=stats):
+            print(index, result["images"])
+        print(stats.to_dict())
+
+    Args:
+        inputs: 输入参数的可迭代对象，每项与 run() 的 inputs 相同
+        concurrency: 全局并发数，默认读取配置 batch.concurrency
+        per_provider: 每个供应商的并发上限，如 {"blt": 4}，默认读取配置 batch.per_provider
+        ordered: True 按输入顺序产出结果，False 按完成顺序产出
+        stats: 可选的统计对象，执行过程中实时更新
+
+    Yields:
+        Tuple[int, dict]: (输入序号, run() 的返回结果)
+    """
+    config = get_config()
+    if concurrency is None:
+        concurrency = config.get_batch_concurrency()
+    limits = per_provider if per_provider is not None else config.get_batch_per_provider()
+    if concurrency < 1 or any(limit < 1 for limit in limits.values()):
+        raise ValueError("并发数必须大于 0")
+    stats = stats if stats is not None else BatchStats()
+
+    # 因供应商并发已满而暂缓的请求上限，避免无限预读输入
+    lookahead = concurrency * 4
+    # 按顺序产出时，已拉取但尚未产出的请求上限，限制结果缓冲区大小
+    window = concurrency + lookahead
+
+    source = iter(enumerate(inputs))
+    running: Dict[asyncio.Future, Tuple[int, Optional[str]]] = {}
+    active: Dict[Optional[str], int] = defaultdict(int)
+    deferred: Dict[Optional[str], deque] = defaultdict(deque)
+    buffered: Dict[int, dict] = {}
+    state = {"exhausted": False, "pulled": 0, "deferred": 0, "next_yield": 0}
+
+    def has_capacity(provider: Optional[str]) -> bool:
+        limit = limits.get(provider)
+        return limit is None or active[provider] < limit
+
+    def start(index: int, item: dict, provider: Optional[str]):
+        active[provider] += 1
+        running[asyncio.ensure_future(_timed_run(item))] = (index, provider)
+
+    def fill():
+        # 先调度之前暂缓的请求
+        for provider, queue in deferred.items():
+            while queue and len(running) < concurrency and has_capacity(provider):
+                index, item = queue.popleft()
+                state["deferred"] -= 1
+                start(index, item, provider)
+
+        # 再从输入中拉取新请求
+        while (
+            not state["exhausted"]
+            and len(running) < concurrency
+            and state["deferred"] < lookahead
+        ):
+            if ordered and state["pulled"] - state["next_yield"] >= window:
+                break
+            try:
+                index, item = next(source)
+            except StopIteration:
+                state["exhausted"] = True
+                break
+            state["pulled"] += 1
+            stats.submitted += 1
+            provider = _batch_provider_key(item)
+            if has_capacity(provider):
+                start(index, item, provider)
+            else:
+                deferred[provider].append((index, item))
+                state["deferred"] += 1
+
+    stats.started_at = time.monotonic()
+    stats.finished_at = None
+    try:
+        while True:
+            fill()
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: running[t][0]):
+                index, provider = running.pop(task)
+                active[provider] -= 1
+                result, latency = task.result()
+                stats.record(result, latency)
+                if ordered:
+                    buffered[index] = result
+                else:
+                    yield index, result
+
+            if ordered:
+                while state["next_yield"] in buffered:
+                    index = state["next_yield"]
+                    state["next_yield"] += 1
+                    yield index, buffered.pop(index)
+    finally:
+        # 调用方提前停止迭代时取消仍在执行的请求
+        for task in running:
+            task.cancel()
+        stats.finished_at = time.monotonic()
+
+
+def run_batch_sync(inputs: Iterable[dict], **kwargs) -> List[dict]:
+    """
+    同步版本的批量入口
+    整个批次共用一个事件循环，按输入顺序返回结果列表
+
+    Args:
+        inputs: 输入参数的可迭代对象
+        **kwargs: 传给 run_batch 的其他参数（concurrency、per_provider、stats）
+    """
+    async def collect() -> List[dict]:
+        return [result async for _, result in run_batch(inputs, ordered=True, **kwargs)]
+
+    return asyncio.run(collect())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+自适应并发限制测试（不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.utils.adaptive_concurrency import AdaptiveLimiter
+from image_generation_master.utils.http_client import HttpStatusError
+from image_generation_master.utils.metrics import ADAPTIVE_LIMIT, ADAPTIVE_WAITING, render_metrics
+
+
+def _run(limiter, count, fn):
+    async def scenario():
+        results = await asyncio.gather(*(limiter.call(fn) for _ in range(count)), return_exceptions=True)
+        return results
+    return asyncio.run(scenario())
+
+
+def test_grows_when_saturated():
+    """并发用满且延迟平稳时上限逐步增加"""
+    print("🧪 测试自适应并发")
+    limiter = AdaptiveLimiter("t", initial_limit=2, max_limit=8)
+
+    async def ok():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    _run(limiter, 40, ok)
+    assert limiter.limit > 2, limiter.snapshot()
+    print(f"✅ 上限增至 {limiter.limit}")
+
+
+def test_backs_off_on_429_once_per_window():
+    """429 时上限减半，同一批失败只收缩一次"""
+    limiter = AdaptiveLimiter("t", initial_limit=8)
+    limiter.baseline = 10.0
+
+    async def throttled():
+        raise HttpStatusError("too many requests", status=429)
+
+    _run(limiter, 8, throttled)
+    assert limiter.limit == 4
+    assert limiter.snapshot()["decreases"] == 1
+
+
+def test_backs_off_on_latency_inflation():
+    """延迟超过基线的 latency_tolerance 倍时收缩"""
+    limiter = AdaptiveLimiter("t", initial_limit=8, latency_tolerance=2.0)
+    limiter.baseline = 0.01
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    _run(limiter, 1, slow)
+    assert limiter.limit == 4
+
+
+def test_exports_limit_and_queue_depth():
+    """当前上限和排队数导出为指标"""
+    print("🧪 测试自适应并发指标")
+    labels = {"provider": "metrics-test", "model": "m"}
+    limiter = AdaptiveLimiter("metrics-test:m", initial_limit=2, labels=labels)
+    limiter.baseline = 10.0
+    release = asyncio.Event()
+
+    async def held():
+        await release.wait()
+        return "ok"
+
+    async def throttled():
+        raise HttpStatusError("too many requests", status=429)
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(limiter.call(held)) for _ in range(6)]
+        await asyncio.sleep(0.01)
+        during = (ADAPTIVE_LIMIT.get(**labels), ADAPTIVE_WAITING.get(**labels))
+        release.set()
+        await asyncio.gather(*tasks)
+        try:
+            await limiter.call(throttled)
+        except HttpStatusError:
+            pass
+        return during
+
+    during = asyncio.run(scenario())
+    assert during == (2, 4), during
+    assert ADAPTIVE_WAITING.get(**labels) == 0
+    assert ADAPTIVE_LIMIT.get(**labels) == limiter.limit == 1
+    assert 'image_gen_adaptive_limit{provider="metrics-test",model="m"} 1' in render_metrics()
+    print("✅ 上限与排队数已导出")
+
+
+if __name__ == "__main__":
+    test_grows_when_saturated()
+    test_backs_off_on_429_once_per_window()
+    test_backs_off_on_latency_inflation()
+    test_exports_limit_and_queue_depth()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+批量生成测试（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run_batch, run_batch_sync, BatchStats
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.providers import BaseProvider, register_provider
+
+
+class FakeProvider(BaseProvider):
+    """记录并发数的模拟 Provider"""
+
+    name = "fake"
+    active = 0
+    peak = 0
+
+    async def generate(self, request):
+        FakeProvider.active += 1
+        FakeProvider.peak = max(FakeProvider.peak, FakeProvider.active)
+        try:
+            # 序号越小耗时越长，使完成顺序与输入顺序相反
+            await asyncio.sleep(0.01 * (10 - int(request.prompt)))
+        finally:
+            FakeProvider.active -= 1
+        return ImageGenerationResult(
+            success=True,
+            images=[f"http://img/{request.prompt}.png"],
+            provider=self.name,
+            model=request.model
+        )
+
+
+register_provider("fake", FakeProvider)
+
+INPUTS = [{"prompt": str(i), "provider": "fake", "model": "m"} for i in range(10)]
+
+
+def test_run_batch_limits_concurrency():
+    """per_provider 限制应生效，统计应完整"""
+    print("🧪 测试批量并发限制")
+    FakeProvider.peak = 0
+    stats = BatchStats()
+
+    async def main():
+        return [
+            item async for item in run_batch(
+                INPUTS, concurrency=8, per_provider={"fake": 3}, stats=stats
+            )
+        ]
+
+    results = asyncio.run(main())
+    assert len(results) == 10
+    assert FakeProvider.peak == 3, FakeProvider.peak
+    assert stats.completed == stats.succeeded == 10
+    assert stats.throughput > 0
+    print(f"✅ 统计: {stats.to_dict()}")
+
+
+def test_run_batch_ordered():
+    """ordered=True 时按输入顺序返回"""
+    print("🧪 测试按输入顺序返回")
+    results = run_batch_sync(INPUTS, concurrency=10)
+    assert [r["images"][0] for r in results] == [
+        f"http://img/{i}.png" for i in range(10)
+    ]
+    print("✅ 顺序正确")
+
+
+def test_run_batch_rejects_zero_concurrency():
+    """显式传入 0 或负数的并发数时报错，而不是改用配置中的默认值"""
+    for value in (0, -1):
+        try:
+            run_batch_sync(INPUTS, concurrency=value)
+            raise AssertionError(f"concurrency={value} 应抛出 ValueError")
+        except ValueError:
+            pass
+    try:
+        run_batch_sync(INPUTS, per_provider={"fake": 0})
+        raise AssertionError("per_provider 为 0 时应抛出 ValueError")
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_run_batch_limits_concurrency()
+    test_run_batch_ordered()
+    test_run_batch_rejects_zero_concurrency()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+基准测试工具测试（使用本地模拟服务，不调用真实 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.benchmark import StubServer, StubSettings, run_benchmark, percentile, format_report
+from image_generation_master.utils.http_client import get_http_client, HttpStatusError
+from image_generation_master.utils.connection_pool import get_pool_manager
+from image_generation_master.providers import reload_provider
+
+ENV_KEYS = ("BLT_BASE_URL", "GRSAI_BASE_URL", "BLT_API_KEY", "GRSAI_API_KEY")
+
+
+def test_percentile():
+    """最近秩法分位数"""
+    print("🧪 测试分位数")
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.5
+    assert percentile(values, 99) == 0.99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
+    print("✅ 分位数正确")
+
+
+def test_stub_error_injection():
+    """错误率为 1 时模拟服务总是返回配置的状态码"""
+    print("🧪 测试模拟服务错误注入")
+
+    async def main():
+        server = StubServer("blt", StubSettings(latency=0, error_rate=1.0, error_status=429))
+        await server.start()
+        try:
+            await get_http_client().post_json(
+                f"{server.url}/v1/images/generations",
+                {"model": "nano-banana", "prompt": "cat"},
+                headers={"Authorization": "Bearer k"}
+            )
+        except HttpStatusError as e:
+            return e, server.stats()
+        finally:
+            get_pool_manager().close()
+            await server.close()
+
+    error, stats = asyncio.run(main())
+    assert error.status == 429 and error.headers.get("retry-after") == "0"
+    assert stats == {"requests": 1, "errors": 1}, stats
+    print("✅ 返回 429 与 Retry-After")
+
+
+def test_run_benchmark_against_stubs():
+    """run() 与 run_batch() 经由模拟服务完成，报告包含吞吐量与延迟分位数"""
+    print("🧪 测试基准测试流程")
+    saved = {key: os.environ.get(key) for key in ENV_KEYS}
+
+    async def main():
+        settings = StubSettings(latency=0.01, sse_events=2, payload_size=1024)
+        blt, grsai = StubServer("blt", settings), StubServer("grsai", settings)
+        await blt.start()
+        await grsai.start()
+        os.environ.update(
+            BLT_BASE_URL=blt.url, GRSAI_BASE_URL=grsai.url, BLT_API_KEY="k", GRSAI_API_KEY="k"
+        )
+        try:
+            reports = await run_benchmark(
+                ["blt", "grsai", "grsai-completions"], ["run", "batch"],
+                requests=8, concurrency=4, warmup=0
+            )
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            await reload_provider("blt")
+            await reload_provider("grsai")
+            get_pool_manager().close()
+            await blt.close()
+            await grsai.close()
+        return reports, blt.stats(), grsai.stats()
+
+    reports, blt_stats, grsai_stats = asyncio.run(main())
+    assert len(reports) == 6
+    for report in reports:
+        assert report["requests"] == 8 and report["failed"] == 0, report
+        assert report["throughput"] > 0
+        assert 0 < report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"]
+    assert blt_stats["requests"] == 16 and grsai_stats["requests"] == 32
+    print(format_report(reports))
+    print("✅ 基准测试完成")
+
+
+if __name__ == "__main__":
+    test_percentile()
+    test_stub_error_injection()
+    test_run_benchmark_against_stubs()
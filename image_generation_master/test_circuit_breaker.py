@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+熔断器测试（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.models import equivalence
+from image_generation_master.providers import BaseProvider, register_provider, get_failover_chain
+from image_generation_master.utils.http_client import HttpStatusError
+from image_generation_master.utils.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    get_circuit_breakers,
+    CLOSED,
+    OPEN,
+    HALF_OPEN
+)
+
+
+class FlakyProvider(BaseProvider):
+    """经过 _execute 调用、按类属性决定是否返回 500 的模拟 Provider"""
+
+    name = "flaky"
+    failing = True
+    calls = 0
+
+    def endpoint_for(self, model):
+        return "/v1/gen"
+
+    async def generate(self, request):
+        try:
+            return await self._execute(request, "/v1/gen", {"prompt": request.prompt}, request.model)
+        except Exception as e:
+            return ImageGenerationResult(success=False, provider=self.name, model=request.model, message=str(e))
+
+    async def _call_api(self, payload, endpoint, api_key=None):
+        FlakyProvider.calls += 1
+        if self.failing:
+            raise HttpStatusError("server error", status=500)
+        return {"url": "http://flaky/1.png"}
+
+    def _parse_response(self, api_response, model):
+        return ImageGenerationResult(success=True, images=[api_response["url"]], provider=self.name, model=model)
+
+
+register_provider("flaky", FlakyProvider)
+
+
+async def _fail(breaker):
+    async def boom():
+        raise HttpStatusError("busy", status=503)
+    try:
+        await breaker.call(boom)
+    except HttpStatusError:
+        pass
+
+
+def test_state_transitions():
+    """错误率超过阈值时打开，冷却后半开，探测成功后关闭"""
+    print("🧪 测试熔断状态")
+    breaker = CircuitBreaker("t", window=4, min_calls=4, open_duration=0.05)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        for _ in range(4):
+            await _fail(breaker)
+        assert breaker.state == OPEN
+        try:
+            await breaker.call(ok)
+            raise AssertionError("应当快速失败")
+        except CircuitOpenError:
+            pass
+        await asyncio.sleep(0.06)
+        assert breaker.state == HALF_OPEN
+        assert await breaker.call(ok) == "ok"
+        assert breaker.state == CLOSED
+
+    asyncio.run(scenario())
+    print(f"✅ {breaker.snapshot()}")
+
+
+def test_client_errors_do_not_trip():
+    """4xx 客户端错误不计入错误率"""
+    breaker = CircuitBreaker("t", window=4, min_calls=4)
+
+    async def bad_request():
+        raise HttpStatusError("bad", status=400)
+
+    async def scenario():
+        for _ in range(4):
+            try:
+                await breaker.call(bad_request)
+            except HttpStatusError:
+                pass
+
+    asyncio.run(scenario())
+    assert breaker.state == CLOSED
+
+
+def test_open_circuit_fast_fails_and_reroutes():
+    """端点熔断后请求快速失败，故障转移链把熔断的端点排到最后"""
+    registry = get_circuit_breakers()
+    registry._breakers["flaky:/v1/gen"] = CircuitBreaker("flaky:/v1/gen", window=2, min_calls=2, open_duration=60)
+    group = [("flaky", "m"), ("blt", "nano-banana")]
+    equivalence.EQUIVALENT_MODEL_GROUPS.append(group)
+    try:
+        for _ in range(2):
+            asyncio.run(run({"prompt": "猫", "provider": "flaky", "model": "m"}))
+        calls = FlakyProvider.calls
+        result = asyncio.run(run({"prompt": "猫", "provider": "flaky", "model": "m"}))
+        assert not result["success"] and "熔断" in result["message"], result
+        assert FlakyProvider.calls == calls
+        assert get_failover_chain("flaky", "m") == [("blt", "nano-banana"), ("flaky", "m")]
+    finally:
+        equivalence.EQUIVALENT_MODEL_GROUPS.remove(group)
+        registry.reset()
+
+
+if __name__ == "__main__":
+    test_state_transitions()
+    test_client_errors_do_not_trip()
+    test_open_circuit_fast_fails_and_reroutes()
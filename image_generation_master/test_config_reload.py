@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+配置快照与热加载测试（使用临时配置文件，不调用 API）
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.utils import config_loader
+from image_generation_master.utils.config_loader import Config, ConfigSnapshot
+
+
+def _write(path: Path, timeout: int, extra: str = ""):
+    """先写临时文件再替换配置文件，并把修改时间推后以保证与上一版本不同"""
+    temp = path.with_suffix(".tmp")
+    temp.write_text(
+        f"config:\n  reload_interval: 0.05\ndefaults:\n  timeout: {timeout}\n{extra}", encoding="utf-8"
+    )
+    version = time.time_ns() + timeout * 1_000_000_000
+    os.utime(temp, ns=(version, version))
+    os.replace(temp, path)
+
+
+def _with_config_file(test):
+    """在临时配置文件上运行 test(path, config)"""
+    original = config_loader._find_config_file
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "config.yaml"
+        config_loader._find_config_file = lambda: path if path.exists() else None
+        try:
+            return test(path, Config())
+        finally:
+            config_loader._find_config_file = original
+
+
+def test_snapshot_lookup():
+    """扁平索引与原来的逐层查找结果一致，环境变量和派生值按快照固定"""
+    print("🧪 测试配置快照")
+
+    snapshot = ConfigSnapshot(
+        {"blt": {"api_key": "file-key", "rate_limit": {"rps": 2}, "empty": None}, "defaults": {"n": 0}},
+        env={"GRSAI_API_KEY": "env-key"}
+    )
+    assert snapshot.get("blt.rate_limit") == {"rps": 2}
+    assert snapshot.get("blt.rate_limit.rps") == 2
+    assert snapshot.get("blt.empty", "d") == "d"
+    assert snapshot.get("blt.api_key.x", "d") == "d"
+    assert snapshot.get("defaults.n", 1) == 0
+    assert snapshot.env("GRSAI_API_KEY") == "env-key"
+
+    calls = []
+    first = snapshot.derive("keys", lambda s: calls.append(1) or [("k", 1.0)])
+    assert snapshot.derive("keys", lambda s: calls.append(1)) is first and len(calls) == 1
+    print("✅ 查找结果正确，派生值只计算一次")
+
+
+def test_reload_on_mtime_change():
+    """配置文件修改后自动加载，已固定的快照不变"""
+    print("🧪 测试按修改时间热加载")
+
+    def check(path, config):
+        _write(path, 10)
+        assert config.get_timeout() == 10
+        keys = config.get_blt_api_keys()
+        assert config.get_blt_api_keys() is keys
+
+        with config.pin() as pinned:
+            _write(path, 20, "blt:\n  api_key: rotated\n")
+            time.sleep(0.1)
+
+            async def inflight():
+                # 请求中创建的任务继承固定的快照
+                return await asyncio.ensure_future(asyncio.sleep(0, config.get_timeout()))
+
+            assert config.get_timeout() == 10 and asyncio.run(inflight()) == 10
+        assert pinned.get("defaults.timeout") == 10
+
+        assert config.get_timeout() == 20
+        assert config.snapshot() is not pinned
+        if not os.getenv("BLT_API_KEY"):
+            assert config.get_blt_api_keys() == [("rotated", 1.0)]
+
+        # 文件写到一半（解析失败）时保留旧快照
+        current = config.snapshot()
+        path.write_text("defaults: [unclosed", encoding="utf-8")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 99_000_000_000))
+        time.sleep(0.1)
+        assert config.snapshot() is current and config.get_timeout() == 20
+        path.write_text("", encoding="utf-8")
+        time.sleep(0.1)
+        assert config.snapshot() is current
+
+        _write(path, 30)
+        time.sleep(0.1)
+        assert config.get_timeout() == 30
+
+    _with_config_file(check)
+    print("✅ 新请求使用新配置，进行中的请求保持旧配置")
+
+
+def test_concurrent_reads_during_reload():
+    """读取方在不断替换快照时始终看到完整的某一版本"""
+    print("🧪 测试并发读取与替换")
+
+    def check(path, config):
+        _write(path, 1)
+        config.get_timeout()
+        stop = threading.Event()
+        seen, errors = set(), []
+
+        def reader():
+            while not stop.is_set():
+                snapshot = config.snapshot()
+                timeout = snapshot.get("defaults.timeout")
+                if timeout is None or snapshot.get("config.reload_interval") != 0.05:
+                    errors.append(timeout)
+                seen.add(timeout)
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for timeout in range(2, 30):
+            _write(path, timeout)
+            config.reload()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return seen, errors
+
+    seen, errors = _with_config_file(check)
+    assert not errors, errors
+    assert seen <= set(range(1, 30)) and len(seen) > 1, seen
+    print(f"✅ 读取到 {len(seen)} 个版本，均完整")
+
+
+if __name__ == "__main__":
+    test_snapshot_lookup()
+    test_reload_on_mtime_change()
+    test_concurrent_reads_during_reload()
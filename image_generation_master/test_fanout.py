@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+多图拆分测试：端点不支持原生 n 时拆分为并发的单图子请求（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.providers import BaseProvider, register_provider
+from image_generation_master.providers.blt_provider import BltProvider
+from image_generation_master.providers.grsai_provider import GrsaiProvider
+
+
+class SingleImageProvider(BaseProvider):
+    """每次只生成一张图片的模拟 Provider，记录调用次数和最大并发"""
+
+    name = "single"
+    native_n = False
+    fail_calls = ()
+    calls = 0
+    active = 0
+    peak = 0
+    requests = []
+
+    def supports_native_n(self, model):
+        return self.native_n
+
+    async def generate(self, request):
+        cls = type(self)
+        cls.calls += 1
+        index = cls.calls
+        cls.requests.append(request)
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            cls.active -= 1
+        if index in self.fail_calls:
+            return ImageGenerationResult(
+                success=False, provider=self.name, model=request.model,
+                message="API 失败: busy", attempts=1, error_type="http_error"
+            )
+        return ImageGenerationResult(
+            success=True,
+            images=[f"http://single/{index}.png"],
+            provider=self.name,
+            model=request.model,
+            attempts=1
+        )
+
+
+register_provider("single", SingleImageProvider)
+
+
+def _reset(native_n=False, fail_calls=()):
+    SingleImageProvider.native_n = native_n
+    SingleImageProvider.fail_calls = fail_calls
+    SingleImageProvider.calls = SingleImageProvider.active = SingleImageProvider.peak = 0
+    SingleImageProvider.requests = []
+
+
+def test_capabilities():
+    """内置 Provider 声明哪些模型支持原生 n"""
+    blt, grsai = BltProvider(), GrsaiProvider()
+    assert not blt.supports_native_n("nano-banana") and not blt.supports_native_n("flux-pro")
+    assert blt.supports_native_n("gpt-image-1") and blt.supports_native_n("flux-kontext-pro")
+    assert not grsai.supports_native_n("nano-banana-pro")
+    assert grsai.supports_native_n("sora-image")
+
+
+def test_fanout_merges_images():
+    """n=6 拆分为 6 个单图子请求，并发受 fanout.concurrency 限制"""
+    print("🧪 测试多图拆分")
+    _reset()
+    result = asyncio.run(run({"prompt": "猫", "provider": "single", "model": "m", "n": 6}))
+
+    assert result["success"], result
+    assert SingleImageProvider.calls == 6
+    assert sorted(result["images"]) == sorted(f"http://single/{i}.png" for i in range(1, 7))
+    assert result["attempts"] == 6 and result["message"] is None
+    assert 1 < SingleImageProvider.peak <= 4, SingleImageProvider.peak
+    # 子请求各自要一张新图片，跳过缓存和请求合并
+    assert all(r.n == 1 and r.cache is False for r in SingleImageProvider.requests)
+    print(f"✅ 合并 {len(result['images'])} 张图片，最大并发 {SingleImageProvider.peak}")
+
+
+def test_fanout_partial_failure():
+    """部分子请求失败时返回已成功的图片，全部失败时返回失败结果"""
+    print("🧪 测试部分子请求失败")
+    _reset(fail_calls=(2, 3))
+    result = asyncio.run(run({"prompt": "猫", "provider": "single", "model": "m", "n": 4}))
+    assert result["success"] and len(result["images"]) == 2, result
+    assert result["message"].startswith("2/4 个子请求失败"), result["message"]
+
+    _reset(fail_calls=(1, 2))
+    result = asyncio.run(run({"prompt": "猫", "provider": "single", "model": "m", "n": 2}))
+    assert not result["success"] and result["images"] == []
+    assert result["error_type"] == "http_error"
+    print("✅ 部分失败返回 2/4 张图片")
+
+
+def test_native_n_passes_through():
+    """支持原生 n 的端点或 n=1 时只调用一次"""
+    _reset(native_n=True)
+    asyncio.run(run({"prompt": "猫", "provider": "single", "model": "m", "n": 3}))
+    assert SingleImageProvider.calls == 1 and SingleImageProvider.requests[0].n == 3
+
+    _reset()
+    asyncio.run(run({"prompt": "猫", "provider": "single", "model": "m"}))
+    assert SingleImageProvider.calls == 1
+
+
+if __name__ == "__main__":
+    test_capabilities()
+    test_fanout_merges_images()
+    test_fanout_partial_failure()
+    test_native_n_passes_through()
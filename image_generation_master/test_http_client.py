@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+异步 HTTP 传输层测试（使用本地模拟服务，不调用真实 API）
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.utils.http_client import (
+    get_http_client, HttpStatusError, HttpConnectionError
+)
+from image_generation_master.utils.connection_pool import get_pool_manager
+from image_generation_master.utils.config_loader import get_config
+from image_generation_master.providers import get_provider, reload_provider, warmup_providers
+
+
+async def _handle(reader, writer, delay=0.3):
+    """极简 keep-alive HTTP 服务：延迟后返回一张图片"""
+    while True:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            break
+        length = 0
+        for line in head.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        body = json.loads(await reader.readexactly(length)) if length else {}
+        await asyncio.sleep(delay)
+
+        if body.get("prompt") == "error":
+            payload = b'{"error": "boom"}'
+            status = b"503 Service Unavailable"
+        else:
+            payload = json.dumps({"data": [{"url": "http://img/1.png"}]}).encode()
+            status = b"200 OK"
+
+        writer.write(
+            b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+            b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+        )
+        await writer.drain()
+    writer.close()
+
+
+async def _start_server():
+    server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def test_concurrent_runs_overlap():
+    """多个并发 run() 调用应在同一事件循环中重叠执行"""
+    print("🧪 测试并发请求重叠执行")
+
+    async def main():
+        server, base_url = await _start_server()
+        os.environ["BLT_BASE_URL"] = base_url
+        os.environ["BLT_API_KEY"] = "test-key"
+        # Provider 实例长期复用，切换基础 URL 后需要重建
+        await reload_provider("blt")
+        try:
+            start = time.monotonic()
+            results = await asyncio.gather(*[
+                run({"prompt": f"cat {i}", "provider": "blt", "model": "nano-banana"})
+                for i in range(5)
+            ])
+            elapsed = time.monotonic() - start
+        finally:
+            os.environ.pop("BLT_BASE_URL")
+            os.environ.pop("BLT_API_KEY")
+            # 配置快照保存了环境变量，恢复后需重新加载
+            get_config().reload()
+            get_pool_manager().close()
+            server.close()
+            await server.wait_closed()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(main())
+    assert all(r["success"] for r in results), results
+    assert results[0]["images"] == ["http://img/1.png"]
+    # 5 个 0.3s 的请求串行需要 1.5s
+    assert elapsed < 1.0, elapsed
+    print(f"✅ 5 个请求耗时 {elapsed:.2f}s")
+
+
+def test_status_error():
+    """非 2xx 响应应抛出 HttpStatusError 并保留状态码"""
+    print("🧪 测试错误状态码")
+
+    async def main():
+        server, base_url = await _start_server()
+        try:
+            await get_http_client().post_json(f"{base_url}/x", {"prompt": "error"})
+        except HttpStatusError as e:
+            return e
+        finally:
+            get_pool_manager().close()
+            server.close()
+            await server.wait_closed()
+
+    error = asyncio.run(main())
+    assert error is not None
+    assert error.status == 503
+    assert "boom" in error.text()
+    print("✅ 状态码与响应体均已保留")
+
+
+def test_keep_alive_reuse():
+    """顺序请求应复用同一条连接"""
+    print("🧪 测试长连接复用")
+
+    async def main():
+        server, base_url = await _start_server()
+        try:
+            for i in range(3):
+                await get_http_client().post_json(f"{base_url}/x", {"prompt": f"cat {i}"})
+            return get_pool_manager().get_pool(base_url).stats()
+        finally:
+            get_pool_manager().close()
+            server.close()
+            await server.wait_closed()
+
+    stats = asyncio.run(main())
+    assert stats["created"] == 1, stats
+    assert stats["reused"] == 2, stats
+    assert stats["idle"] == 1 and stats["in_use"] == 0, stats
+    print(f"✅ 连接池统计: {stats}")
+
+
+def test_no_resend_after_body_written():
+    """复用连接在请求发出后断开时，POST 不在传输层重发，GET 换新连接重发"""
+    print("🧪 测试连接断开后的重发策略")
+    received = []
+
+    async def handle(reader, writer):
+        # 每条连接只应答第一个请求，读完第二个请求后直接断开
+        for index in range(2):
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                break
+            length = 0
+            for line in head.decode("latin-1").split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            received.append(head.split(b" ", 1)[0].decode())
+            if index == 1:
+                break
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        client = get_http_client()
+        try:
+            await client.request("POST", f"{base_url}/x", body=b"{}")
+            try:
+                await client.request("POST", f"{base_url}/x", body=b"{}")
+                raise AssertionError("应抛出 HttpConnectionError")
+            except HttpConnectionError:
+                pass
+            post_count = len(received)
+
+            await client.request("GET", f"{base_url}/x")
+            response = await client.request("GET", f"{base_url}/x")
+            return post_count, response.status
+        finally:
+            get_pool_manager().close()
+            server.close()
+            await server.wait_closed()
+
+    post_count, status = asyncio.run(main())
+    assert post_count == 2, received
+    assert status == 200 and received[2:] == ["GET", "GET", "GET"], received
+    print("✅ POST 只发送一次，GET 在新连接上重发成功")
+
+
+def test_provider_reuse_and_warmup():
+    """注册表应复用 Provider 实例，预热应提前建立连接"""
+    print("🧪 测试 Provider 复用与预热")
+
+    async def main():
+        server, base_url = await _start_server()
+        os.environ["BLT_BASE_URL"] = base_url
+        try:
+            old = get_provider("blt")
+            new = await reload_provider("blt")
+            assert new is not old
+            assert get_provider("blt") is new
+            assert get_provider(model="flux-pro") is new
+            errors = await warmup_providers(["blt"])
+            return errors, new.pool.stats()
+        finally:
+            os.environ.pop("BLT_BASE_URL")
+            get_config().reload()
+            get_pool_manager().close()
+            server.close()
+            await server.wait_closed()
+
+    errors, stats = asyncio.run(main())
+    assert errors == {"blt": None}, errors
+    assert stats["created"] == 1 and stats["idle"] == 1, stats
+    print("✅ 实例复用，预热连接已入池")
+
+
+if __name__ == "__main__":
+    test_concurrent_runs_overlap()
+    test_status_error()
+    test_keep_alive_reuse()
+    test_no_resend_after_body_written()
+    test_provider_reuse_and_warmup()
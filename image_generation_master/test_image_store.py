@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+图片下载与内容寻址存储测试（使用本地图片服务，不调用真实 API）
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.schema import ImageGenerationRequest, ImageGenerationResult
+from image_generation_master.providers import BaseProvider
+from image_generation_master.utils import image_store, result_cache
+from image_generation_master.utils.image_store import ImageStore
+from image_generation_master.utils.result_cache import ResultCache
+from image_generation_master.utils.connection_pool import get_pool_manager
+
+CAT = os.urandom(200 * 1024)
+DOG = os.urandom(1000)
+
+
+class ImageServer:
+    """极简图片服务：/cat.png（分块传输）、/dog、/copy（与 cat 相同内容）、/moved（重定向）、其他 404"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.requests = 0
+        self.url = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = "http://127.0.0.1:{}".format(self._server.sockets[0].getsockname()[1])
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            path = head.split(b" ")[1].decode()
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(self.delay)
+            self.active -= 1
+
+            if path in ("/cat.png", "/copy"):
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\nTransfer-Encoding: chunked\r\n\r\n")
+                for start in range(0, len(CAT), 30000):
+                    chunk = CAT[start:start + 30000]
+                    writer.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+            elif path == "/dog":
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: image/webp\r\nContent-Length: %d\r\n\r\n" % len(DOG) + DOG
+                )
+            elif path == "/moved":
+                writer.write(b"HTTP/1.1 302 Found\r\nLocation: /dog\r\nContent-Length: 0\r\n\r\n")
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def test_materialize_dedupes_and_bounds_concurrency():
+    """并发下载受上限约束，相同内容只保存一份，失败不影响其他图片"""
+    print("🧪 测试并发下载与内容寻址存储")
+
+    async def main(root):
+        server = ImageServer()
+        await server.start()
+        store = ImageStore(root, concurrency=2, chunk_size=8192)
+        urls = [f"{server.url}/{name}" for name in ("cat.png", "copy", "moved", "missing", "cat.png")]
+        try:
+            files = await store.materialize(urls + [
+                "data:image/gif;base64," + base64.b64encode(DOG).decode()
+            ])
+        finally:
+            get_pool_manager().close()
+            await server.close()
+        return files, store.stats(), server
+
+    with tempfile.TemporaryDirectory() as root:
+        files, stats, server = asyncio.run(main(root))
+        cat, copy, moved, missing, again, data = files
+
+        digest = hashlib.sha256(CAT).hexdigest()
+        assert cat["sha256"] == digest and cat["size"] == len(CAT)
+        assert cat["path"] == os.path.join(root, digest[:2], digest + ".png")
+        with open(cat["path"], "rb") as f:
+            assert f.read() == CAT
+        # 内容相同的不同 URL 指向同一个文件；同一 URL 的并发下载被合并
+        assert copy["path"] == cat["path"] and again["path"] == cat["path"]
+        assert moved["sha256"] == hashlib.sha256(DOG).hexdigest() and moved["path"].endswith(".webp")
+        assert data["sha256"] == moved["sha256"] and data["path"].endswith(".gif")
+        assert missing["path"] is None and "404" in missing["error"]
+        assert not os.listdir(os.path.join(root, "tmp")), "临时文件应已清理"
+
+    assert server.max_active <= 2, server.max_active
+    assert server.requests == 5, server.requests
+    assert stats["errors"] == 1 and stats["deduped"] == 1 and stats["in_flight"] == 0, stats
+    print(f"✅ 最大并发 {server.max_active}，下载 {stats['downloads']} 次，去重 {stats['deduped']} 次")
+
+
+def test_disk_io_off_event_loop():
+    """磁盘操作都在写入线程中执行，数据块按批写入；超过大小上限时清理临时文件"""
+    print("🧪 测试磁盘操作不阻塞事件循环")
+    PartialFile = image_store._PartialFile
+    calls = []
+
+    def record(name):
+        original = getattr(PartialFile, name)
+
+        def wrapper(self, *args):
+            calls.append((name, threading.current_thread().name))
+            return original(self, *args)
+        return original, wrapper
+
+    patched = {name: record(name) for name in ("open", "write", "commit", "discard")}
+
+    async def main(root):
+        server = ImageServer(delay=0)
+        await server.start()
+        store = ImageStore(root, chunk_size=8192)
+        limited = ImageStore(root, chunk_size=8192, max_bytes=1024)
+        try:
+            files = await store.materialize([
+                f"{server.url}/cat.png", "data:image/gif;base64," + base64.b64encode(DOG).decode()
+            ])
+            failed = await limited.materialize([f"{server.url}/cat.png"])
+            # 清理排在写入线程中，等它执行完再检查
+            await limited.run(lambda: None)
+        finally:
+            get_pool_manager().close()
+            await server.close()
+        return files, failed
+
+    for name, (_, wrapper) in patched.items():
+        setattr(PartialFile, name, wrapper)
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            files, failed = asyncio.run(main(root))
+            assert not os.listdir(os.path.join(root, "tmp")), "临时文件应已清理"
+    finally:
+        for name, (original, _) in patched.items():
+            setattr(PartialFile, name, original)
+
+    assert [f["size"] for f in files] == [len(CAT), len(DOG)]
+    assert failed[0]["path"] is None and "大小上限" in failed[0]["error"]
+    assert calls and all(thread.startswith("image-store") for _, thread in calls), calls
+    # 200 KiB 的图片按 8 KiB 分块下载，只写入一次
+    assert [name for name, _ in calls].count("write") == 2, calls
+    print(f"✅ {len(calls)} 次磁盘操作均在写入线程中执行")
+
+
+class ImageProvider(BaseProvider):
+    """返回本地图片服务 URL 的模拟 Provider"""
+
+    name = "images"
+
+    def __init__(self, url):
+        self.url = url
+        self.calls = 0
+
+    async def generate(self, request):
+        return await self._execute(request, "/v1/test", {"prompt": request.prompt}, request.model)
+
+    async def _call_api(self, payload, endpoint, api_key=None):
+        self.calls += 1
+        return {"urls": [f"{self.url}/cat.png", f"{self.url}/dog"]}
+
+    def _parse_response(self, api_response, model):
+        return ImageGenerationResult(
+            success=True, images=api_response["urls"], provider=self.name, model=model
+        )
+
+
+def test_provider_download_and_cache():
+    """download=True 时结果带本地文件；缓存命中且文件仍在时不再下载"""
+    print("🧪 测试 Provider 下载结果图片")
+    original_store, original_cache = image_store._store, result_cache._cache
+
+    async def main(root):
+        server = ImageServer(delay=0)
+        await server.start()
+        image_store._store = ImageStore(root)
+        result_cache._cache = ResultCache(enabled=True)
+        provider = ImageProvider(server.url)
+        try:
+            plain = await provider.generate(ImageGenerationRequest("猫", model="m", download=False, cache=False))
+            first = await provider.generate(ImageGenerationRequest("猫", model="m", download=True))
+            second = await provider.generate(ImageGenerationRequest("猫", model="m", download=True))
+        finally:
+            get_pool_manager().close()
+            await server.close()
+        return plain, first, second, server.requests, image_store._store.stats()
+
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            plain, first, second, requests, stats = asyncio.run(main(root))
+    finally:
+        image_store._store, result_cache._cache = original_store, original_cache
+
+    assert plain.files == []
+    assert [f["url"] for f in first.files] == first.images
+    assert [f["size"] for f in first.files] == [len(CAT), len(DOG)]
+    assert second.cached and second.files == first.files
+    assert requests == 2 and stats["reused"] == 2, (requests, stats)
+    assert first.to_dict()["files"] == first.files
+    print("✅ 本地文件已返回，缓存命中时复用")
+
+
+if __name__ == "__main__":
+    test_materialize_dedupes_and_bounds_concurrency()
+    test_disk_io_off_event_loop()
+    test_provider_download_and_cache()
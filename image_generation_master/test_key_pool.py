@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+API Key 池测试（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.providers import BaseProvider, register_provider
+from image_generation_master.utils import retry
+from image_generation_master.utils.retry import RetryPolicy
+from image_generation_master.utils.http_client import HttpStatusError
+from image_generation_master.utils.key_pool import KeyPool, get_key_pools
+from image_generation_master.utils.rate_limiter import key_id
+
+
+class KeyedProvider(BaseProvider):
+    """key-a 始终返回 429 的模拟 Provider"""
+
+    name = "keyed"
+    used = []
+
+    def get_api_keys(self):
+        return [("key-a", 1.0), ("key-b", 1.0)]
+
+    async def generate(self, request):
+        try:
+            return await self._execute(request, "/v1/gen", {"prompt": request.prompt}, request.model)
+        except Exception as e:
+            return ImageGenerationResult(success=False, provider=self.name, model=request.model, message=str(e))
+
+    async def _call_api(self, payload, endpoint, api_key=None):
+        KeyedProvider.used.append(api_key)
+        if api_key == "key-a":
+            raise HttpStatusError("too many requests", status=429, headers={"retry-after": "30"})
+        return {"url": "http://keyed/1.png"}
+
+    def _parse_response(self, api_response, model):
+        return ImageGenerationResult(success=True, images=[api_response["url"]], provider=self.name, model=model)
+
+
+register_provider("keyed", KeyedProvider)
+
+
+def test_least_outstanding_by_weight():
+    """按 未完成请求数 / 权重 分配 Key"""
+    print("🧪 测试 Key 分配")
+    pool = KeyPool("t", [("a", 2.0), ("b", 1.0)])
+    picked = [pool.acquire().key for _ in range(3)]
+    assert sorted(picked) == ["a", "a", "b"], picked
+    stats = pool.stats()
+    assert stats[key_id("a")]["outstanding"] == 2
+    print(f"✅ {picked}")
+
+
+def test_eject_and_fallback():
+    """429 的 Key 被摘除；全部摘除时选最早恢复的 Key"""
+    pool = KeyPool("t", [("a", 1.0), ("b", 1.0)], auth_cooldown=600)
+    a = pool.acquire()
+    pool.release(a, HttpStatusError("busy", status=429, headers={"retry-after": "5"}))
+    assert all(pool.acquire().key == "b" for _ in range(3))
+
+    b = pool.keys[1]
+    pool.release(b, HttpStatusError("unauthorized", status=401))
+    assert pool.acquire().key == "a"
+    assert pool.stats()[key_id("b")]["ejections"] == 1
+
+
+def test_retry_switches_key():
+    """429 后重试自动换用另一个 Key"""
+    retry._policies["keyed"] = RetryPolicy(base_delay=0.01)
+    try:
+        result = asyncio.run(run({"prompt": "猫", "provider": "keyed", "model": "m"}))
+        assert result["success"], result
+        assert KeyedProvider.used[-1] == "key-b" and result["attempts"] <= 2
+        if "key-a" in KeyedProvider.used:
+            assert get_key_pools().snapshot()["keyed"][key_id("key-a")]["ejected_for"] > 20
+    finally:
+        retry._policies.pop("keyed", None)
+        get_key_pools().reset()
+
+
+if __name__ == "__main__":
+    test_least_outstanding_by_weight()
+    test_eject_and_fallback()
+    test_retry_switches_key()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+运行指标测试（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.providers import BaseProvider, register_provider
+from image_generation_master.utils import metrics
+from image_generation_master.utils.metrics import MetricsRegistry, track_upstream, classify_error
+from image_generation_master.utils.http_client import HttpTimeoutError, HttpStatusError
+
+
+class MeteredProvider(BaseProvider):
+    """prompt 为 "fail" 时返回 API 失败的模拟 Provider"""
+
+    name = "metered"
+
+    async def generate(self, request):
+        ok = request.prompt != "fail"
+        return ImageGenerationResult(
+            success=ok,
+            images=["http://metered/1.png"] if ok else [],
+            provider=self.name,
+            model=request.model,
+            message=None if ok else "API 失败"
+        )
+
+
+register_provider("metered", MeteredProvider)
+
+
+def test_text_exposition():
+    """计数器和直方图按 Prometheus 文本格式导出"""
+    print("🧪 测试指标导出")
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "示例计数", ("provider",))
+    histogram = registry.histogram("demo_seconds", "示例耗时", ("provider",), buckets=(1, 5))
+    counter.inc(provider='b"lt')
+    histogram.observe(0.5, provider="blt")
+    histogram.observe(3, provider="blt")
+
+    text = registry.render()
+    assert "# TYPE demo_total counter" in text
+    assert 'demo_total{provider="b\\"lt"} 1' in text
+    assert 'demo_seconds_bucket{provider="blt",le="1"} 1' in text
+    assert 'demo_seconds_bucket{provider="blt",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{provider="blt"} 2' in text
+    print("✅ 导出格式正确")
+
+
+def test_track_upstream():
+    """统计上游调用的结果、字节数和进行中数量"""
+    labels = {"provider": "t", "endpoint": "/x"}
+    with track_upstream("t", "/x") as call:
+        call.sent(10)
+        assert metrics.UPSTREAM_IN_FLIGHT.get(**labels) == 1
+    try:
+        with track_upstream("t", "/x"):
+            raise HttpTimeoutError("请求超时")
+    except HttpTimeoutError:
+        pass
+    assert metrics.UPSTREAM_IN_FLIGHT.get(**labels) == 0
+    assert metrics.BYTES_SENT.get(**labels) == 10
+    assert metrics.UPSTREAM_REQUESTS.get(outcome="success", **labels) == 1
+    assert metrics.UPSTREAM_REQUESTS.get(outcome="timeout", **labels) == 1
+    assert classify_error(HttpStatusError("x", status=500)) == "http_error"
+    assert classify_error(KeyError("data")) == "parse_error"
+
+
+def test_run_outcomes():
+    """skill.run 按结果分类计数"""
+    labels = {"provider": "metered", "model": "m"}
+    asyncio.run(run({"prompt": "猫", "provider": "metered", "model": "m"}))
+    asyncio.run(run({"prompt": "fail", "provider": "metered", "model": "m"}))
+    assert metrics.REQUESTS.get(outcome="success", **labels) == 1
+    assert metrics.REQUESTS.get(outcome="api_failed", **labels) == 1
+    assert metrics.REQUEST_DURATION.get(**labels)["count"] == 2
+    assert metrics.REQUESTS_IN_FLIGHT.get() == 0
+    assert "image_gen_requests_total" in metrics.render_metrics()
+
+
+if __name__ == "__main__":
+    test_text_exposition()
+    test_track_upstream()
+    test_run_outcomes()
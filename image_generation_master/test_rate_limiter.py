@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+客户端限流器测试（不调用 API）
+"""
+import asyncio
+import time
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.utils.config_loader import get_config
+from image_generation_master.utils.rate_limiter import RateLimiter, RateLimiterRegistry, key_id
+
+
+def test_token_bucket_paces_requests():
+    """超出突发量的请求按速率排队放行"""
+    print("🧪 测试令牌桶")
+    limiter = RateLimiter("t", rps=20, burst=1)
+
+    async def one():
+        async with limiter.acquire():
+            pass
+
+    async def scenario():
+        start = time.monotonic()
+        await asyncio.gather(*(one() for _ in range(4)))
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed >= 0.14, elapsed
+    stats = limiter.stats()
+    assert stats["acquired"] == 4 and stats["waited"] == 3
+    print(f"✅ 4 个请求耗时 {elapsed:.2f}s，累计等待 {stats['wait_seconds']:.2f}s")
+
+
+def test_max_concurrent():
+    """并发数不超过 max_concurrent"""
+    limiter = RateLimiter("t", max_concurrent=2)
+    peak = {"now": 0, "max": 0}
+
+    async def one():
+        async with limiter.acquire():
+            peak["now"] += 1
+            peak["max"] = max(peak["max"], peak["now"])
+            await asyncio.sleep(0.02)
+            peak["now"] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(one() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak["max"] == 2
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_registry_per_key_and_model():
+    """按 API Key 和模型分别创建限流器"""
+    config = get_config()
+    settings = {"rps": 10, "models": {"nano-banana": {"max_concurrent": 1}}}
+    config.get_rate_limit = lambda provider: settings if provider == "blt" else {}
+    try:
+        registry = RateLimiterRegistry()
+        names = [l.name for l in registry.limiters_for("blt", "sk-a", "nano-banana")]
+        assert names == [f"blt:{key_id('sk-a')}:nano-banana", f"blt:{key_id('sk-a')}"]
+        assert len(registry.limiters_for("blt", "sk-b", "flux-pro")) == 1
+        assert registry.limiters_for("grsai", "sk-a", "nano-banana") == []
+        assert "sk-a" not in str(registry.snapshot())
+    finally:
+        del config.get_rate_limit
+
+
+if __name__ == "__main__":
+    test_token_bucket_paces_requests()
+    test_max_concurrent()
+    test_registry_per_key_and_model()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+本地参考图片编码测试（不调用 API）
+"""
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.schema import ImageGenerationRequest, ImageGenerationResult
+from image_generation_master.providers import BaseProvider
+from image_generation_master.providers.blt_provider import BltProvider
+from image_generation_master.providers.grsai_provider import GrsaiProvider
+from image_generation_master.utils import reference_images
+from image_generation_master.utils.reference_images import (
+    ReferenceEncoder,
+    READ_CHUNK_SIZE,
+    check_reference_paths
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + os.urandom(READ_CHUNK_SIZE * 2 + 1000)
+JPEG = b"\xff\xd8\xff\xe0" + os.urandom(500)
+
+
+def _decode(uri):
+    header, _, data = uri.partition(",")
+    return header, base64.b64decode(data)
+
+
+def test_encode_files_and_bytes():
+    """文件和字节编码为 data URI，相同内容只编码一次，URL 原样保留"""
+    print("🧪 测试参考图片编码")
+    encoder = ReferenceEncoder()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ref.bin"
+        path.write_bytes(PNG)
+
+        first = encoder.encode(path)
+        header, data = _decode(first)
+        assert header == "data:image/png;base64" and data == PNG
+        # 同一文件、相同内容的字节和 file:// 路径都命中缓存，返回同一个字符串对象
+        assert encoder.encode(Path(str(path))) is first
+        assert encoder.encode(PNG) is first
+        assert encoder.encode(f"file://{path}") is first
+        assert encoder.stats()["misses"] == 1 and encoder.stats()["hits"] == 3
+
+        # 文件修改后重新读取
+        path.write_bytes(JPEG)
+        os.utime(path, ns=(1, 1))
+        header, data = _decode(encoder.encode(path))
+        assert header == "data:image/jpeg;base64" and data == JPEG
+
+        assert encoder.encode("https://img/a.png") == "https://img/a.png"
+        assert encoder.encode("data:image/png;base64,AAAA") == "data:image/png;base64,AAAA"
+        # 只有 file:// 字符串被当作本地路径，其他字符串（包括看起来像路径的）原样传递
+        for url in ("s3://bucket/a.png", "oss://b/a.png", "//cdn/x.png", str(path)):
+            assert not reference_images.is_local_reference(url)
+            assert encoder.encode(url) == url
+        try:
+            encoder.encode(Path(tmp) / "missing.png")
+            raise AssertionError("不存在的文件应抛出异常")
+        except FileNotFoundError:
+            pass
+    print("✅ 编码正确，重复的参考图命中缓存")
+
+
+def test_cache_evicts_by_size():
+    """缓存总大小超过上限时淘汰最久未使用的条目"""
+    encoder = ReferenceEncoder(max_bytes=3000)
+    images = [bytes([i]) * 1000 for i in range(3)]
+    for image in images:
+        encoder.encode(image)
+    stats = encoder.stats()
+    assert stats["entries"] == 2 and stats["cached_bytes"] <= 3000, stats
+    encoder.encode(images[2])
+    assert encoder.stats()["hits"] == 1
+
+
+class UrlOnlyProvider(BaseProvider):
+    """只接受 URL 参考图的模拟 Provider"""
+
+    name = "url-only"
+
+    async def generate(self, request):
+        return ImageGenerationResult(success=True, images=await self.reference_images(request))
+
+
+def test_provider_payloads():
+    """内置 Provider 把本地参考图放入载荷，不支持的 Provider 报错"""
+    print("🧪 测试 Provider 载荷中的参考图片")
+    original = reference_images._encoder
+    reference_images._encoder = ReferenceEncoder()
+    captured = []
+
+    async def capture(request, endpoint, payload, model):
+        captured.append(payload)
+        return ImageGenerationResult(success=True, images=[], provider="test", model=model)
+
+    async def main(path):
+        refs = [path, JPEG, "https://img/style.png"]
+        blt, grsai = BltProvider(), GrsaiProvider()
+        blt._execute = grsai._execute = capture
+        for provider, model in ((blt, "nano-banana"), (grsai, "nano-banana"), (grsai, "sora-image")):
+            await provider.generate(ImageGenerationRequest("猫", model=model, image_urls=refs))
+        # 只传 URL 时不经过编码器，列表原样使用
+        urls = ["https://img/a.png"]
+        request = ImageGenerationRequest("猫", model="m", image_urls=urls)
+        assert await UrlOnlyProvider().reference_images(request) is urls
+        try:
+            await UrlOnlyProvider().generate(ImageGenerationRequest("猫", image_urls=[JPEG]))
+            raise AssertionError("不支持 data URI 的 Provider 应报错")
+        except ValueError:
+            pass
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "photo.png"
+            path.write_bytes(PNG)
+            asyncio.run(main(path))
+        stats = reference_images._encoder.stats()
+    finally:
+        reference_images._encoder = original
+
+    blt_refs = captured[0]["image"]
+    grsai_refs = [payload["urls"] for payload in captured[1:]]
+    for refs in [blt_refs] + grsai_refs:
+        assert _decode(refs[0])[1] == PNG and _decode(refs[1])[1] == JPEG
+        assert refs[2] == "https://img/style.png"
+    # 三个请求共 6 张本地参考图，只编码 2 次
+    assert stats["misses"] == 2 and stats["hits"] == 4, stats
+    print("✅ 三个请求共用 2 次编码")
+
+
+def test_check_reference_paths():
+    """不受信任的输入只能读取允许目录中的文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        allowed = os.path.join(tmp, "refs")
+        os.makedirs(allowed)
+        inside = f"file://{allowed}/a.png"
+        check_reference_paths(["https://img/a.png", "s3://b/a.png", inside], [allowed])
+        escapes = (
+            "file:///etc/passwd",
+            f"file://{allowed}/../secret.png",
+            f"file://{allowed}-other/a.png",
+        )
+        for item in escapes:
+            try:
+                check_reference_paths([item], [allowed])
+                raise AssertionError(f"应拒绝 {item}")
+            except ValueError:
+                pass
+        # 未配置允许的目录时拒绝所有本地路径
+        try:
+            check_reference_paths([inside], [])
+            raise AssertionError("应拒绝本地路径")
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_encode_files_and_bytes()
+    test_cache_evicts_by_size()
+    test_provider_payloads()
+    test_check_reference_paths()
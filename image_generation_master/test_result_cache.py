@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+结果缓存与相同请求合并测试（不调用 API）
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.schema import ImageGenerationRequest, ImageGenerationResult
+from image_generation_master.providers import BaseProvider
+from image_generation_master.utils import result_cache
+from image_generation_master.utils.result_cache import ResultCache, MemoryCache, make_cache_key
+from image_generation_master.utils.singleflight import SingleFlight
+from image_generation_master.utils.config_loader import get_config, ConfigSnapshot
+from image_generation_master.utils.metrics import SINGLEFLIGHT_SHARED, render_metrics
+
+
+class CountingProvider(BaseProvider):
+    """统计上游调用次数的模拟 Provider"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, request):
+        payload = {"model": request.model, "prompt": request.prompt}
+        return await self._execute(request, "/v1/test", payload, request.model)
+
+    async def _call_api(self, payload, endpoint, api_key=None):
+        self.calls += 1
+        return {"url": f"http://img/{self.calls}.png"}
+
+    def _parse_response(self, api_response, model):
+        return ImageGenerationResult(
+            success=True, images=[api_response["url"]], provider=self.name, model=model
+        )
+
+
+def test_cache_key_is_order_independent():
+    """缓存键不受字典顺序影响"""
+    assert make_cache_key("p", "/e", {"a": 1, "b": 2}) == make_cache_key("p", "/e", {"b": 2, "a": 1})
+    assert make_cache_key("p", "/e", {"a": 1}) != make_cache_key("q", "/e", {"a": 1})
+
+
+def test_memory_lru_and_ttl():
+    """内存缓存按 LRU 淘汰并在 TTL 后过期"""
+    cache = MemoryCache(max_entries=2, ttl=60)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.get("a")
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None and cache.get("a") == {"v": 1}
+    cache.set("d", {"v": 4}, expires_at=time.time() - 1)
+    assert cache.get("d") is None
+
+
+def test_disk_tier_shared():
+    """磁盘缓存可被另一个缓存实例（模拟另一个进程）读取"""
+    print("🧪 测试磁盘缓存")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.db")
+        ResultCache(enabled=True, disk_path=path).set("k", {"images": ["u"]})
+        other = ResultCache(enabled=True, disk_path=path)
+        assert other.get("k") == {"images": ["u"]}
+        assert other.get("k") == {"images": ["u"]}
+        stats = other.stats()
+        assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1, stats
+    print("✅ 磁盘缓存命中")
+
+
+def test_disk_tier_off_event_loop():
+    """其他进程持有写锁时，磁盘写入在专用线程中等待，事件循环不被阻塞"""
+    print("🧪 测试磁盘缓存不阻塞事件循环")
+    import sqlite3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.db")
+        cache = ResultCache(enabled=True, disk_path=path)
+        cache.set("warm", {"images": []})
+        holder = sqlite3.connect(path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.ensure_future(ticker())
+            asyncio.get_running_loop().call_later(0.3, holder.rollback)
+            start = time.monotonic()
+            await cache.aset("k", {"images": ["u"]})
+            elapsed = time.monotonic() - start
+            task.cancel()
+            return ticks, elapsed, await cache.aget("k")
+
+        try:
+            ticks, elapsed, value = asyncio.run(main())
+        finally:
+            holder.close()
+
+    assert elapsed >= 0.25 and value == {"images": ["u"]}
+    # 等待写锁期间其他协程照常运行
+    assert ticks >= 10, ticks
+    assert cache.errors == 0
+    print(f"✅ 等待写锁 {elapsed:.2f}s 期间事件循环运行了 {ticks} 次")
+
+
+def test_provider_cache_and_bypass():
+    """相同请求第二次命中缓存，cache=False 时跳过缓存"""
+    print("🧪 测试 Provider 缓存与跳过")
+    original = result_cache._cache
+    result_cache._cache = ResultCache(enabled=True)
+    try:
+        provider = CountingProvider()
+
+        async def main():
+            first = await provider.generate(ImageGenerationRequest("猫", model="m"))
+            second = await provider.generate(ImageGenerationRequest("猫", model="m"))
+            bypass = await provider.generate(ImageGenerationRequest("猫", model="m", cache=False))
+            return first, second, bypass
+
+        first, second, bypass = asyncio.run(main())
+    finally:
+        result_cache._cache = original
+
+    assert not first.cached and second.cached
+    assert second.images == first.images
+    assert not bypass.cached and provider.calls == 2
+    print("✅ 缓存命中与跳过均正确")
+
+
+def test_singleflight_coalesces():
+    """同时发起的相同调用只执行一次"""
+    print("🧪 测试相同请求合并")
+    flight = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"url": "u"}
+
+    async def main():
+        return await asyncio.gather(*[flight.do("k", upstream) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+    print("✅ 节省 4 次上游调用")
+
+
+def test_provider_dedupe_metric():
+    """Provider 加入进行中的相同请求时计入 image_gen_singleflight_shared_total"""
+    provider = CountingProvider()
+    before = SINGLEFLIGHT_SHARED.get(provider="counting")
+
+    async def main():
+        with get_config().pin(ConfigSnapshot({"dedupe": {"enabled": True}})):
+            return await asyncio.gather(*[
+                provider.generate(ImageGenerationRequest("狗", model="m")) for _ in range(3)
+            ])
+
+    results = asyncio.run(main())
+    assert provider.calls == 1 and all(r.success for r in results)
+    assert SINGLEFLIGHT_SHARED.get(provider="counting") - before == 2
+    assert 'image_gen_singleflight_shared_total{provider="counting"}' in render_metrics()
+
+
+def test_singleflight_leader_cancel():
+    """leader 被取消时其他等待者仍能拿到结果"""
+    flight = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ("ok", True)
+
+
+if __name__ == "__main__":
+    test_cache_key_is_order_independent()
+    test_memory_lru_and_ttl()
+    test_disk_tier_shared()
+    test_disk_tier_off_event_loop()
+    test_provider_cache_and_bypass()
+    test_singleflight_coalesces()
+    test_provider_dedupe_metric()
+    test_singleflight_leader_cancel()
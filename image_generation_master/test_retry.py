@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+重试策略测试（使用模拟 API 调用，不调用 API）
+"""
+import asyncio
+import sys
+import time
+import os
+from email.utils import formatdate
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.utils.retry import RetryPolicy, RetryBudget, parse_retry_after
+from image_generation_master.utils.http_client import HttpStatusError, HttpConnectionError
+
+
+def _flaky(errors):
+    """依次抛出 errors 中的异常，之后返回成功"""
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return {"ok": True}
+    return fn, calls
+
+
+def test_parse_retry_after():
+    """Retry-After 支持秒数和 HTTP 日期"""
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("bogus") is None
+    delay = parse_retry_after(formatdate(timeval=time.time() + 10, usegmt=True))
+    assert 8 <= delay <= 10
+
+
+def test_retry_until_success():
+    """可重试错误重试后成功，并返回尝试次数"""
+    print("🧪 测试重试")
+    policy = RetryPolicy(base_delay=0.01)
+    fn, calls = _flaky([
+        HttpStatusError("busy", status=503),
+        HttpConnectionError("reset"),
+    ])
+    result, attempts = asyncio.run(policy.call(fn))
+    assert result == {"ok": True} and attempts == 3
+    assert policy.stats()["retries"] == 2
+    print(f"✅ 尝试 {attempts} 次后成功")
+
+
+def test_non_retryable_error():
+    """不可重试的错误立即抛出，异常带有尝试次数"""
+    policy = RetryPolicy(base_delay=0.01)
+    fn, calls = _flaky([HttpStatusError("bad request", status=400)])
+    try:
+        asyncio.run(policy.call(fn))
+        raise AssertionError("应当抛出异常")
+    except HttpStatusError as e:
+        assert e.attempts == 1 and len(calls) == 1
+
+
+def test_retry_after_exceeds_budget():
+    """Retry-After 超过单请求等待上限时不再重试"""
+    policy = RetryPolicy(max_elapsed=5)
+    fn, calls = _flaky([HttpStatusError("slow down", status=429, headers={"retry-after": "60"})])
+    try:
+        asyncio.run(policy.call(fn))
+        raise AssertionError("应当抛出异常")
+    except HttpStatusError:
+        assert len(calls) == 1
+
+
+def test_retry_budget():
+    """全局重试预算用尽后不再重试"""
+    policy = RetryPolicy(base_delay=0.01, budget=RetryBudget(ratio=0.0, min_retries=1))
+    fn, _ = _flaky([HttpStatusError("busy", status=503)])
+    asyncio.run(policy.call(fn))
+    fn, calls = _flaky([HttpStatusError("busy", status=503)])
+    try:
+        asyncio.run(policy.call(fn))
+        raise AssertionError("应当抛出异常")
+    except HttpStatusError:
+        assert len(calls) == 1
+    assert policy.stats()["budget_exhausted"] == 1
+
+
+if __name__ == "__main__":
+    test_parse_retry_after()
+    test_retry_until_success()
+    test_non_retryable_error()
+    test_retry_after_exceeds_budget()
+    test_retry_budget()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+路由测试：故障转移与对冲请求（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.models import equivalence
+from image_generation_master.providers import hedging
+from image_generation_master.providers.hedging import HedgePolicy
+from image_generation_master.providers import (
+    BaseProvider,
+    register_provider,
+    aget_provider,
+    startup_providers,
+    get_failover_chain,
+    get_health_tracker
+)
+
+
+class ScriptedProvider(BaseProvider):
+    """按类属性决定成功或失败的模拟 Provider"""
+
+    name = "scripted"
+    succeed = True
+    delay = 0.0
+
+    async def generate(self, request):
+        await asyncio.sleep(self.delay)
+        if not self.succeed:
+            return ImageGenerationResult(
+                success=False, provider=self.name, model=request.model, message="API 失败: busy"
+            )
+        return ImageGenerationResult(
+            success=True,
+            images=[f"http://{self.name}/{request.model}.png"],
+            provider=self.name,
+            model=request.model
+        )
+
+
+class PrimaryProvider(ScriptedProvider):
+    name = "primary"
+
+
+class BackupProvider(ScriptedProvider):
+    name = "backup"
+
+
+register_provider("primary", PrimaryProvider)
+register_provider("backup", BackupProvider)
+
+GROUP = [("primary", "m-1"), ("backup", "m-b")]
+
+
+def _with_group(fn):
+    """在测试期间临时声明等价模型组"""
+    def wrapper():
+        equivalence.EQUIVALENT_MODEL_GROUPS.append(GROUP)
+        get_health_tracker().reset()
+        PrimaryProvider.succeed = BackupProvider.succeed = True
+        PrimaryProvider.delay = BackupProvider.delay = 0.0
+        try:
+            fn()
+        finally:
+            hedging._policy = None
+            equivalence.EQUIVALENT_MODEL_GROUPS.remove(GROUP)
+            get_health_tracker().reset()
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
+@_with_group
+def test_failover_to_equivalent_model():
+    """首选失败时切换到等价模型，并记录尝试链"""
+    print("🧪 测试故障转移")
+    PrimaryProvider.succeed = False
+
+    result = asyncio.run(run({"prompt": "猫", "provider": "primary", "model": "m-1", "failover": True}))
+    assert result["success"], result
+    assert result["provider"] == "backup" and result["model"] == "m-b"
+    assert [(a["provider"], a["success"]) for a in result["attempt_chain"]] == [
+        ("primary", False), ("backup", True)
+    ]
+    print(f"✅ 尝试链: {result['attempt_chain']}")
+
+
+@_with_group
+def test_failover_disabled():
+    """未开启故障转移时只尝试一次"""
+    PrimaryProvider.succeed = False
+    result = asyncio.run(run({"prompt": "猫", "provider": "primary", "model": "m-1", "failover": False}))
+    assert not result["success"]
+    assert len(result["attempt_chain"]) == 1
+
+
+@_with_group
+def test_chain_prefers_healthy_provider():
+    """首选供应商健康分过低时优先尝试更健康的等价模型"""
+    tracker = get_health_tracker()
+    assert get_failover_chain("primary", "m-1") == GROUP
+    for _ in range(10):
+        tracker.record("primary", False, 1.0)
+    assert get_failover_chain("primary", "m-1") == [GROUP[1], GROUP[0]]
+
+
+@_with_group
+def test_hedge_wins_and_cancels_loser():
+    """首选请求过慢时对冲请求胜出，落败请求被取消"""
+    print("🧪 测试对冲请求")
+    hedging._policy = HedgePolicy(delay=0.05, percentile=None, max_ratio=1.0)
+    PrimaryProvider.delay = 0.5
+
+    result = asyncio.run(run({"prompt": "猫", "provider": "primary", "model": "m-1", "hedge": True}))
+    assert result["success"] and result["provider"] == "backup", result
+    chain = result["attempt_chain"]
+    assert chain[0]["hedge"] and chain[0]["success"]
+    assert chain[1]["provider"] == "primary" and chain[1]["cancelled"]
+    assert hedging._policy.stats()["hedge_wins"] == 1
+    print(f"✅ 尝试链: {chain}")
+
+
+@_with_group
+def test_hedge_budget():
+    """预算用尽时不发出对冲请求"""
+    hedging._policy = HedgePolicy(delay=0.01, percentile=None, max_ratio=0.0)
+    PrimaryProvider.delay = 0.05
+
+    result = asyncio.run(run({"prompt": "猫", "provider": "primary", "model": "m-1", "hedge": True}))
+    assert result["provider"] == "primary"
+    assert len(result["attempt_chain"]) == 1
+    assert hedging._policy.stats()["denied"] == 1
+
+
+@_with_group
+def test_hedge_with_failover_fast_failure():
+    """首选在对冲延迟前失败时（未发出对冲请求），仍按故障转移切换到备选"""
+    hedging._policy = HedgePolicy(delay=1.0, percentile=None, max_ratio=1.0)
+    PrimaryProvider.succeed = False
+
+    result = asyncio.run(run({
+        "prompt": "猫", "provider": "primary", "model": "m-1", "hedge": True, "failover": True
+    }))
+    assert result["success"] and result["provider"] == "backup", result
+    chain = result["attempt_chain"]
+    assert [a["provider"] for a in chain] == ["primary", "backup"], chain
+    assert not any(a.get("hedge") for a in chain)
+    assert hedging._policy.stats()["hedged"] == 0
+
+
+def test_hedge_delay_percentile():
+    """样本足够时使用延迟分位数作为对冲延迟"""
+    policy = HedgePolicy(delay=30, percentile=0.9, min_samples=10)
+    assert policy.delay_for("p", "m") == 30
+    for i in range(1, 11):
+        policy.observe("p", "m", float(i))
+    assert policy.delay_for("p", "m") == 9.0
+
+
+class LazyStartupProvider(ScriptedProvider):
+    """startup() 较慢且第一次会失败的模拟 Provider，未启动时 generate 失败"""
+
+    name = "lazy"
+    startups = 0
+    fail_first = False
+
+    async def startup(self):
+        cls = type(self)
+        cls.startups += 1
+        await asyncio.sleep(0.05)
+        if cls.fail_first and cls.startups == 1:
+            raise RuntimeError("startup failed")
+        self.ready = True
+
+    async def generate(self, request):
+        assert getattr(self, "ready", False), "startup() 未完成"
+        return await super().generate(request)
+
+
+def test_lazy_instance_started_once():
+    """首次使用时创建的实例只调用一次 startup()，并发请求等待同一次调用；失败后下次获取重试"""
+    print("🧪 测试按需创建的 Provider 实例会被启动")
+    register_provider("lazy", LazyStartupProvider)
+    LazyStartupProvider.startups = 0
+
+    async def main():
+        results = await asyncio.gather(*(
+            run({"prompt": "猫", "provider": "lazy", "model": "m", "cache": False}) for _ in range(3)
+        ))
+        await startup_providers(["lazy"])
+        return results
+
+    results = asyncio.run(main())
+    assert all(result["success"] for result in results), results
+    assert LazyStartupProvider.startups == 1, LazyStartupProvider.startups
+
+    register_provider("lazy", LazyStartupProvider)
+    LazyStartupProvider.startups = 0
+    LazyStartupProvider.fail_first = True
+
+    async def flaky():
+        try:
+            await aget_provider("lazy")
+            raise AssertionError("应抛出 startup 的异常")
+        except RuntimeError:
+            pass
+        return await aget_provider("lazy")
+
+    try:
+        provider = asyncio.run(flaky())
+    finally:
+        LazyStartupProvider.fail_first = False
+    assert provider.ready and LazyStartupProvider.startups == 2
+    print("✅ startup() 只调用一次，失败后重试成功")
+
+
+if __name__ == "__main__":
+    test_failover_to_equivalent_model()
+    test_failover_disabled()
+    test_chain_prefers_healthy_provider()
+    test_hedge_wins_and_cancels_loser()
+    test_hedge_budget()
+    test_hedge_with_failover_fast_failure()
+    test_hedge_delay_percentile()
+    test_lazy_instance_started_once()
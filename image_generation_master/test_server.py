@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+常驻服务测试（使用模拟 Provider，不调用 API）
+"""
+import asyncio
+import json
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import os
+import tempfile
+import time
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.server import SkillServer
+from image_generation_master.benchmark import StubServer, StubSettings
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.providers import BaseProvider, register_provider
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate.sh")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SlowProvider(BaseProvider):
+    """按提示词中的秒数延迟后返回的模拟 Provider"""
+
+    name = "slow"
+
+    async def generate(self, request):
+        await asyncio.sleep(float(request.prompt))
+        return ImageGenerationResult(
+            success=True,
+            images=[f"http://img/{request.prompt}.png"],
+            provider=self.name,
+            model=request.model
+        )
+
+
+register_provider("slow", SlowProvider)
+
+
+async def _request(path, method, target, body=None):
+    """通过 Unix 套接字发送一个 HTTP 请求，返回 (状态码, 响应体)"""
+    reader, writer = await asyncio.open_unix_connection(path)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n"
+        f"Connection: close\r\n\r\n".encode() + data
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), payload
+
+
+def test_endpoints():
+    """/run、/healthz、/readyz、/metrics 与未知路径"""
+    print("🧪 测试服务接口")
+
+    async def main(path):
+        server = SkillServer(warmup=False)
+        await server.start(path=path)
+        try:
+            run = await _request(path, "POST", "/run", {"prompt": "0", "provider": "slow", "model": "m"})
+            health = await _request(path, "GET", "/healthz")
+            ready = await _request(path, "GET", "/readyz")
+            metrics = await _request(path, "GET", "/metrics")
+            missing = await _request(path, "GET", "/nope")
+            bad = await _request(path, "POST", "/run", [1, 2])
+            # 未配置 references.allowed_dirs 时拒绝读取本地文件
+            local = await _request(path, "POST", "/run", {"prompt": "0", "image_urls": ["file:///etc/passwd"]})
+        finally:
+            await server.stop()
+        return run, health, ready, metrics, missing, bad, local, os.path.exists(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run, health, ready, metrics, missing, bad, local, exists = asyncio.run(main(os.path.join(tmp, "d.sock")))
+
+    assert run[0] == 200
+    result = json.loads(run[1])
+    assert result["success"] and result["images"] == ["http://img/0.png"], result
+    assert health[0] == 200 and ready[0] == 200
+    assert json.loads(ready[1])["ready"] is True
+    assert metrics[0] == 200 and b"image_gen_requests_total" in metrics[1]
+    assert missing[0] == 404 and bad[0] == 400
+    assert local[0] == 400 and "不允许读取" in json.loads(local[1])["message"]
+    assert not exists, "停止后应删除套接字文件"
+    print("✅ 接口正常")
+
+
+def test_graceful_stop():
+    """停止时进行中的请求完成，新请求和就绪检查返回 503"""
+    print("🧪 测试优雅停止")
+
+    async def main(path):
+        server = SkillServer(warmup=False)
+        await server.start(path=path)
+        inflight = asyncio.ensure_future(
+            _request(path, "POST", "/run", {"prompt": "0.3", "provider": "slow", "model": "m"})
+        )
+        while server.inflight == 0:
+            await asyncio.sleep(0.01)
+
+        # 先在 keep-alive 连接上完成一次请求，确保连接已被服务接受
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b"GET /healthz HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.lower().split(b"content-length: ")[1].split(b"\r\n")[0])
+        await reader.readexactly(length)
+
+        # 停止开始后，同一连接上的下一个请求不再被处理
+        stopping = asyncio.ensure_future(server.stop())
+        await asyncio.sleep(0.05)
+        try:
+            writer.write(b"GET /readyz HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            await writer.drain()
+            ready = await reader.read()
+        except ConnectionError:
+            ready = b""
+        writer.close()
+
+        await stopping
+        return await inflight, ready
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (status, body), ready = asyncio.run(main(os.path.join(tmp, "d.sock")))
+
+    assert status == 200 and json.loads(body)["success"]
+    assert b" 503 " in ready or ready == b"", ready
+    print("✅ 进行中的请求已完成")
+
+
+def test_generate_sh_uses_daemon():
+    """generate.sh 检测到服务时通过套接字调用"""
+    if shutil.which("curl") is None or shutil.which("bash") is None:
+        print("⚠️  未安装 curl 或 bash，跳过")
+        return
+    print("🧪 测试 generate.sh 调用常驻服务")
+
+    async def main(path):
+        server = SkillServer(warmup=False)
+        await server.start(path=path)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "bash", SCRIPT, "0", "--provider", "slow", "--model", "m",
+                stdout=asyncio.subprocess.PIPE,
+                env=dict(os.environ, IMAGE_GEN_SOCKET=path)
+            )
+            out, _ = await proc.communicate()
+        finally:
+            await server.stop()
+        return proc.returncode, out.decode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        code, out = asyncio.run(main(os.path.join(tmp, "d.sock")))
+
+    # slow Provider 只注册在本进程中，结果来自服务即证明未回退到进程内执行
+    assert code == 0, out
+    assert '"provider": "slow"' in out and "http://img/0.png" in out, out
+    print("✅ 结果来自常驻服务")
+
+
+async def _run_script_against(path, responses):
+    """
+    启动按路径返回固定响应的模拟服务，执行 generate.sh
+
+    Args:
+        responses: 路径 -> (状态码, 响应体)
+
+    Returns:
+        Tuple[退出码, 输出, 模拟服务收到的请求路径]
+    """
+    seen = []
+
+    async def handle(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        target = head.split(b" ")[1].decode().split("?")[0]
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        if length:
+            await reader.readexactly(length)
+        seen.append(target)
+        status, body = responses[target]
+        writer.write(
+            f"HTTP/1.1 {status} X\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_unix_server(handle, path)
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "bash", SCRIPT, "0", "--provider", "slow", "--model", "m",
+            stdout=asyncio.subprocess.PIPE,
+            env=dict(os.environ, IMAGE_GEN_SOCKET=path)
+        )
+        out, _ = await proc.communicate()
+    finally:
+        server.close()
+        await server.wait_closed()
+    return proc.returncode, out.decode(), seen
+
+
+def test_generate_sh_fallback_rules():
+    """只有服务未就绪时才回退到进程内执行；/run 出错时返回服务的错误响应"""
+    if shutil.which("curl") is None or shutil.which("bash") is None:
+        print("⚠️  未安装 curl 或 bash，跳过")
+        return
+    print("🧪 测试 generate.sh 回退规则")
+    error = json.dumps({"success": False, "message": "daemon-boom"}).encode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "d.sock")
+        code, out, seen = asyncio.run(_run_script_against(path, {
+            "/readyz": (200, b"{}"),
+            "/run": (502, error),
+        }))
+        # 请求已交给服务：不回退，原样返回服务的错误
+        assert code == 1 and "daemon-boom" in out, out
+        assert seen == ["/readyz", "/run"], seen
+
+        code, out, seen = asyncio.run(_run_script_against(path, {
+            "/readyz": (503, b"{}"),
+            "/run": (200, error),
+        }))
+        # 服务未就绪：不发送 /run，在进程内执行
+        assert seen == ["/readyz"], seen
+        assert "daemon-boom" not in out and '"success"' in out, out
+
+        # 残留的套接字文件（连接被拒绝）：在进程内执行
+        stale = os.path.join(tmp, "stale.sock")
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(stale)
+        try:
+            proc = subprocess.run(
+                ["bash", SCRIPT, "0", "--provider", "slow", "--model", "m"],
+                capture_output=True, text=True, env=dict(os.environ, IMAGE_GEN_SOCKET=stale)
+            )
+        finally:
+            sock.close()
+        assert "curl 退出码" not in proc.stdout and '"success"' in proc.stdout, proc.stdout
+    print("✅ 回退规则正确")
+
+
+def _children(pid):
+    """返回 pid 的子进程集合（读取 /proc）"""
+    children = set()
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            if ppid == pid:
+                children.add(int(name))
+    return children
+
+
+def _requests_total(metrics: bytes) -> float:
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in metrics.decode().splitlines()
+        if line.startswith("image_gen_requests_total{")
+    )
+
+
+def test_prefork_workers():
+    """多进程模式：指标跨进程汇总，SIGHUP 滚动替换，SIGTERM 等待进行中的请求"""
+    if not hasattr(os, "fork") or not os.path.isdir("/proc"):
+        print("⚠️  当前平台不支持多进程模式，跳过")
+        return
+    print("🧪 测试多进程模式")
+
+    async def wait_for(predicate, timeout=15):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            result = predicate()
+            if asyncio.iscoroutine(result):
+                result = await result
+            if result:
+                return result
+            await asyncio.sleep(0.05)
+        raise AssertionError("等待超时")
+
+    async def main(path):
+        blt = StubServer("blt", StubSettings(latency=0.3))
+        grsai = StubServer("grsai", StubSettings(latency=0.3))
+        await blt.start()
+        await grsai.start()
+        env = dict(
+            os.environ, BLT_BASE_URL=blt.url, GRSAI_BASE_URL=grsai.url, BLT_API_KEY="k", GRSAI_API_KEY="k"
+        )
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "image_generation_master.server", "--workers", "2", "--socket", path,
+            cwd=ROOT, env=env, stdout=asyncio.subprocess.DEVNULL
+        )
+        inputs = {"provider": "blt", "model": "nano-banana", "cache": False}
+        try:
+            async def ready():
+                if not os.path.exists(path) or len(_children(proc.pid)) != 2:
+                    return False
+                try:
+                    return (await _request(path, "GET", "/readyz"))[0] == 200
+                except OSError:
+                    return False
+
+            await wait_for(ready)
+            first = _children(proc.pid)
+
+            results = await asyncio.gather(*[
+                _request(path, "POST", "/run", dict(inputs, prompt=f"cat {i}")) for i in range(6)
+            ])
+            before = _requests_total((await _request(path, "GET", "/metrics"))[1])
+
+            # SIGHUP 后启动新一代工作进程，旧进程退出，累计指标保留
+            proc.send_signal(signal.SIGHUP)
+            second = await wait_for(
+                lambda: (lambda c: c if len(c) == 2 and not (c & first) else None)(_children(proc.pid))
+            )
+            await wait_for(ready)
+            after = _requests_total((await _request(path, "GET", "/metrics"))[1])
+
+            # SIGTERM 时进行中的请求仍然完成
+            inflight = asyncio.ensure_future(_request(path, "POST", "/run", dict(inputs, prompt="last")))
+            await asyncio.sleep(0.1)
+            proc.send_signal(signal.SIGTERM)
+            last = await inflight
+            code = await asyncio.wait_for(proc.wait(), 15)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            await blt.close()
+            await grsai.close()
+        return results, before, after, first, second, last, code, os.path.exists(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results, before, after, first, second, last, code, exists = asyncio.run(
+            main(os.path.join(tmp, "d.sock"))
+        )
+
+    assert all(status == 200 and json.loads(body)["success"] for status, body in results), results
+    assert before == 6, before
+    assert after == 6, after
+    assert not (first & second)
+    assert last[0] == 200 and json.loads(last[1])["success"], last
+    assert code == 0 and not exists
+    print(f"✅ 工作进程 {sorted(first)} -> {sorted(second)}，请求计数 {after:.0f}")
+
+
+if __name__ == "__main__":
+    test_endpoints()
+    test_graceful_stop()
+    test_generate_sh_uses_daemon()
+    test_generate_sh_fallback_rules()
+    test_prefork_workers()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+SSE 增量解析测试（不调用 API）
+"""
+import asyncio
+import json
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.utils.sse import SSEDecoder, SSEEventTooLarge
+from image_generation_master.providers import grsai_provider
+from image_generation_master.providers.grsai_provider import GrsaiProvider
+
+
+STREAM = (
+    b': keep-alive\r\n\r\n'
+    b'data: {"status": "running", "progress": 10}\r\n\r\n'
+    b'data: {"status": "running", "progress": 80}\n\n'
+    b'data: {"status": "succeeded", "results": [{"url": "http://img/1.png"}]}\n\n'
+    b'data: [DONE]\n\n'
+)
+
+
+def test_decoder_any_chunking():
+    """任意切分字节流都应得到相同的事件序列"""
+    print("🧪 测试 SSE 任意切分")
+
+    expected = None
+    for size in (1, 2, 7, 64, len(STREAM)):
+        decoder = SSEDecoder()
+        events = []
+        for i in range(0, len(STREAM), size):
+            events.extend(decoder.feed(STREAM[i:i + size]))
+        events.extend(decoder.flush())
+        data = [e.data for e in events]
+        if expected is None:
+            expected = data
+        assert data == expected, (size, data)
+
+    assert len(expected) == 4
+    assert expected[-1] == "[DONE]"
+    print(f"✅ 解析出 {len(expected)} 个事件")
+
+
+def test_decoder_buffer_stays_small():
+    """已完成的帧不应留在缓冲区中"""
+    decoder = SSEDecoder()
+    for _ in range(1000):
+        decoder.feed(b'data: {"status": "running"}\n\n')
+    assert len(decoder._buffer) == 0
+
+
+def test_decoder_caps_event_size():
+    """未用空行分隔的 data 行或不换行的长行超过上限时报错，而不是无限累积"""
+    for chunk in (b'data: {"progress": 1}\n', b"data: " + b"x" * 64):
+        decoder = SSEDecoder(max_event_bytes=1000)
+        try:
+            for _ in range(100):
+                decoder.feed(chunk)
+            raise AssertionError("应抛出 SSEEventTooLarge")
+        except SSEEventTooLarge:
+            pass
+        assert len(decoder._buffer) <= 1000 + len(chunk)
+    # 正常分隔的帧不受影响
+    decoder = SSEDecoder(max_event_bytes=100)
+    for _ in range(1000):
+        decoder.feed(b'data: {"progress": 1}\n\n')
+
+
+class FakeResponse:
+    """按固定大小切分响应体的模拟流式响应"""
+
+    def __init__(self, body, chunk_size=5):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.chunk_size = chunk_size
+
+    async def iter_chunks(self):
+        for i in range(0, len(self.body), self.chunk_size):
+            yield self.body[i:i + self.chunk_size]
+
+
+def _read(body):
+    return asyncio.run(GrsaiProvider()._read_sse_response(FakeResponse(body)))
+
+
+def test_grsai_parse_last_frame():
+    """GrsAI 解析器应返回最后一个有效结果，并兼容非 SSE 响应"""
+    print("🧪 测试 GrsAI 结果帧解析")
+
+    result = _read(STREAM)
+    assert result["status"] == "succeeded"
+    assert result["results"][0]["url"] == "http://img/1.png"
+
+    # 未用空行分隔的 data 行
+    merged = 'data: {"progress": 1}\ndata: {"status": "failed"}\n'
+    assert _read(merged) == {"status": "failed"}
+
+    # 直接返回 JSON 的错误响应
+    error = _read('{"code": -1, "msg": "余额不足"}')
+    assert error["code"] == -1
+    print("✅ 解析正确")
+
+
+def test_grsai_merged_done_line():
+    """结果帧与 [DONE] 之间没有空行时仍返回结果帧"""
+    body = 'data: {"status": "succeeded", "url": "http://img/1.png"}\ndata: [DONE]\n'
+    assert _read(body) == {"status": "succeeded", "url": "http://img/1.png"}
+    assert _read(body + "\n") == {"status": "succeeded", "url": "http://img/1.png"}
+
+
+def test_grsai_decodes_once():
+    """不需要进度时整个流只做一次 JSON 解析"""
+    calls = []
+
+    class CountingJson:
+        JSONDecodeError = json.JSONDecodeError
+
+        @staticmethod
+        def loads(text):
+            calls.append(text)
+            return json.loads(text)
+
+    body = "".join(f'data: {{"status": "running", "progress": {i}}}\n\n' for i in range(50))
+    body += 'data: {"status": "succeeded", "url": "http://img/1.png"}\n\ndata: [DONE]\n\n'
+    original = grsai_provider.json
+    grsai_provider.json = CountingJson
+    try:
+        assert _read(body)["status"] == "succeeded"
+    finally:
+        grsai_provider.json = original
+    assert len(calls) == 1, len(calls)
+
+
+def test_grsai_truncated_last_frame():
+    """最后一帧被截断或损坏时返回之前最后一个可解析的帧"""
+    body = (
+        'data: {"status": "running", "progress": 50}\n\n'
+        'data: {"status": "succeeded", "url": "http://img/1.png"}\n\n'
+        'data: {"status": "succ'
+    )
+    assert _read(body) == {"status": "succeeded", "url": "http://img/1.png"}
+    assert _read(body + '\n\ndata: [DONE]\n\n')["status"] == "succeeded"
+
+    # 没有任何可解析的帧时按解析错误处理
+    try:
+        _read('data: {"status": "succ\n\n')
+        raise AssertionError("应抛出 JSONDecodeError")
+    except json.JSONDecodeError:
+        pass
+
+
+if __name__ == "__main__":
+    test_decoder_any_chunking()
+    test_decoder_buffer_stays_small()
+    test_grsai_parse_last_frame()
+    test_grsai_merged_done_line()
+    test_grsai_truncated_last_frame()
+    test_grsai_decodes_once()
+    test_decoder_caps_event_size()
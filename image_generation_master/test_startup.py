@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+启动开销测试：导入包和 run() 时不应加载用不到的模块（在子进程中检查）
+"""
+import json
+import subprocess
+import sys
+import os
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master.benchmark.import_time import measure_import
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = [
+    "yaml",
+    "email.utils",
+    "image_generation_master.providers.blt_provider",
+    "image_generation_master.providers.grsai_provider",
+    "image_generation_master.models.blt_adapters",
+    "image_generation_master.models.grsai_mapper",
+]
+
+
+def _loaded_after(code: str, modules):
+    """在全新解释器中执行 code，返回 modules 中已被导入的模块"""
+    script = f"import sys, json\n{code}\nprint(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_package_import_is_lightweight():
+    """导入包本身不加载 asyncio、skill 和 PyYAML"""
+    print("🧪 测试包导入")
+    loaded = _loaded_after("import image_generation_master", HEAVY + ["asyncio", "image_generation_master.skill"])
+    assert loaded == [], loaded
+    print("✅ 未加载多余模块")
+
+
+def test_run_import_defers_providers():
+    """导入 run() 时不加载 Provider 实现、适配器和 PyYAML"""
+    print("🧪 测试 run() 导入")
+    loaded = _loaded_after("from image_generation_master import run", HEAVY + ["sqlite3"])
+    assert loaded == [], loaded
+    print("✅ Provider 与适配器均延迟加载")
+
+
+def test_provider_loaded_on_first_use():
+    """只加载实际用到的 Provider"""
+    print("🧪 测试按需加载 Provider")
+    loaded = _loaded_after(
+        "from image_generation_master.providers import get_provider\nget_provider('blt')",
+        HEAVY[2:]
+    )
+    assert loaded == [
+        "image_generation_master.providers.blt_provider",
+        "image_generation_master.models.blt_adapters",
+    ], loaded
+    print("✅ 只加载了 blt")
+
+
+def test_measure_import():
+    """导入耗时测量返回中位数和模块数"""
+    print("🧪 测试导入耗时测量")
+    package = measure_import("image_generation_master", runs=1)
+    skill = measure_import("image_generation_master.skill", runs=1)
+    assert package["median_ms"] > 0 and skill["median_ms"] > 0
+    assert package["modules"] < skill["modules"]
+    print(f"✅ 包 {package['median_ms']:.1f}ms，skill {skill['median_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    test_package_import_is_lightweight()
+    test_run_import_defers_providers()
+    test_provider_loaded_on_first_use()
+    test_measure_import()
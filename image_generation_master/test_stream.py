@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+流式进度接口测试（使用本地 GrsAI 模拟服务，不调用真实 API）
+"""
+import asyncio
+import sys
+import os
+import time
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run_stream, ImageGenerationProgress, ImageGenerationResult
+from image_generation_master.schema import ImageGenerationRequest
+from image_generation_master.benchmark import StubServer, StubSettings
+from image_generation_master.providers import reload_provider
+from image_generation_master.providers.grsai_provider import GrsaiProvider
+from image_generation_master.utils.connection_pool import get_pool_manager
+from image_generation_master.utils.progress import progress_sink
+from image_generation_master.utils import metrics
+
+ENV_KEYS = ("GRSAI_BASE_URL", "GRSAI_API_KEY")
+
+
+async def _with_stub(settings, body):
+    """启动 GrsAI 模拟服务并把客户端指向它，执行 body(server) 后恢复环境"""
+    saved = {key: os.environ.get(key) for key in ENV_KEYS}
+    server = StubServer("grsai", settings)
+    await server.start()
+    os.environ.update(GRSAI_BASE_URL=server.url, GRSAI_API_KEY="k")
+    try:
+        await reload_provider("grsai")
+        return await body(server)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        await reload_provider("grsai")
+        get_pool_manager().close()
+        await server.close()
+
+
+def test_shut_progress_follows_stream():
+    """只有在 run_stream() 中才向上游请求进度帧"""
+    provider = GrsaiProvider()
+    request = ImageGenerationRequest("猫", model="nano-banana")
+    assert provider._build_nano_banana_payload(request, "1:1")["shutProgress"] is True
+    with progress_sink(lambda event: None):
+        assert provider._build_nano_banana_payload(request, "1:1")["shutProgress"] is False
+        assert provider._build_completions_payload(request, "1024x1024")["shutProgress"] is False
+
+
+def test_run_stream_yields_progress_then_result():
+    """进度事件按到达顺序产出，最后一项为生成结果"""
+    print("🧪 测试流式进度")
+
+    async def body(server):
+        events = []
+        async for event in run_stream({"prompt": "猫", "provider": "grsai", "model": "nano-banana", "cache": False}):
+            events.append((time.monotonic(), event))
+        return events
+
+    events = asyncio.run(_with_stub(StubSettings(latency=0.4, sse_events=3), body))
+
+    *progress, (_, result) = events
+    assert isinstance(result, ImageGenerationResult) and result.success, result.to_dict()
+    assert result.images and result.provider == "grsai"
+    assert all(isinstance(event, ImageGenerationProgress) for _, event in progress)
+    percents = [event.progress for _, event in progress]
+    assert percents == sorted(percents) and percents[-1] == 100 and len(percents) >= 3, percents
+    assert progress[-1][1].images == result.images
+    # 进度在生成过程中陆续到达，而不是在结束时一次性产出
+    assert progress[-1][0] - progress[0][0] > 0.15
+    assert progress[0][1].to_dict()["type"] == "progress"
+    print(f"✅ 收到 {len(progress)} 个进度事件: {percents}")
+
+
+def test_run_stream_cancels_on_close():
+    """调用方停止迭代时取消进行中的请求"""
+    print("🧪 测试停止迭代时取消请求")
+
+    async def body(server):
+        start = time.monotonic()
+        stream = run_stream({"prompt": "狗", "provider": "grsai", "model": "nano-banana", "cache": False})
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        elapsed, in_flight = time.monotonic() - start, metrics.REQUESTS_IN_FLIGHT.get()
+        # 等待模拟服务发现连接已断开
+        await asyncio.sleep(0.3)
+        return first, elapsed, in_flight
+
+    first, elapsed, in_flight = asyncio.run(_with_stub(StubSettings(latency=2.0, sse_events=10), body))
+
+    assert isinstance(first, ImageGenerationProgress) and first.progress < 100
+    assert elapsed < 1.5, elapsed
+    assert in_flight == 0, in_flight
+    print(f"✅ {elapsed:.2f}s 后已取消")
+
+
+if __name__ == "__main__":
+    test_shut_progress_follows_stream()
+    test_run_stream_yields_progress_then_result()
+    test_run_stream_cancels_on_close()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+请求追踪测试（使用本地 HTTP 服务，不调用真实 API）
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+import time
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from image_generation_master import run
+from image_generation_master.schema import ImageGenerationResult
+from image_generation_master.providers import BaseProvider, register_provider
+from image_generation_master.utils.tracing import (
+    Tracer,
+    InMemoryExporter,
+    JsonlExporter,
+    set_exporter,
+    current_trace_id
+)
+from image_generation_master.utils.http_client import AsyncHttpClient
+from image_generation_master.utils.connection_pool import PoolManager
+from image_generation_master.utils.config_loader import get_config
+
+
+class TracedProvider(BaseProvider):
+    """经过 _execute 的模拟 Provider"""
+
+    name = "traced"
+
+    async def generate(self, request):
+        return await self._execute(request, "/v1/gen", {"prompt": request.prompt}, request.model)
+
+    async def _call_api(self, payload, endpoint, api_key=None):
+        return {"url": "http://traced/1.png"}
+
+    def _parse_response(self, api_response, model):
+        return ImageGenerationResult(success=True, images=[api_response["url"]], provider=self.name, model=model)
+
+
+register_provider("traced", TracedProvider)
+
+
+def test_nested_spans():
+    """span 按调用关系嵌套，子任务继承父 span"""
+    print("🧪 测试追踪嵌套")
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    async def child():
+        with tracer.span("child"):
+            return current_trace_id()
+
+    async def scenario():
+        with tracer.span("root") as root:
+            ids = await asyncio.gather(child(), child())
+            return root, ids
+
+    root, ids = asyncio.run(scenario())
+    assert ids == [root.trace_id, root.trace_id]
+    spans = exporter.get_trace(root.trace_id)
+    assert [s["name"] for s in spans] == ["root", "child", "child"]
+    assert all(s["parent_id"] == root.span_id for s in spans[1:])
+    print(f"✅ {len(spans)} 个 span")
+
+
+def test_run_returns_trace_id():
+    """skill.run 的结果带有 trace_id，各阶段都有 span"""
+    exporter = InMemoryExporter()
+    set_exporter(exporter)
+    config = get_config()
+    original = config.snapshot
+
+    reloads = [0.05]
+
+    def slow_snapshot():
+        # 模拟请求开始时检查到配置文件变化并重新加载（只发生一次）
+        if reloads:
+            time.sleep(reloads.pop())
+        return original()
+
+    config.snapshot = slow_snapshot
+    try:
+        result = asyncio.run(run({"prompt": "猫", "provider": "traced", "model": "m"}))
+    finally:
+        del config.snapshot
+        set_exporter(None)
+    assert result["success"] and result["trace_id"]
+    spans = {s["name"]: s for s in exporter.get_trace(result["trace_id"])}
+    for name in ("skill.run", "config", "ProviderRegistry.get", "traced.generate",
+                 "traced._call_api", "traced._parse_response"):
+        assert name in spans, list(spans)
+    # config span 位于根 span 之下，并包含快照的加载时间
+    assert spans["config"]["parent_id"] == spans["skill.run"]["span_id"]
+    assert spans["config"]["duration"] >= 0.05, spans["config"]
+
+
+def test_http_phases_jsonl():
+    """HTTP 请求记录 DNS、连接、首字节、响应体阶段，并写入 JSONL"""
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    async def scenario(tracer_path):
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = AsyncHttpClient(pool_manager=PoolManager())
+        set_exporter(JsonlExporter(tracer_path))
+        try:
+            resp = await client.request("GET", f"http://localhost:{port}/")
+            assert resp.text() == "ok"
+        finally:
+            set_exporter(None)
+            server.close()
+            await server.wait_closed()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "traces.jsonl")
+        asyncio.run(scenario(path))
+        with open(path, encoding="utf-8") as f:
+            names = [json.loads(line)["name"] for line in f]
+    assert {"http.dns", "http.connect", "http.ttfb", "http.body"} <= set(names), names
+
+
+if __name__ == "__main__":
+    test_nested_spans()
+    test_run_returns_trace_id()
+    test_http_phases_jsonl()
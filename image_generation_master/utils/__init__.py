@@ -1,17 +1,43 @@
 """
-工具包初始化
+工具包初始化（各模块在首次使用时才导入）
 """
-from .param_mapper import (
-    normalize_size_and_ratio,
-    format_size_for_provider,
-    format_aspect_ratio_for_provider
-)
-from .config_loader import get_config, Config
+import importlib
+
+# 名称 -> 所在模块
+_LAZY = {
+    "normalize_size_and_ratio": ".param_mapper",
+    "format_size_for_provider": ".param_mapper",
+    "format_aspect_ratio_for_provider": ".param_mapper",
+    "get_config": ".config_loader",
+    "Config": ".config_loader",
+    "AsyncHttpClient": ".http_client",
+    "HttpResponse": ".http_client",
+    "HttpError": ".http_client",
+    "HttpStatusError": ".http_client",
+    "HttpConnectionError": ".http_client",
+    "HttpTimeoutError": ".http_client",
+    "get_http_client": ".http_client",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
+
 
 __all__ = [
     "normalize_size_and_ratio",
     "format_size_for_provider",
     "format_aspect_ratio_for_provider",
     "get_config",
-    "Config"
+    "Config",
+    "AsyncHttpClient",
+    "HttpResponse",
+    "HttpError",
+    "HttpStatusError",
+    "HttpConnectionError",
+    "HttpTimeoutError",
+    "get_http_client"
 ]
@@ -0,0 +1,177 @@
+"""
+自适应并发限制
+按 供应商 + 模型 以 AIMD（加性增、乘性减）方式调整并发上限：
+延迟平稳时逐步放大并发，遇到 429/503、超时或延迟明显升高时成倍收缩
+"""
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from .config_loader import get_config
+from .http_client import HttpStatusError, HttpTimeoutError
+from .rate_limiter import ConcurrencyLimit
+from .metrics import ADAPTIVE_LIMIT, ADAPTIVE_WAITING
+
+
+def is_overload(error: BaseException) -> bool:
+    """判断异常是否说明上游过载"""
+    if isinstance(error, HttpStatusError):
+        return error.status in (429, 503)
+    return isinstance(error, HttpTimeoutError)
+
+
+class AdaptiveLimiter:
+    """
+    单个 供应商 + 模型 的自适应并发限制
+
+    - 加性增：并发用满且延迟不超过基线的 latency_tolerance 倍时，每成功 limit 次上限 +1
+    - 乘性减：过载或延迟超过基线的 latency_tolerance 倍时上限乘以 backoff，
+      一个基线延迟内只收缩一次，避免同一批并发失败把上限直接压到最小值
+
+    传入 labels（provider、model）时，当前上限和排队数导出到 image_gen_adaptive_limit /
+    image_gen_adaptive_waiting 指标。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        alpha: float = 0.05,
+        labels: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.labels = labels
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.alpha = alpha
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._gate = ConcurrencyLimit(int(self._limit))
+        # 成功请求延迟的长期 EWMA，作为判断延迟升高的基线
+        self.baseline: Optional[float] = None
+        self._last_decrease = 0.0
+
+        self.increases = 0
+        self.decreases = 0
+        if labels is not None:
+            ADAPTIVE_LIMIT.set(self.limit, **labels)
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return self._gate.limit
+
+    def _set_limit(self, value: float):
+        self._limit = max(float(self.min_limit), min(float(self.max_limit), value))
+        self._gate.set_limit(int(self._limit))
+        if self.labels is not None:
+            ADAPTIVE_LIMIT.set(self.limit, **self.labels)
+
+    def on_success(self, latency: float, in_flight: int):
+        """
+        记录一次成功调用
+
+        Args:
+            latency: 调用耗时（秒）
+            in_flight: 本次调用开始时的并发数
+        """
+        if self.baseline is not None and latency > self.baseline * self.latency_tolerance:
+            self.on_overload()
+        elif in_flight >= self.limit and self.limit < self.max_limit:
+            before = self.limit
+            self._set_limit(self._limit + 1.0 / self._limit)
+            if self.limit > before:
+                self.increases += 1
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += self.alpha * (latency - self.baseline)
+
+    def on_overload(self):
+        """上游过载，收缩并发上限"""
+        now = time.monotonic()
+        if self.baseline is not None and now - self._last_decrease < self.baseline:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self._set_limit(self._limit * self.backoff)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """在并发上限内执行一次调用，并根据结果调整上限"""
+        if self.labels is None:
+            await self._gate.acquire()
+        else:
+            ADAPTIVE_WAITING.inc(**self.labels)
+            try:
+                await self._gate.acquire()
+            finally:
+                ADAPTIVE_WAITING.dec(**self.labels)
+        in_flight = self._gate.in_flight
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as e:
+            if is_overload(e):
+                self.on_overload()
+            raise
+        finally:
+            self._gate.release()
+        self.on_success(time.monotonic() - start, in_flight)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前上限和统计"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._gate.in_flight,
+            "waiting": self._gate.waiting,
+            "baseline_latency": self.baseline,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class AdaptiveLimiterRegistry:
+    """按 供应商 + 模型 管理自适应并发限制"""
+
+    def __init__(self):
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def get(self, provider: str, model: Optional[str]) -> AdaptiveLimiter:
+        """获取（必要时按配置创建）限制器"""
+        name = f"{provider}:{model}"
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            config = get_config()
+            limiter = AdaptiveLimiter(
+                name,
+                initial_limit=config.get_adaptive_initial_limit(),
+                min_limit=config.get_adaptive_min_limit(),
+                max_limit=config.get_adaptive_max_limit(),
+                backoff=config.get_adaptive_backoff(),
+                latency_tolerance=config.get_adaptive_latency_tolerance(),
+                labels={"provider": provider, "model": model}
+            )
+            self._limiters[name] = limiter
+        return limiter
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有限制器的当前上限"""
+        return {name: limiter.snapshot() for name, limiter in self._limiters.items()}
+
+    def reset(self):
+        """清除所有限制器"""
+        self._limiters.clear()
+
+
+_registry = AdaptiveLimiterRegistry()
+
+
+def get_adaptive_limiters() -> AdaptiveLimiterRegistry:
+    """获取全局自适应并发限制注册表"""
+    return _registry
@@ -0,0 +1,240 @@
+"""
+熔断器
+按 供应商 + 端点 统计最近调用的错误率和慢调用率，端点持续异常时快速失败，避免请求空等超时
+"""
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from .config_loader import get_config
+from .http_client import HttpStatusError
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开时的快速失败"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} 已熔断，{retry_in:.0f} 秒后重新探测")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_failure(error: BaseException) -> bool:
+    """
+    判断异常是否计为端点故障
+
+    4xx 客户端错误（429 除外）说明端点工作正常，只是请求本身有问题，不计入错误率。
+    """
+    if isinstance(error, HttpStatusError) and error.status is not None:
+        return error.status == 429 or error.status >= 500
+    return True
+
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器
+
+    - closed：正常放行，滑动窗口内调用数达到 min_calls 且错误率或慢调用率超过阈值时打开
+    - open：直接抛出 CircuitOpenError，open_duration 秒后进入半开
+    - half_open：放行最多 half_open_calls 个探测请求，全部成功则关闭，任一失败或过慢则重新打开
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_rate: float = 0.8,
+        slow_call_duration: float = 120.0,
+        window: int = 20,
+        min_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_duration = slow_call_duration
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+
+        # 最近调用的 (是否失败, 是否过慢)
+        self._window: deque = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """当前状态（打开时间已满时转为半开）"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+        return self._state
+
+    def allows_request(self) -> bool:
+        """是否会放行新请求（供路由判断，不占用半开探测名额）"""
+        state = self.state
+        if state == OPEN:
+            return False
+        if state == HALF_OPEN:
+            return self._probes < self.half_open_calls
+        return True
+
+    def check(self):
+        """
+        不放行时抛出 CircuitOpenError
+
+        Raises:
+            CircuitOpenError: 熔断器打开或半开探测名额已满
+        """
+        if not self.allows_request():
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self._retry_in())
+
+    def _retry_in(self) -> float:
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self.open_duration - (time.monotonic() - self._opened_at))
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+    def record(self, failed: bool, duration: float, probe: bool = False):
+        """
+        记录一次调用结果
+
+        Args:
+            failed: 是否计为故障
+            duration: 调用耗时（秒）
+            probe: 是否为半开状态下放行的探测请求
+        """
+        slow = duration >= self.slow_call_duration
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if self._state != HALF_OPEN:
+                return
+            if failed or slow:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._state = CLOSED
+                self._window.clear()
+            return
+
+        # 熔断期间才完成的旧请求不计入新的统计窗口
+        if self._state != CLOSED:
+            return
+        self._window.append((failed, slow))
+        if len(self._window) < self.min_calls:
+            return
+        total = len(self._window)
+        failures = sum(1 for f, _ in self._window if f)
+        slow_calls = sum(1 for _, s in self._window if s)
+        if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+            self._open()
+            self._window.clear()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        经过熔断器执行一次调用
+
+        Raises:
+            CircuitOpenError: 熔断器不放行
+        """
+        self.check()
+        probe = self.state == HALF_OPEN
+        if probe:
+            self._probes += 1
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as e:
+            self.record(is_failure(e), time.monotonic() - start, probe)
+            raise
+        except BaseException:
+            # 被取消的调用不计入统计，只归还探测名额
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            raise
+        self.record(False, time.monotonic() - start, probe)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回熔断器状态"""
+        total = len(self._window)
+        return {
+            "state": self.state,
+            "calls": total,
+            "failure_rate": sum(1 for f, _ in self._window if f) / total if total else 0.0,
+            "slow_call_rate": sum(1 for _, s in self._window if s) / total if total else 0.0,
+            "retry_in": self._retry_in(),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreakerRegistry:
+    """按 供应商 + 端点 管理熔断器"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @staticmethod
+    def _key(provider: str, endpoint: str) -> str:
+        return f"{provider}:{endpoint}"
+
+    def get(self, provider: str, endpoint: str) -> CircuitBreaker:
+        """获取（必要时按配置创建）熔断器"""
+        key = self._key(provider, endpoint)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            config = get_config()
+            breaker = CircuitBreaker(
+                key,
+                failure_rate=config.get_circuit_failure_rate(),
+                slow_call_rate=config.get_circuit_slow_call_rate(),
+                slow_call_duration=config.get_circuit_slow_call_duration(),
+                window=config.get_circuit_window(),
+                min_calls=config.get_circuit_min_calls(),
+                open_duration=config.get_circuit_open_duration(),
+                half_open_calls=config.get_circuit_half_open_calls()
+            )
+            self._breakers[key] = breaker
+        return breaker
+
+    def is_open(self, provider: str, endpoint: Optional[str]) -> bool:
+        """端点当前是否拒绝新请求（没有熔断器的端点视为可用）"""
+        if endpoint is None:
+            return False
+        breaker = self._breakers.get(self._key(provider, endpoint))
+        return breaker is not None and not breaker.allows_request()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有熔断器的状态"""
+        return {key: breaker.snapshot() for key, breaker in self._breakers.items()}
+
+    def reset(self):
+        """清除所有熔断器"""
+        self._breakers.clear()
+
+
+_registry = CircuitBreakerRegistry()
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """获取全局熔断器注册表"""
+    return _registry
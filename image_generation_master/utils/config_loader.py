@@ -1,50 +1,212 @@
 """
 配置文件加载工具
 支持从 config.yaml 读取 API 密钥
+
+配置以不可变快照（ConfigSnapshot）的形式提供：加载时把 YAML 展开为扁平索引并复制环境变量，
+读取只需一次字典查找。配置文件的修改时间变化（按 config.reload_interval 节流检查）或调用
+reload() 时构建新快照并整体替换引用，读取方无需加锁；请求开始时用 pin() 固定快照，
+进行中的请求始终使用同一份配置。
 """
 import os
-import yaml
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator
+
+# 检查配置文件是否变化的默认间隔（秒），0 表示不自动检查
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+# 当前请求固定使用的快照
+_pinned: ContextVar[Optional["ConfigSnapshot"]] = ContextVar("config_snapshot", default=None)
+
+
+def _find_config_file() -> Optional[Path]:
+    """按优先级查找配置文件"""
+    possible_paths = [
+        # 当前目录的 config.yaml
+        Path(__file__).parent.parent / "config.yaml",
+        # 工作区的 config.yaml
+        Path.cwd() / "config.yaml",
+        # 技能目录的 config.yaml
+        Path(__file__).parent.parent.parent / "skills" / "image_generation_master" / "config.yaml",
+    ]
+    for path in possible_paths:
+        if path.exists():
+            return path
+    return None
+
+
+def _file_version(path: Optional[Path]) -> Optional[int]:
+    """配置文件的修改时间（纳秒），文件不存在时为 None"""
+    if path is None:
+        return None
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ConfigSnapshot:
+    """
+    不可变的配置快照
+
+    创建时把配置展开为 "a.b.c" -> 值 的扁平索引（中间层的字典也会被索引），
+    并复制一份环境变量；派生值（如 Key 列表）按快照缓存，配置不变时只计算一次。
+    返回的字典和列表与快照共享，调用方不应修改。
+    """
+
+    __slots__ = ("path", "version", "_index", "_env", "_derived")
+
+    def __init__(
+        self,
+        data: Optional[Dict[str, Any]] = None,
+        path: Optional[Path] = None,
+        version: Optional[int] = None,
+        env: Optional[Dict[str, str]] = None
+    ):
+        self.path = path
+        self.version = version
+        self._index: Dict[str, Any] = {}
+        self._env = dict(os.environ if env is None else env)
+        self._derived: Dict[str, Any] = {}
+        if isinstance(data, dict):
+            self._flatten(data, "")
+
+    def _flatten(self, data: Dict[str, Any], prefix: str):
+        for key, value in data.items():
+            if value is None:
+                continue
+            path = f"{prefix}{key}"
+            self._index[path] = value
+            if isinstance(value, dict):
+                self._flatten(value, path + ".")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取配置值，key 为点号分隔的路径"""
+        value = self._index.get(key)
+        return default if value is None else value
+
+    def env(self, name: str) -> Optional[str]:
+        """获取创建快照时的环境变量"""
+        return self._env.get(name)
+
+    def derive(self, name: str, factory: Callable[["ConfigSnapshot"], Any]) -> Any:
+        """获取按快照缓存的派生值，首次访问时调用 factory(snapshot) 计算"""
+        try:
+            return self._derived[name]
+        except KeyError:
+            value = self._derived[name] = factory(self)
+            return value
+
+
+def _parse_api_keys(snapshot: ConfigSnapshot, section: str) -> List[Tuple[str, float]]:
+    """
+    读取 <section>.api_keys 列表
+
+    环境变量中的单个 Key 优先；未配置列表时回退到 <section>.api_key。
+    列表项可以是字符串，也可以是 {key, weight}。
+    """
+    env_key = snapshot.env(f"{section.upper()}_API_KEY")
+    if env_key:
+        return [(env_key, 1.0)]
+
+    keys = []
+    for item in snapshot.get(f"{section}.api_keys") or []:
+        if isinstance(item, dict):
+            key, weight = item.get("key"), item.get("weight", 1)
+        else:
+            key, weight = item, 1
+        if key:
+            keys.append((str(key), float(weight) if weight and float(weight) > 0 else 1.0))
+    single_key = snapshot.get(f"{section}.api_key")
+    if not keys and single_key:
+        keys.append((single_key, 1.0))
+    return keys
 
 
 class Config:
     """配置管理器"""
 
     def __init__(self):
-        self._config: Optional[Dict[str, Any]] = None
-        self._config_path: Optional[Path] = None
-
-    def _load_config(self) -> Dict[str, Any]:
-        """加载配置文件"""
-        if self._config is not None:
-            return self._config
-
-        # 查找配置文件
-        possible_paths = [
-            # 当前目录的 config.yaml
-            Path(__file__).parent.parent / "config.yaml",
-            # 工作区的 config.yaml
-            Path.cwd() / "config.yaml",
-            # 技能目录的 config.yaml
-            Path(__file__).parent.parent.parent / "skills" / "image_generation_master" / "config.yaml",
-        ]
-
-        for path in possible_paths:
-            if path.exists():
-                self._config_path = path
-                try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        self._config = yaml.safe_load(f)
-                    return self._config
-                except Exception as e:
-                    # 配置文件读取失败，返回空配置
-                    self._config = {}
-                    return self._config
-
-        # 没找到配置文件
-        self._config = {}
-        return self._config
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._next_check = 0.0
+
+    @property
+    def _config_path(self) -> Optional[Path]:
+        """当前快照对应的配置文件路径"""
+        return self.snapshot().path
+
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        获取当前配置快照
+
+        在 pin() 范围内返回固定的快照；否则按 config.reload_interval 节流检查配置文件，
+        修改时间变化时重新加载。
+        """
+        pinned = _pinned.get()
+        if pinned is not None:
+            return pinned
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.reload()
+        if time.monotonic() >= self._next_check:
+            return self._check(snapshot)
+        return snapshot
+
+    def _check(self, snapshot: ConfigSnapshot) -> ConfigSnapshot:
+        """配置文件（或其位置）变化时重新加载"""
+        self._schedule_check(snapshot)
+        path = _find_config_file()
+        if path != snapshot.path or _file_version(path) != snapshot.version:
+            return self.reload()
+        return snapshot
+
+    def _schedule_check(self, snapshot: ConfigSnapshot):
+        interval = snapshot.get("config.reload_interval", DEFAULT_RELOAD_INTERVAL)
+        self._next_check = time.monotonic() + interval if interval and interval > 0 else float("inf")
+
+    def reload(self) -> ConfigSnapshot:
+        """
+        重新查找并加载配置文件、重新读取环境变量，原子地替换当前快照
+
+        已用 pin() 固定旧快照的请求不受影响。已有快照时若配置文件为空或解析失败（如正在写入），
+        保留旧快照，下次检查时重试。
+
+        Returns:
+            ConfigSnapshot: 当前快照
+        """
+        path = _find_config_file()
+        version = _file_version(path)
+        data: Dict[str, Any] = {}
+        if path is not None:
+            # 延迟导入：没有配置文件时不加载 PyYAML
+            import yaml
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = yaml.safe_load(f)
+                if not isinstance(data, dict):
+                    raise ValueError("配置文件为空或格式不是映射")
+            except Exception:
+                if self._snapshot is not None:
+                    self._next_check = 0.0
+                    return self._snapshot
+                # 配置文件读取失败，使用空配置
+                data = {}
+
+        snapshot = ConfigSnapshot(data, path, version)
+        self._schedule_check(snapshot)
+        self._snapshot = snapshot
+        return snapshot
+
+    @contextmanager
+    def pin(self, snapshot: Optional[ConfigSnapshot] = None) -> Iterator[ConfigSnapshot]:
+        """在当前上下文（及其创建的任务）中固定使用指定快照（默认为当前快照）"""
+        token = _pinned.set(snapshot or self.snapshot())
+        try:
+            yield _pinned.get()
+        finally:
+            _pinned.reset(token)
 
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -57,61 +219,56 @@ class Config:
         Returns:
             配置值或默认值
         """
-        config = self._load_config()
-
-        # 支持点号分隔的路径
-        keys = key.split('.')
-        value = config
-
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k)
-                if value is None:
-                    return default
-            else:
-                return default
-
-        return value if value is not None else default
+        return self.snapshot().get(key, default)
 
     def get_blt_api_key(self) -> Optional[str]:
         """获取柏拉图 API Key"""
         # 优先从环境变量读取
-        env_key = os.getenv("BLT_API_KEY")
-        if env_key:
-            return env_key
-
-        # 从配置文件读取
-        return self.get("blt.api_key")
+        snapshot = self.snapshot()
+        return snapshot.env("BLT_API_KEY") or snapshot.get("blt.api_key")
 
     def get_grsai_api_key(self) -> Optional[str]:
         """获取 GrsAI API Key"""
         # 优先从环境变量读取
-        env_key = os.getenv("GRSAI_API_KEY")
-        if env_key:
-            return env_key
+        snapshot = self.snapshot()
+        return snapshot.env("GRSAI_API_KEY") or snapshot.get("grsai.api_key")
 
-        # 从配置文件读取
-        return self.get("grsai.api_key")
+    def get_blt_api_keys(self) -> List[Tuple[str, float]]:
+        """获取柏拉图 API Key 列表 [(key, weight)]（同一快照返回同一个列表对象）"""
+        return self.snapshot().derive("blt.api_keys", lambda s: _parse_api_keys(s, "blt"))
+
+    def get_grsai_api_keys(self) -> List[Tuple[str, float]]:
+        """获取 GrsAI API Key 列表 [(key, weight)]（同一快照返回同一个列表对象）"""
+        return self.snapshot().derive("grsai.api_keys", lambda s: _parse_api_keys(s, "grsai"))
+
+    def get_key_cooldown(self) -> float:
+        """获取 Key 因 429 被摘除的默认时长（秒，响应带 Retry-After 时以其为准）"""
+        return self.get("key_pool.cooldown", 60)
+
+    def get_key_auth_cooldown(self) -> float:
+        """获取 Key 因 401/403 被摘除的时长（秒）"""
+        return self.get("key_pool.auth_cooldown", 600)
+
+    def get_rate_limit(self, provider: str) -> Dict[str, Any]:
+        """
+        获取供应商的客户端限流配置（<provider>.rate_limit）
+
+        Returns:
+            dict: rps、burst、max_concurrent 以及按模型覆盖的 models，未配置时为空
+        """
+        return self.get(f"{provider}.rate_limit") or {}
 
     def get_blt_base_url(self) -> str:
         """获取柏拉图基础 URL"""
         # 优先从环境变量读取
-        env_url = os.getenv("BLT_BASE_URL")
-        if env_url:
-            return env_url
-
-        # 从配置文件读取
-        return self.get("blt.base_url", "https://api.bltcy.ai")
+        snapshot = self.snapshot()
+        return snapshot.env("BLT_BASE_URL") or snapshot.get("blt.base_url", "https://api.bltcy.ai")
 
     def get_grsai_base_url(self) -> str:
         """获取 GrsAI 基础 URL"""
         # 优先从环境变量读取
-        env_url = os.getenv("GRSAI_BASE_URL")
-        if env_url:
-            return env_url
-
-        # 从配置文件读取
-        return self.get("grsai.base_url", "https://api.grsai.com")
+        snapshot = self.snapshot()
+        return snapshot.env("GRSAI_BASE_URL") or snapshot.get("grsai.base_url", "https://api.grsai.com")
 
     def get_default_provider(self) -> str:
         """获取默认供应商"""
@@ -133,6 +290,238 @@ class Config:
         """获取超时时间"""
         return self.get("defaults.timeout", 600)
 
+    def get_batch_concurrency(self) -> int:
+        """获取批量任务的全局并发数"""
+        return self.get("batch.concurrency", 8)
+
+    def get_batch_per_provider(self) -> Dict[str, int]:
+        """获取批量任务中每个供应商的并发上限"""
+        return self.get("batch.per_provider", {})
+
+    def get_cache_enabled(self) -> bool:
+        """是否启用结果缓存"""
+        return bool(self.get("cache.enabled", False))
+
+    def get_cache_ttl(self) -> float:
+        """获取结果缓存有效期（秒）"""
+        return self.get("cache.ttl", 3600)
+
+    def get_cache_max_entries(self) -> int:
+        """获取内存缓存的最大条目数"""
+        return self.get("cache.max_entries", 1024)
+
+    def get_cache_disk_path(self) -> Optional[str]:
+        """获取磁盘缓存路径，空字符串表示不使用磁盘缓存"""
+        return self.get("cache.disk_path", "~/.cache/image_generation_master/results.db")
+
+    def get_download_enabled(self) -> bool:
+        """是否在生成成功后下载结果图片到本地"""
+        return bool(self.get("download.enabled", False))
+
+    def get_download_dir(self) -> str:
+        """获取下载图片的存储目录（按内容哈希存放）"""
+        return self.get("download.dir", "~/.cache/image_generation_master/images")
+
+    def get_download_concurrency(self) -> int:
+        """获取同时进行的图片下载数上限（所有请求共享）"""
+        return self.get("download.concurrency", 4)
+
+    def get_download_chunk_size(self) -> int:
+        """获取下载时每次读取和写入的块大小（字节）"""
+        return self.get("download.chunk_size", 64 * 1024)
+
+    def get_download_timeout(self) -> float:
+        """获取单张图片的下载超时（秒）"""
+        return self.get("download.timeout", 120)
+
+    def get_download_max_bytes(self) -> Optional[int]:
+        """获取单张图片的大小上限（字节），未配置时不限制"""
+        return self.get("download.max_bytes")
+
+    def get_reference_cache_max_bytes(self) -> int:
+        """获取本地参考图片编码缓存的总大小上限（字节）"""
+        return self.get("references.cache_max_bytes", 64 * 1024 * 1024)
+
+    def get_reference_allowed_dirs(self) -> list:
+        """获取常驻服务允许读取的本地参考图片目录（为空时拒绝 file:// 参考图）"""
+        return self.get("references.allowed_dirs", []) or []
+
+    def get_dedupe_enabled(self) -> bool:
+        """是否合并同时进行的相同请求"""
+        return bool(self.get("dedupe.enabled", False))
+
+    def get_failover_enabled(self) -> bool:
+        """是否在失败时切换到其他平台的等价模型"""
+        return bool(self.get("routing.failover", False))
+
+    def get_routing_equivalents(self) -> list:
+        """获取配置中额外声明的等价模型组（"provider:model" 列表的列表）"""
+        return self.get("routing.equivalents", [])
+
+    def get_routing_min_health(self) -> float:
+        """获取健康分阈值，首选供应商低于此值时优先尝试更健康的等价模型"""
+        return self.get("routing.min_health", 0.3)
+
+    def get_hedging_enabled(self) -> bool:
+        """是否启用对冲请求"""
+        return bool(self.get("hedging.enabled", False))
+
+    def get_hedging_delay(self) -> float:
+        """获取发出对冲请求前的固定等待时间（秒）"""
+        return self.get("hedging.delay", 30)
+
+    def get_hedging_percentile(self) -> Optional[float]:
+        """获取用于计算对冲延迟的延迟分位数（0~1）"""
+        return self.get("hedging.percentile", 0.95)
+
+    def get_hedging_min_samples(self) -> int:
+        """获取使用分位数延迟前需要的最少样本数"""
+        return self.get("hedging.min_samples", 20)
+
+    def get_hedging_max_ratio(self) -> float:
+        """获取被对冲请求占总请求数的上限"""
+        return self.get("hedging.max_ratio", 0.1)
+
+    def get_fanout_enabled(self) -> bool:
+        """端点不支持原生 n 时，是否把 n>1 的请求拆分为并发的单图子请求"""
+        return bool(self.get("fanout.enabled", True))
+
+    def get_fanout_concurrency(self) -> int:
+        """获取拆分后同时进行的子请求上限"""
+        return max(1, int(self.get("fanout.concurrency", 4)))
+
+    def get_retry_max_attempts(self) -> int:
+        """获取单个请求的最大尝试次数（含首次）"""
+        return self.get("retry.max_attempts", 3)
+
+    def get_retry_base_delay(self) -> float:
+        """获取重试退避的基础时间（秒）"""
+        return self.get("retry.base_delay", 1)
+
+    def get_retry_max_delay(self) -> float:
+        """获取单次退避的最大时间（秒）"""
+        return self.get("retry.max_delay", 30)
+
+    def get_retry_max_elapsed(self) -> float:
+        """获取单个请求用于重试等待的总时间上限（秒）"""
+        return self.get("retry.max_elapsed", 120)
+
+    def get_retry_statuses(self) -> List[int]:
+        """获取可重试的 HTTP 状态码"""
+        return self.get("retry.statuses", [429, 502, 503, 504])
+
+    def get_retry_on_timeout(self) -> bool:
+        """超时后是否重试（超时的请求可能已在服务端生成并计费）"""
+        return bool(self.get("retry.retry_on_timeout", False))
+
+    def get_retry_budget_ratio(self) -> float:
+        """获取重试预算：重试次数相对请求数的比例"""
+        return self.get("retry.budget_ratio", 0.2)
+
+    def get_circuit_enabled(self) -> bool:
+        """是否启用熔断器"""
+        return bool(self.get("circuit_breaker.enabled", True))
+
+    def get_circuit_failure_rate(self) -> float:
+        """获取熔断的错误率阈值"""
+        return self.get("circuit_breaker.failure_rate", 0.5)
+
+    def get_circuit_slow_call_rate(self) -> float:
+        """获取熔断的慢调用率阈值"""
+        return self.get("circuit_breaker.slow_call_rate", 0.8)
+
+    def get_circuit_slow_call_duration(self) -> float:
+        """获取慢调用的耗时阈值（秒）"""
+        return self.get("circuit_breaker.slow_call_duration", 120)
+
+    def get_circuit_window(self) -> int:
+        """获取熔断统计的滑动窗口大小（调用数）"""
+        return self.get("circuit_breaker.window", 20)
+
+    def get_circuit_min_calls(self) -> int:
+        """获取计算错误率所需的最少调用数"""
+        return self.get("circuit_breaker.min_calls", 10)
+
+    def get_circuit_open_duration(self) -> float:
+        """获取熔断持续时间（秒），之后进入半开状态"""
+        return self.get("circuit_breaker.open_duration", 30)
+
+    def get_circuit_half_open_calls(self) -> int:
+        """获取半开状态下放行的探测请求数"""
+        return self.get("circuit_breaker.half_open_calls", 1)
+
+    def get_adaptive_enabled(self) -> bool:
+        """是否启用自适应并发限制"""
+        return bool(self.get("adaptive_concurrency.enabled", False))
+
+    def get_adaptive_initial_limit(self) -> int:
+        """获取自适应并发的初始上限"""
+        return self.get("adaptive_concurrency.initial_limit", 8)
+
+    def get_adaptive_min_limit(self) -> int:
+        """获取自适应并发的最小上限"""
+        return self.get("adaptive_concurrency.min_limit", 1)
+
+    def get_adaptive_max_limit(self) -> int:
+        """获取自适应并发的最大上限"""
+        return self.get("adaptive_concurrency.max_limit", 64)
+
+    def get_adaptive_backoff(self) -> float:
+        """获取过载时并发上限的收缩系数"""
+        return self.get("adaptive_concurrency.backoff", 0.5)
+
+    def get_adaptive_latency_tolerance(self) -> float:
+        """获取延迟升高的判定倍数（相对基线延迟）"""
+        return self.get("adaptive_concurrency.latency_tolerance", 2.0)
+
+    def get_tracing_enabled(self) -> bool:
+        """是否启用请求追踪"""
+        return bool(self.get("tracing.enabled", False))
+
+    def get_tracing_exporter(self) -> str:
+        """获取追踪导出器类型（memory / jsonl）"""
+        return self.get("tracing.exporter", "memory")
+
+    def get_tracing_path(self) -> str:
+        """获取 JSONL 追踪文件路径"""
+        return self.get("tracing.path", "~/.cache/image_generation_master/traces.jsonl")
+
+    def get_server_socket(self) -> str:
+        """获取常驻服务的 Unix 套接字路径"""
+        return self.get("server.socket", "~/.cache/image_generation_master/daemon.sock")
+
+    def get_server_host(self) -> str:
+        """获取常驻服务的 TCP 监听地址"""
+        return self.get("server.host", "127.0.0.1")
+
+    def get_server_port(self) -> Optional[int]:
+        """获取常驻服务的 TCP 端口，未配置时使用 Unix 套接字"""
+        return self.get("server.port")
+
+    def get_server_drain_timeout(self) -> float:
+        """获取停止服务时等待进行中请求完成的最长时间（秒）"""
+        return self.get("server.drain_timeout", self.get_timeout())
+
+    def get_server_workers(self) -> int:
+        """获取常驻服务的工作进程数（1 表示单进程）"""
+        return self.get("server.workers", 1)
+
+    def get_server_warmup(self) -> bool:
+        """获取服务启动时是否预热 Provider 连接"""
+        return self.get("server.warmup", True)
+
+    def get_reload_interval(self) -> float:
+        """获取检查配置文件是否变化的间隔（秒），0 表示只在 reload() 时重新加载"""
+        return self.get("config.reload_interval", DEFAULT_RELOAD_INTERVAL)
+
+    def get_http_max_connections(self) -> int:
+        """获取每个主机的最大连接数"""
+        return self.get("http.max_connections_per_host", 10)
+
+    def get_http_idle_timeout(self) -> float:
+        """获取空闲连接的淘汰时间（秒）"""
+        return self.get("http.idle_timeout", 60)
+
 
 # 全局配置实例
 _config = Config()
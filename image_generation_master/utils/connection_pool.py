@@ -0,0 +1,264 @@
+"""
+HTTP 长连接池
+按源站（协议 + 主机 + 端口）复用 keep-alive 连接，避免每次请求重复 TCP/TLS 握手
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+from urllib.parse import urlsplit
+
+from .config_loader import get_config
+
+
+Origin = Tuple[str, str, int]
+
+
+def origin_of(url: str) -> Origin:
+    """
+    提取 URL 的源站
+
+    Args:
+        url: 完整 URL 或基础 URL，如 "https://api.bltcy.ai"
+
+    Returns:
+        Tuple[scheme, host, port]
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    port = parts.port or (443 if scheme == "https" else 80)
+    return scheme, parts.hostname, port
+
+
+class PooledConnection:
+    """连接池中的一条连接"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.requests = 0
+
+    @property
+    def reused(self) -> bool:
+        """是否为复用的连接（已处理过至少一个请求）"""
+        return self.requests > 0
+
+    def is_usable(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """连接是否仍可在指定事件循环中使用"""
+        if self.loop is not loop or self.loop.is_closed():
+            return False
+        if self.writer.is_closing() or self.reader.at_eof():
+            return False
+        return True
+
+    def close(self):
+        """关闭底层连接"""
+        if self.loop.is_closed():
+            return
+        try:
+            self.writer.close()
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+
+class ConnectionPool:
+    """
+    单个源站的连接池
+
+    - 最多同时存在 max_connections 条连接，超出时请求排队等待
+    - 空闲超过 idle_timeout 秒的连接会被淘汰
+    - 连接绑定创建它的事件循环，跨循环（如多次 run_sync）不会误用
+    """
+
+    def __init__(
+        self,
+        origin: Origin,
+        max_connections: int = 10,
+        idle_timeout: float = 60.0
+    ):
+        if max_connections < 1:
+            raise ValueError("max_connections 必须大于 0")
+        self.origin = origin
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+
+        self._idle: deque = deque()
+        self._in_use = 0
+        self._waiters: deque = deque()
+
+        # 统计信息
+        self._created = 0
+        self._reused = 0
+        self._evicted = 0
+        self._discarded = 0
+        self._waits = 0
+
+    def _evict_idle(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """淘汰超时或已失效的空闲连接"""
+        now = time.monotonic()
+        kept = deque()
+        for conn in self._idle:
+            expired = now - conn.last_used > self.idle_timeout
+            if expired or (loop is not None and not conn.is_usable(loop)):
+                conn.close()
+                self._evicted += 1
+            else:
+                kept.append(conn)
+        self._idle = kept
+
+    def evict_idle(self):
+        """主动淘汰超时的空闲连接"""
+        self._evict_idle()
+
+    def _wake_waiter(self):
+        """唤醒一个等待连接的请求"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def acquire(
+        self,
+        connect: Callable[[], Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]
+    ) -> PooledConnection:
+        """
+        获取一条连接（优先复用空闲连接）
+
+        Args:
+            connect: 建立新连接的协程工厂
+
+        Returns:
+            PooledConnection: 可用连接，使用完毕后必须调用 release()
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            self._evict_idle(loop)
+            if self._idle:
+                # 后进先出：最近使用的连接最可能仍然存活
+                conn = self._idle.pop()
+                self._in_use += 1
+                self._reused += 1
+                return conn
+
+            if self._in_use < self.max_connections:
+                self._in_use += 1
+                try:
+                    reader, writer = await connect()
+                except BaseException:
+                    self._in_use -= 1
+                    self._wake_waiter()
+                    raise
+                self._created += 1
+                return PooledConnection(reader, writer)
+
+            # 连接数已满，排队等待
+            self._waits += 1
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # 已被唤醒但放弃等待，把机会让给下一个
+                    self._wake_waiter()
+                raise
+
+    def release(self, conn: PooledConnection, reusable: bool = True):
+        """
+        归还连接
+
+        Args:
+            conn: acquire() 返回的连接
+            reusable: 连接是否可以继续复用（响应未读完或出错时应为 False）
+        """
+        self._in_use -= 1
+        conn.requests += 1
+        conn.last_used = time.monotonic()
+        if reusable and not conn.writer.is_closing() and not conn.loop.is_closed():
+            self._idle.append(conn)
+        else:
+            conn.close()
+            self._discarded += 1
+        self._wake_waiter()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while self._idle:
+            self._idle.pop().close()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回连接池统计信息"""
+        scheme, host, port = self.origin
+        return {
+            "origin": f"{scheme}://{host}:{port}",
+            "max_connections": self.max_connections,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "waiting": sum(1 for w in self._waiters if not w.done()),
+            "created": self._created,
+            "reused": self._reused,
+            "evicted": self._evicted,
+            "discarded": self._discarded,
+            "waits": self._waits,
+        }
+
+
+class PoolManager:
+    """
+    连接池管理器
+    为每个源站维护一个连接池
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        idle_timeout: Optional[float] = None
+    ):
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+        self._pools: Dict[Origin, ConnectionPool] = {}
+
+    def get_pool(self, url: str) -> ConnectionPool:
+        """
+        获取 URL 所属源站的连接池，不存在则创建
+
+        Args:
+            url: 完整 URL 或基础 URL（如 get_blt_base_url() 的返回值）
+        """
+        origin = origin_of(url)
+        pool = self._pools.get(origin)
+        if pool is None:
+            config = get_config()
+            pool = ConnectionPool(
+                origin,
+                max_connections=self._max_connections or config.get_http_max_connections(),
+                idle_timeout=self._idle_timeout or config.get_http_idle_timeout()
+            )
+            self._pools[origin] = pool
+        return pool
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有连接池的统计信息"""
+        all_stats = [pool.stats() for pool in self._pools.values()]
+        return {stats["origin"]: stats for stats in all_stats}
+
+    def close(self):
+        """关闭所有连接池的空闲连接"""
+        for pool in self._pools.values():
+            pool.close()
+
+
+# 全局连接池管理器
+_pool_manager = PoolManager()
+
+
+def get_pool_manager() -> PoolManager:
+    """获取全局连接池管理器"""
+    return _pool_manager
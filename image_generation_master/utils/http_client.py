@@ -0,0 +1,547 @@
+"""
+异步 HTTP 传输层（标准库版本）
+基于 asyncio 流实现的 HTTP/1.1 客户端，供所有 Provider 共享，不阻塞事件循环
+连接通过 connection_pool 按源站复用（keep-alive）
+"""
+import asyncio
+import json
+import socket
+import ssl
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional, Dict, Any, AsyncIterator
+from urllib.parse import urlsplit
+
+from .connection_pool import PoolManager, PooledConnection, get_pool_manager
+from .tracing import span
+
+
+# 默认读取块大小
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# StreamReader 单行上限（SSE 的单个 data 行可能较大）
+_STREAM_LIMIT = 1024 * 1024
+
+USER_AGENT = "image-generation-master/1.0"
+
+
+class HttpError(RuntimeError):
+    """HTTP 传输错误基类"""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b""
+    ):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    def text(self) -> str:
+        """以 UTF-8 解码错误响应体"""
+        return self.body.decode("utf-8", errors="replace")
+
+
+class HttpStatusError(HttpError):
+    """服务端返回非 2xx 状态码"""
+
+
+class HttpConnectionError(HttpError):
+    """连接建立或读写失败"""
+
+
+class _ConnectionClosedBeforeSend(HttpConnectionError):
+    """复用的连接在写入请求前就已关闭（请求一个字节都没有发出）"""
+
+
+# 幂等方法：即使请求已经发出，也可以在新连接上重发
+_IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+class HttpTimeoutError(HttpError):
+    """请求超时"""
+
+
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+def _get_ssl_context() -> ssl.SSLContext:
+    """获取共享的 SSL 上下文（创建开销较大，只创建一次）"""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+class _Deadline:
+    """请求级别的截止时间，用于给每次 I/O 计算剩余超时"""
+
+    def __init__(self, timeout: Optional[float]):
+        self._loop = asyncio.get_running_loop()
+        self._deadline = None if timeout is None else self._loop.time() + timeout
+
+    async def run(self, aw):
+        """
+        在剩余时间内等待 awaitable 完成
+
+        不使用 asyncio.wait_for：Python 3.12 之前，取消恰好发生在内部操作完成时会被 wait_for 吞掉，
+        调用方（如停止迭代的 run_stream）将无法取消正在读取的请求。
+        """
+        if self._deadline is None:
+            return await aw
+        remaining = self._deadline - self._loop.time()
+        if remaining <= 0:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise HttpTimeoutError("请求超时")
+        future = asyncio.ensure_future(aw)
+        try:
+            done, _ = await asyncio.wait({future}, timeout=remaining)
+        except BaseException:
+            future.cancel()
+            raise
+        if not done:
+            future.cancel()
+            raise HttpTimeoutError("请求超时")
+        return future.result()
+
+
+class HttpResponse:
+    """
+    HTTP 响应
+
+    通过 AsyncHttpClient.stream() 获得时，响应体尚未读取，
+    可以用 iter_chunks() 逐块消费；通过 request() 获得时 body 已读取完毕。
+    """
+
+    def __init__(
+        self,
+        status: int,
+        reason: str,
+        headers: Dict[str, str],
+        reader: asyncio.StreamReader,
+        deadline: _Deadline,
+        has_body: bool = True,
+        version: str = "HTTP/1.1"
+    ):
+        self.status = status
+        self.version = version
+        self.reason = reason
+        self.headers = headers
+        self.body = b""
+        # 已读取的响应体字节数（chunked 时不含分块标记）
+        self.bytes_received = 0
+        self._reader = reader
+        self._deadline = deadline
+        self._consumed = not has_body
+        self._no_body = not has_body
+
+        self._chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        length = headers.get("content-length")
+        self._length = int(length) if length and not self._chunked else None
+
+    @property
+    def consumed(self) -> bool:
+        """响应体是否已完整读取"""
+        return self._consumed
+
+    @property
+    def reusable(self) -> bool:
+        """响应结束后连接是否可以继续复用"""
+        if not self._consumed:
+            return False
+        connection = self.headers.get("connection", "").lower()
+        if connection == "close":
+            return False
+        if self.version == "HTTP/1.0" and connection != "keep-alive":
+            return False
+        # 读到连接关闭为止的响应无法复用连接
+        return self._chunked or self._length is not None or self._no_body
+
+    async def _read(self, n: int) -> bytes:
+        try:
+            data = await self._deadline.run(self._reader.read(n))
+        except (ConnectionError, OSError) as e:
+            raise HttpConnectionError(f"读取响应失败: {e}") from e
+        self.bytes_received += len(data)
+        return data
+
+    async def _readline(self) -> bytes:
+        try:
+            return await self._deadline.run(self._reader.readline())
+        except (ConnectionError, OSError, ValueError) as e:
+            raise HttpConnectionError(f"读取响应失败: {e}") from e
+
+    async def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        逐块读取响应体，不在内存中累积
+
+        Args:
+            chunk_size: 单次读取的最大字节数
+
+        Yields:
+            bytes: 响应体片段
+        """
+        if self._consumed:
+            return
+
+        if self._chunked:
+            while True:
+                line = await self._readline()
+                if not line:
+                    raise HttpConnectionError("chunked 响应提前结束")
+                try:
+                    size = int(line.split(b";", 1)[0].strip(), 16)
+                except ValueError:
+                    raise HttpConnectionError(f"无效的 chunk 长度: {line!r}") from None
+                if size == 0:
+                    # 跳过 trailer
+                    while True:
+                        trailer = await self._readline()
+                        if trailer in (b"\r\n", b"\n", b""):
+                            break
+                    break
+                remaining = size
+                while remaining > 0:
+                    data = await self._read(min(remaining, chunk_size))
+                    if not data:
+                        raise HttpConnectionError("chunked 响应提前结束")
+                    remaining -= len(data)
+                    yield data
+                await self._readline()
+
+        elif self._length is not None:
+            remaining = self._length
+            while remaining > 0:
+                data = await self._read(min(remaining, chunk_size))
+                if not data:
+                    raise HttpConnectionError("响应体长度不足")
+                remaining -= len(data)
+                yield data
+
+        else:
+            # 既无长度也非 chunked：读到连接关闭为止
+            while True:
+                data = await self._read(chunk_size)
+                if not data:
+                    break
+                yield data
+
+        self._consumed = True
+
+    async def read(self) -> bytes:
+        """读取完整响应体"""
+        if not self._consumed:
+            parts = []
+            async for chunk in self.iter_chunks():
+                parts.append(chunk)
+            self.body = b"".join(parts)
+        return self.body
+
+    def text(self) -> str:
+        """以 UTF-8 解码已读取的响应体"""
+        return self.body.decode("utf-8")
+
+    def json(self) -> Any:
+        """将已读取的响应体解析为 JSON"""
+        return json.loads(self.text())
+
+
+class AsyncHttpClient:
+    """
+    基于 asyncio 的 HTTP/1.1 客户端
+
+    所有网络 I/O 都在事件循环中完成，多个并发请求可以真正重叠执行。
+    """
+
+    def __init__(
+        self,
+        user_agent: str = USER_AGENT,
+        pool_manager: Optional[PoolManager] = None
+    ):
+        self.user_agent = user_agent
+        self._pool_manager = pool_manager
+
+    @property
+    def pool_manager(self) -> PoolManager:
+        """使用的连接池管理器（默认为全局实例）"""
+        return self._pool_manager or get_pool_manager()
+
+    async def _open(self, scheme: str, host: str, port: int, deadline: _Deadline):
+        """
+        建立 TCP（必要时 TLS）连接
+
+        DNS 解析、TCP 连接、TLS 握手分步进行，以便分别记录追踪耗时。
+        """
+        loop = asyncio.get_running_loop()
+        ssl_context = _get_ssl_context() if scheme == "https" else None
+        try:
+            with span("http.dns", host=host):
+                infos = await deadline.run(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))
+
+            sock = None
+            last_error: Optional[OSError] = None
+            with span("http.connect", host=host, port=port):
+                for family, type_, proto, _, address in infos:
+                    sock = socket.socket(family, type_, proto)
+                    sock.setblocking(False)
+                    try:
+                        await deadline.run(loop.sock_connect(sock, address))
+                        break
+                    except OSError as e:
+                        sock.close()
+                        sock = None
+                        last_error = e
+                    except BaseException:
+                        sock.close()
+                        raise
+                if sock is None:
+                    raise last_error or OSError(f"无法解析主机: {host}")
+
+            reader = asyncio.StreamReader(limit=_STREAM_LIMIT)
+            protocol = asyncio.StreamReaderProtocol(reader)
+            try:
+                with span("http.tls", host=host) if ssl_context else nullcontext():
+                    transport, _ = await deadline.run(loop.create_connection(
+                        lambda: protocol,
+                        sock=sock,
+                        ssl=ssl_context,
+                        server_hostname=host if ssl_context else None
+                    ))
+            except BaseException:
+                sock.close()
+                raise
+            return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
+        except HttpTimeoutError:
+            raise
+        except (OSError, ssl.SSLError) as e:
+            raise HttpConnectionError(str(e)) from e
+
+    def _build_head(
+        self,
+        method: str,
+        host_header: str,
+        target: str,
+        headers: Optional[Dict[str, str]],
+        body: Optional[bytes]
+    ) -> bytes:
+        """构建请求行和请求头"""
+        merged = {
+            "Host": host_header,
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "identity",
+        }
+        if headers:
+            merged.update(headers)
+        if body is not None:
+            merged["Content-Length"] = str(len(body))
+
+        lines = [f"{method} {target} HTTP/1.1"]
+        lines.extend(f"{k}: {v}" for k, v in merged.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _read_head(self, reader: asyncio.StreamReader, deadline: _Deadline):
+        """读取状态行和响应头"""
+        try:
+            status_line = await deadline.run(reader.readline())
+            if not status_line:
+                raise HttpConnectionError("服务端关闭了连接")
+            parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+            version = parts[0]
+            status = int(parts[1])
+            reason = parts[2] if len(parts) > 2 else ""
+
+            headers: Dict[str, str] = {}
+            while True:
+                line = await deadline.run(reader.readline())
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except (ConnectionError, OSError, ValueError, IndexError) as e:
+            raise HttpConnectionError(f"读取响应头失败: {e}") from e
+
+        return version, status, reason, headers
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        timeout: Optional[float] = None,
+        raise_for_status: bool = True
+    ):
+        """
+        发送请求并以流的方式返回响应
+
+        使用示例：
+            async with client.stream("POST", url, body=data) as resp:
+                async for chunk in resp.iter_chunks():
+                    ...
+
+        Args:
+            method: HTTP 方法
+            url: 完整 URL
+            headers: 额外请求头
+            body: 请求体
+            timeout: 整个请求（含读取响应体）的超时秒数
+            raise_for_status: 非 2xx 时是否抛出 HttpStatusError
+
+        Raises:
+            HttpStatusError: 非 2xx 响应
+            HttpConnectionError: 连接失败
+            HttpTimeoutError: 请求超时
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise ValueError(f"不支持的 URL 协议: {url}")
+        host = parts.hostname
+        port = parts.port or (443 if scheme == "https" else 80)
+        default_port = port == (443 if scheme == "https" else 80)
+        host_header = host if default_port else f"{host}:{port}"
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+
+        deadline = _Deadline(timeout)
+        pool = self.pool_manager.get_pool(url)
+        head = self._build_head(method, host_header, target, headers, body)
+
+        while True:
+            conn = await deadline.run(pool.acquire(
+                lambda: self._open(scheme, host, port, deadline)
+            ))
+            try:
+                # 从发出请求到收到响应头（首字节时间）
+                with span("http.ttfb", method=method, reused=conn.reused) as ttfb:
+                    version, status, reason, resp_headers = await self._send(
+                        conn, head, body, deadline
+                    )
+                    ttfb.set_attribute("status", status)
+            except HttpConnectionError as e:
+                reused = conn.reused
+                pool.release(conn, reusable=False)
+                # 复用的连接可能已被服务端关闭，换一条连接重试；
+                # 非幂等请求一旦写出就可能已被服务端处理，不能在这里重发，交给上层重试策略决定
+                if reused and (
+                    isinstance(e, _ConnectionClosedBeforeSend)
+                    or method.upper() in _IDEMPOTENT_METHODS
+                ):
+                    continue
+                raise
+            except BaseException:
+                pool.release(conn, reusable=False)
+                raise
+            break
+
+        response = None
+        try:
+            has_body = method.upper() != "HEAD" and status not in (204, 304) and status >= 200
+            response = HttpResponse(
+                status, reason, resp_headers, conn.reader, deadline, has_body, version
+            )
+
+            if raise_for_status and status >= 400:
+                error_body = await response.read()
+                raise HttpStatusError(
+                    f"HTTP {status} {reason}",
+                    status=status,
+                    headers=resp_headers,
+                    body=error_body
+                )
+
+            yield response
+        finally:
+            pool.release(conn, reusable=response is not None and response.reusable)
+
+    async def _send(
+        self,
+        conn: PooledConnection,
+        head: bytes,
+        body: Optional[bytes],
+        deadline: _Deadline
+    ):
+        """在连接上发送请求并读取响应头"""
+        if conn.writer.is_closing() or conn.reader.at_eof():
+            raise _ConnectionClosedBeforeSend("连接已被服务端关闭")
+        try:
+            conn.writer.write(head)
+            if body:
+                conn.writer.write(body)
+            await deadline.run(conn.writer.drain())
+        except (ConnectionError, OSError) as e:
+            raise HttpConnectionError(f"发送请求失败: {e}") from e
+
+        return await self._read_head(conn.reader, deadline)
+
+    async def warmup(self, url: str, timeout: Optional[float] = None):
+        """
+        预先建立一条到目标源站的连接并放入连接池
+
+        Args:
+            url: 目标 URL 或基础 URL
+            timeout: 建连超时秒数
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        deadline = _Deadline(timeout)
+        pool = self.pool_manager.get_pool(url)
+        conn = await deadline.run(pool.acquire(
+            lambda: self._open(scheme, parts.hostname, port, deadline)
+        ))
+        pool.release(conn, reusable=True)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        timeout: Optional[float] = None,
+        raise_for_status: bool = True
+    ) -> HttpResponse:
+        """
+        发送请求并读取完整响应体
+
+        参数与 stream() 相同，返回的 HttpResponse.body 已填充
+        """
+        async with self.stream(
+            method, url,
+            headers=headers,
+            body=body,
+            timeout=timeout,
+            raise_for_status=raise_for_status
+        ) as response:
+            with span("http.body") as body_span:
+                await response.read()
+                body_span.set_attribute("bytes", response.bytes_received)
+            return response
+
+    async def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ) -> HttpResponse:
+        """以 JSON 格式 POST 请求"""
+        merged = {"Content-Type": "application/json"}
+        if headers:
+            merged.update(headers)
+        body = json.dumps(payload).encode("utf-8")
+        return await self.request("POST", url, headers=merged, body=body, timeout=timeout)
+
+
+# 全局客户端实例
+_client = AsyncHttpClient()
+
+
+def get_http_client() -> AsyncHttpClient:
+    """获取共享的 HTTP 客户端实例"""
+    return _client
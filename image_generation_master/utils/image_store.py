@@ -0,0 +1,336 @@
+"""
+图片下载与本地存储
+生成成功后并发下载结果图片，边下载边计算 sha256 并按固定大小的块写入磁盘，不在内存中缓存整张图片。
+文件按内容哈希存放（<dir>/<哈希前两位>/<哈希>.<扩展名>），相同图片只保存一份。
+所有磁盘操作都在专用线程中执行，不阻塞事件循环。
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urljoin, urlsplit, unquote_to_bytes
+
+from .config_loader import get_config
+from .http_client import get_http_client, DEFAULT_CHUNK_SIZE, HttpError
+from .rate_limiter import ConcurrencyLimit
+from .singleflight import SingleFlight
+from .metrics import DOWNLOADS, DOWNLOAD_BYTES
+from .tracing import span
+
+# 最多跟随的重定向次数
+MAX_REDIRECTS = 5
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# 下载的数据块累积到该大小后才交给写入线程，减少线程切换次数
+WRITE_BATCH_BYTES = 256 * 1024
+
+_CONTENT_TYPE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+    "image/avif": ".avif",
+    "image/svg+xml": ".svg",
+}
+
+_URL_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".avif", ".svg"}
+
+
+class DownloadError(RuntimeError):
+    """图片下载失败"""
+
+
+def _extension(content_type: Optional[str], url: str) -> str:
+    """根据 Content-Type（优先）或 URL 路径推断文件扩展名"""
+    mime = (content_type or "").split(";", 1)[0].strip().lower()
+    if mime in _CONTENT_TYPE_EXTENSIONS:
+        return _CONTENT_TYPE_EXTENSIONS[mime]
+    suffix = os.path.splitext(urlsplit(url).path)[1].lower()
+    if suffix in _URL_EXTENSIONS:
+        return ".jpg" if suffix == ".jpeg" else suffix
+    return ".bin"
+
+
+class _PartialFile:
+    """
+    写入临时文件并同时计算 sha256，完成后按哈希移动到最终位置
+
+    add()/take() 在事件循环中累积数据块并检查大小上限，
+    open()/write()/commit()/discard() 做磁盘操作，须在 ImageStore 的写入线程中调用。
+    """
+
+    def __init__(self, directory: Path, max_bytes: Optional[int]):
+        self.directory = directory
+        self.path = directory / f"{os.getpid()}-{os.urandom(8).hex()}.part"
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+
+    def add(self, chunk: bytes) -> bool:
+        """
+        累积一个数据块
+
+        Returns:
+            bool: 累积的数据是否已达到一批，应调用 take() 写入
+        """
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise DownloadError(f"图片超过大小上限 {self.max_bytes} 字节")
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+        return self._pending_size >= WRITE_BATCH_BYTES
+
+    def take(self) -> bytes:
+        """取出已累积的数据"""
+        data = b"".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        return data
+
+    def open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "wb")
+
+    def write(self, data: bytes):
+        self._hash.update(data)
+        self._file.write(data)
+
+    def commit(self, root: Path, extension: str) -> Tuple[Path, str, bool]:
+        """
+        移动到内容寻址路径
+
+        Returns:
+            Tuple[最终路径, sha256, 是否已存在相同内容]
+        """
+        self._file.close()
+        digest = self._hash.hexdigest()
+        target = root / digest[:2] / f"{digest}{extension}"
+        if target.exists():
+            self.path.unlink()
+            return target, digest, True
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # 同一文件系统内的 rename 是原子的，并发写入相同内容时结果一致
+        os.replace(self.path, target)
+        return target, digest, False
+
+    def discard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+class ImageStore:
+    """
+    内容寻址的图片存储
+
+    所有请求共享同一个并发上限；同一 URL 的进行中下载会被合并。
+    """
+
+    def __init__(
+        self,
+        root: str,
+        concurrency: int = 4,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        timeout: Optional[float] = 120,
+        max_bytes: Optional[int] = None
+    ):
+        self.root = Path(root).expanduser()
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_bytes = max_bytes or None
+        self._limit = ConcurrencyLimit(max(1, concurrency))
+        self._flight = SingleFlight()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+        self.downloads = 0
+        self.deduped = 0
+        self.reused = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # fork 后的子进程中，父进程的工作线程已不存在
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-store")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    async def run(self, fn, *args):
+        """在专用写入线程中执行磁盘操作"""
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+
+    async def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        下载单个 URL 并保存
+
+        Returns:
+            dict: url、path、size、sha256
+
+        Raises:
+            DownloadError / HttpError: 下载失败
+        """
+        entry, _ = await self._flight.do(url, lambda: self._fetch(url))
+        return dict(entry)
+
+    async def _fetch(self, url: str) -> Dict[str, Any]:
+        await self._limit.acquire()
+        try:
+            with span("image_store.fetch") as current:
+                if url.startswith("data:"):
+                    path, digest, size, existed = await self.run(self._save_data_uri, url)
+                else:
+                    path, digest, size, existed = await self._download(url)
+                current.set_attribute("bytes", size)
+                current.set_attribute("deduped", existed)
+        finally:
+            self._limit.release()
+
+        self.downloads += 1
+        self.bytes += size
+        if existed:
+            self.deduped += 1
+        DOWNLOADS.inc(outcome="deduped" if existed else "stored")
+        DOWNLOAD_BYTES.inc(size)
+        return {"url": url, "path": str(path), "size": size, "sha256": digest}
+
+    async def _download(self, url: str) -> Tuple[Path, str, int, bool]:
+        """流式下载到临时文件，跟随重定向"""
+        client = get_http_client()
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            async with client.stream("GET", target, headers={"Accept": "image/*"}, timeout=self.timeout) as resp:
+                location = resp.headers.get("location")
+                if resp.status in _REDIRECT_STATUSES and location:
+                    target = urljoin(target, location)
+                    continue
+                if resp.status >= 300:
+                    raise DownloadError(f"HTTP {resp.status} {resp.reason}")
+
+                partial = _PartialFile(self.root / "tmp", self.max_bytes)
+                try:
+                    await self.run(partial.open)
+                    async for chunk in resp.iter_chunks(self.chunk_size):
+                        if partial.add(chunk):
+                            await self.run(partial.write, partial.take())
+                    rest = partial.take()
+                    if rest:
+                        await self.run(partial.write, rest)
+                    path, digest, existed = await self.run(
+                        partial.commit, self.root, _extension(resp.headers.get("content-type"), target)
+                    )
+                except BaseException:
+                    # 写入线程是单线程，清理排在已提交的写入之后；不等待结果，取消时也能执行
+                    self._get_executor().submit(partial.discard)
+                    raise
+                return path, digest, partial.size, existed
+        raise DownloadError(f"重定向次数超过 {MAX_REDIRECTS}")
+
+    def _save_data_uri(self, url: str) -> Tuple[Path, str, int, bool]:
+        """保存 data: URI（内容已在内存中，直接解码写入；在写入线程中调用）"""
+        header, sep, data = url[len("data:"):].partition(",")
+        if not sep:
+            raise DownloadError("无效的 data URI")
+        params = header.split(";")
+        try:
+            content = base64.b64decode(data) if "base64" in params[1:] else unquote_to_bytes(data)
+        except (binascii.Error, ValueError) as e:
+            raise DownloadError(f"无效的 data URI: {e}") from e
+
+        partial = _PartialFile(self.root / "tmp", self.max_bytes)
+        try:
+            partial.add(content)
+            partial.open()
+            partial.write(partial.take())
+            path, digest, existed = partial.commit(self.root, _extension(params[0], ""))
+        except BaseException:
+            partial.discard()
+            raise
+        return path, digest, partial.size, existed
+
+    async def materialize(
+        self,
+        urls: List[str],
+        known: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        并发下载一组图片，顺序与 urls 一致
+
+        单张图片下载失败不影响其他图片，对应条目的 path 为 None 并带 error 字段。
+
+        Args:
+            urls: 图片 URL 列表
+            known: 之前保存过的条目（如缓存命中的结果），本地文件仍存在时直接复用
+
+        Returns:
+            List[dict]: 每张图片的 url、path、size、sha256
+        """
+        existing = await self.run(self._existing_files, known) if known else {}
+
+        async def one(url: str) -> Dict[str, Any]:
+            if url in existing:
+                self.reused += 1
+                return dict(existing[url])
+            try:
+                return await self.fetch(url)
+            except (HttpError, DownloadError, OSError) as e:
+                self.errors += 1
+                DOWNLOADS.inc(outcome="error")
+                return {"url": url, "path": None, "size": 0, "sha256": None, "error": str(e) or type(e).__name__}
+
+        with span("image_store.materialize", images=len(urls)):
+            return list(await asyncio.gather(*(one(url) for url in urls)))
+
+    @staticmethod
+    def _existing_files(known: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """返回本地文件仍存在的条目（按 URL 索引）"""
+        return {
+            entry["url"]: entry
+            for entry in known
+            if entry.get("path") and os.path.exists(entry["path"])
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """返回下载统计"""
+        return {
+            "root": str(self.root),
+            "downloads": self.downloads,
+            "deduped": self.deduped,
+            "reused": self.reused,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "in_flight": self._limit.in_flight,
+            "waiting": self._limit.waiting,
+        }
+
+
+_store: Optional[ImageStore] = None
+
+
+def get_image_store() -> ImageStore:
+    """获取全局图片存储（首次调用时按配置创建）"""
+    global _store
+    if _store is None:
+        config = get_config()
+        _store = ImageStore(
+            root=config.get_download_dir(),
+            concurrency=config.get_download_concurrency(),
+            chunk_size=config.get_download_chunk_size(),
+            timeout=config.get_download_timeout(),
+            max_bytes=config.get_download_max_bytes()
+        )
+    return _store
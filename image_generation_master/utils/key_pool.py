@@ -0,0 +1,173 @@
+"""
+API Key 池
+同一供应商配置多个 API Key 时，按 未完成请求数 / 权重 最小的原则分配，
+遇到 401/403/429 的 Key 暂时摘除，冷却后自动恢复
+"""
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from .config_loader import get_config
+from .http_client import HttpStatusError
+from .rate_limiter import key_id
+from .retry import parse_retry_after
+
+
+class ApiKey:
+    """Key 池中的单个 API Key 及其使用统计"""
+
+    __slots__ = ("key", "weight", "id", "outstanding", "requests", "failures", "ejections", "ejected_until")
+
+    def __init__(self, key: str, weight: float = 1.0):
+        self.key = key
+        self.weight = weight if weight and weight > 0 else 1.0
+        self.id = key_id(key)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def available(self, now: float) -> bool:
+        """是否未被摘除"""
+        return now >= self.ejected_until
+
+
+class KeyPool:
+    """
+    单个供应商的 API Key 池
+
+    - 选择：可用 Key 中 outstanding / weight 最小者，相同时选累计请求数较少者
+    - 摘除：401/403 摘除 auth_cooldown 秒；429 按 Retry-After（没有时为 cooldown 秒）摘除
+    - 所有 Key 都被摘除时仍选择最早恢复的 Key，而不是直接失败
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        keys: List[Tuple[str, float]],
+        cooldown: float = 60.0,
+        auth_cooldown: float = 600.0
+    ):
+        self.provider = provider
+        self.cooldown = cooldown
+        self.auth_cooldown = auth_cooldown
+        self.keys = [ApiKey(key, weight) for key, weight in keys]
+
+    def acquire(self) -> ApiKey:
+        """选择一个 Key 并计入未完成请求"""
+        now = time.monotonic()
+        candidates = [k for k in self.keys if k.available(now)]
+        if candidates:
+            key = min(candidates, key=lambda k: (k.outstanding / k.weight, k.requests))
+        else:
+            key = min(self.keys, key=lambda k: k.ejected_until)
+        key.outstanding += 1
+        key.requests += 1
+        return key
+
+    def release(self, key: ApiKey, error: Optional[BaseException] = None):
+        """
+        归还 Key，并根据错误决定是否摘除
+
+        Args:
+            key: acquire() 返回的 Key
+            error: 本次调用的异常（成功时为 None）。Key 被摘除且仍有其他可用 Key 时，
+                   在异常上设置 key_rotated = True
+        """
+        key.outstanding -= 1
+        if error is None or not isinstance(error, HttpStatusError):
+            return
+        if error.status in (401, 403):
+            self._eject(key, self.auth_cooldown)
+        elif error.status == 429:
+            retry_after = parse_retry_after(error.headers.get("retry-after"))
+            self._eject(key, self.cooldown if retry_after is None else retry_after)
+        else:
+            return
+        # 还有其他可用 Key 时，Retry-After 只约束被摘除的 Key，重试无需等待
+        if any(k.available(time.monotonic()) for k in self.keys):
+            error.key_rotated = True
+
+    def _eject(self, key: ApiKey, duration: float):
+        key.failures += 1
+        if key.available(time.monotonic()):
+            key.ejections += 1
+        key.ejected_until = max(key.ejected_until, time.monotonic() + duration)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """返回每个 Key 的使用统计（以 Key 的短标识为键）"""
+        now = time.monotonic()
+        return {
+            key.id: {
+                "weight": key.weight,
+                "outstanding": key.outstanding,
+                "requests": key.requests,
+                "failures": key.failures,
+                "ejections": key.ejections,
+                "ejected_for": max(0.0, key.ejected_until - now),
+            }
+            for key in self.keys
+        }
+
+
+class KeyPoolRegistry:
+    """按供应商管理 Key 池，Key 列表变化时重建（保留未变化 Key 的统计）"""
+
+    def __init__(self):
+        self._pools: Dict[str, KeyPool] = {}
+        # 构建 Key 池时使用的列表对象：配置快照未变时传入的是同一个对象，无需逐项比较
+        self._sources: Dict[str, List[Tuple[str, float]]] = {}
+
+    def get(self, provider: str, keys: List[Tuple[str, float]]) -> Optional[KeyPool]:
+        """
+        获取供应商的 Key 池
+
+        Args:
+            provider: 供应商名称
+            keys: 当前配置的 (key, weight) 列表
+
+        Returns:
+            Optional[KeyPool]: 没有配置 Key 时返回 None
+        """
+        if not keys:
+            return None
+        pool = self._pools.get(provider)
+        if pool is not None and self._sources.get(provider) is keys:
+            return pool
+        self._sources[provider] = keys
+        if pool is not None and [(k.key, k.weight) for k in pool.keys] == list(keys):
+            return pool
+
+        config = get_config()
+        new_pool = KeyPool(
+            provider,
+            keys,
+            cooldown=config.get_key_cooldown(),
+            auth_cooldown=config.get_key_auth_cooldown()
+        )
+        if pool is not None:
+            # 保留未变化 Key 的统计和摘除状态
+            old = {k.key: k for k in pool.keys}
+            for index, key in enumerate(new_pool.keys):
+                if key.key in old:
+                    old[key.key].weight = key.weight
+                    new_pool.keys[index] = old[key.key]
+        self._pools[provider] = new_pool
+        return new_pool
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """返回所有供应商的 Key 使用统计"""
+        return {provider: pool.stats() for provider, pool in self._pools.items()}
+
+    def reset(self):
+        """清除所有 Key 池"""
+        self._pools.clear()
+        self._sources.clear()
+
+
+_registry = KeyPoolRegistry()
+
+
+def get_key_pools() -> KeyPoolRegistry:
+    """获取全局 Key 池注册表"""
+    return _registry
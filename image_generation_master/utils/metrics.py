@@ -0,0 +1,371 @@
+"""
+运行指标
+计数器、仪表盘和直方图，支持导出为 Prometheus 文本格式（text/plain; version=0.0.4）
+"""
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, Iterator, List
+
+from .http_client import HttpError, HttpTimeoutError
+
+
+# 生成耗时的直方图分桶（秒），覆盖几秒到十分钟超时
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# 排队等待的直方图分桶（秒）
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """带标签的指标基类"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple("" if labels[name] is None else str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def render(self) -> List[str]:
+        """返回该指标的文本格式行"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def reset(self):
+        self._values.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出定义和数据（可 JSON 序列化），用于跨进程汇总"""
+        return {
+            "type": self.type,
+            "documentation": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(key), value] for key, value in self._values.items()],
+        }
+
+    def merge(self, samples: List[Any]):
+        """把另一个进程的样本累加到本指标"""
+        for key, value in samples:
+            key = tuple(key)
+            self._values[key] = self._values.get(key, 0) + value
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘"""
+
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets=LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state["counts"][i] += 1
+                break
+        state["sum"] += value
+        state["count"] += 1
+
+    def get(self, **labels) -> Dict[str, Any]:
+        """返回 {"sum", "count"}，没有样本时为 0"""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return {"sum": 0.0, "count": 0}
+        return {"sum": state["sum"], "count": state["count"]}
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets[:-1])
+        return data
+
+    def merge(self, samples: List[Any]):
+        for key, state in samples:
+            key = tuple(key)
+            current = self._values.get(key)
+            if current is None:
+                self._values[key] = {"counts": list(state["counts"]), "sum": state["sum"], "count": state["count"]}
+                continue
+            current["counts"] = [a + b for a, b in zip(current["counts"], state["counts"])]
+            current["sum"] += state["sum"]
+            current["count"] += state["count"]
+
+    def _samples(self) -> Iterator[str]:
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(state['sum'])}"
+            yield f"{self.name}_count{labels} {state['count']}"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """导出所有指标的定义和数据（可 JSON 序列化）"""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshot: Dict[str, Dict[str, Any]], gauges: bool = True):
+        """
+        累加另一个进程导出的 snapshot()，用于多进程汇总
+
+        Args:
+            snapshot: snapshot() 的返回值
+            gauges: 是否合并仪表盘（已退出进程的进行中数量没有意义，合并时应传 False）
+        """
+        for name, data in snapshot.items():
+            if data["type"] == "gauge" and not gauges:
+                continue
+            metric = self._metrics.get(name)
+            if metric is None:
+                labelnames = tuple(data["labelnames"])
+                if data["type"] == "counter":
+                    metric = self.counter(name, data["documentation"], labelnames)
+                elif data["type"] == "gauge":
+                    metric = self.gauge(name, data["documentation"], labelnames)
+                elif data["type"] == "histogram":
+                    metric = self.histogram(name, data["documentation"], labelnames, data["buckets"])
+                else:
+                    continue
+            metric.merge(data["samples"])
+
+    def reset(self):
+        """清空所有指标的数据（指标定义保留）"""
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取全局指标注册表"""
+    return _registry
+
+
+def render_metrics() -> str:
+    """导出全部指标（Prometheus 文本格式）"""
+    return _registry.render()
+
+
+# === 内置指标 ===
+
+REQUESTS = _registry.counter(
+    "image_gen_requests_total", "生成请求数（按结果分类）", ("provider", "model", "outcome")
+)
+REQUEST_DURATION = _registry.histogram(
+    "image_gen_request_duration_seconds", "生成请求总耗时（含故障转移、重试）", ("provider", "model")
+)
+REQUESTS_IN_FLIGHT = _registry.gauge(
+    "image_gen_requests_in_flight", "进行中的生成请求数"
+)
+UPSTREAM_REQUESTS = _registry.counter(
+    "image_gen_upstream_requests_total", "发往供应商 API 的 HTTP 请求数（按结果分类）",
+    ("provider", "endpoint", "outcome")
+)
+UPSTREAM_DURATION = _registry.histogram(
+    "image_gen_upstream_duration_seconds", "单次供应商 API 调用耗时", ("provider", "endpoint")
+)
+UPSTREAM_IN_FLIGHT = _registry.gauge(
+    "image_gen_upstream_in_flight", "进行中的供应商 API 调用数", ("provider", "endpoint")
+)
+BYTES_SENT = _registry.counter(
+    "image_gen_upstream_sent_bytes_total", "发送的请求体字节数", ("provider", "endpoint")
+)
+BYTES_RECEIVED = _registry.counter(
+    "image_gen_upstream_received_bytes_total", "接收的响应体字节数", ("provider", "endpoint")
+)
+DOWNLOADS = _registry.counter(
+    "image_gen_downloads_total", "结果图片下载数（stored 新保存 / deduped 内容已存在 / error 失败）", ("outcome",)
+)
+DOWNLOAD_BYTES = _registry.counter(
+    "image_gen_download_bytes_total", "下载的结果图片字节数"
+)
+SINGLEFLIGHT_SHARED = _registry.counter(
+    "image_gen_singleflight_shared_total", "加入进行中的相同请求而节省的上游调用数", ("provider",)
+)
+ADAPTIVE_LIMIT = _registry.gauge(
+    "image_gen_adaptive_limit", "自适应并发的当前上限", ("provider", "model")
+)
+ADAPTIVE_WAITING = _registry.gauge(
+    "image_gen_adaptive_waiting", "等待自适应并发名额的调用数", ("provider", "model")
+)
+QUEUE_WAIT = _registry.histogram(
+    "image_gen_queue_wait_seconds", "调用 API 前在限流和并发控制中的排队时间", ("provider",),
+    buckets=WAIT_BUCKETS
+)
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    将异常归类为指标中的结果类型
+
+    Returns:
+        str: timeout / http_error / parse_error / error
+    """
+    if isinstance(error, HttpTimeoutError):
+        return "timeout"
+    if isinstance(error, HttpError):
+        return "http_error"
+    if isinstance(error, (json.JSONDecodeError, KeyError, IndexError, TypeError)):
+        return "parse_error"
+    return "error"
+
+
+class _UpstreamCall:
+    """一次供应商 API 调用的字节统计"""
+
+    __slots__ = ("provider", "endpoint")
+
+    def __init__(self, provider: str, endpoint: str):
+        self.provider = provider
+        self.endpoint = endpoint
+
+    def sent(self, size: int):
+        BYTES_SENT.inc(size, provider=self.provider, endpoint=self.endpoint)
+
+    def received(self, size: int):
+        BYTES_RECEIVED.inc(size, provider=self.provider, endpoint=self.endpoint)
+
+
+@contextmanager
+def track_upstream(provider: str, endpoint: str) -> Iterator[_UpstreamCall]:
+    """
+    统计一次供应商 API 调用的耗时、结果和进行中数量
+
+    使用示例：
+        with track_upstream("blt", "/v1/images/generations") as call:
+            call.sent(len(body))
+            ...
+    """
+    labels = {"provider": provider, "endpoint": endpoint}
+    UPSTREAM_IN_FLIGHT.inc(**labels)
+    start = time.monotonic()
+    outcome = "success"
+    try:
+        yield _UpstreamCall(provider, endpoint)
+    except Exception as e:
+        outcome = classify_error(e)
+        raise
+    except BaseException:
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(**labels)
+        UPSTREAM_DURATION.observe(time.monotonic() - start, **labels)
+        UPSTREAM_REQUESTS.inc(outcome=outcome, **labels)
+
+
+def observe_request(provider: Optional[str], model: Optional[str], outcome: str, duration: float):
+    """记录一次生成请求（skill.run 级别）"""
+    REQUESTS.inc(provider=provider or "unknown", model=model or "unknown", outcome=outcome)
+    REQUEST_DURATION.observe(duration, provider=provider or "unknown", model=model or "unknown")
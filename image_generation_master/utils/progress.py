@@ -0,0 +1,32 @@
+"""
+生成进度通知
+run_stream() 在当前上下文中登记进度接收函数，Provider 读取到进度帧时调用 emit()。
+接收函数通过 contextvars 传递，请求中创建的任务（重试、对冲、请求合并）会继承同一个接收函数。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable, Any, Iterator
+
+_sink: ContextVar[Optional[Callable[[Any], None]]] = ContextVar("progress_sink", default=None)
+
+
+def streaming() -> bool:
+    """当前请求是否有人接收进度（Provider 据此决定是否向上游请求进度帧）"""
+    return _sink.get() is not None
+
+
+def emit(event: Any):
+    """把进度事件交给当前请求的接收函数，没有接收函数时忽略"""
+    sink = _sink.get()
+    if sink is not None:
+        sink(event)
+
+
+@contextmanager
+def progress_sink(callback: Callable[[Any], None]) -> Iterator[None]:
+    """在当前上下文中登记进度接收函数（不能阻塞，也不应抛出异常）"""
+    token = _sink.set(callback)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
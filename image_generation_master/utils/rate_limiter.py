@@ -0,0 +1,266 @@
+"""
+客户端限流器
+按 供应商 + API Key（以及可选的模型）限制请求速率和并发数，超出时异步排队等待而不是直接失败
+"""
+import asyncio
+import hashlib
+import time
+from collections import deque
+from contextlib import asynccontextmanager, AsyncExitStack
+from typing import Optional, Dict, Any, List
+
+from .config_loader import get_config
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    以 rate 个/秒的速度补充令牌，最多积累 burst 个。令牌不足时预约未来的令牌并等待，
+    排队的请求按到达顺序依次放行。
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        预约一个令牌
+
+        Returns:
+            float: 需要等待的秒数（0 表示立即可用）
+        """
+        self._refill()
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    def refund(self):
+        """归还一个未使用的令牌（等待被取消时）"""
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    async def acquire(self):
+        """获取一个令牌，必要时等待"""
+        delay = self.reserve()
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.refund()
+                raise
+
+
+class ConcurrencyLimit:
+    """
+    并发数限制
+
+    与 asyncio.Semaphore 不同，不绑定创建时的事件循环，limit 可以在运行中调整。
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit 必须大于 0")
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        """排队中的请求数"""
+        return sum(1 for w in self._waiters if not w.done())
+
+    def _wake_waiter(self):
+        """唤醒一个排队的请求"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done() and not waiter.get_loop().is_closed():
+                waiter.set_result(None)
+                return
+
+    async def acquire(self):
+        """占用一个并发名额，名额已满时排队"""
+        loop = asyncio.get_running_loop()
+        while self.in_flight >= self.limit:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # 已被唤醒但放弃等待，把机会让给下一个
+                    self._wake_waiter()
+                raise
+        self.in_flight += 1
+
+    def set_limit(self, limit: int):
+        """调整并发上限，上限提高时唤醒相应数量的排队请求"""
+        self.limit = max(1, limit)
+        for _ in range(self.limit - self.in_flight):
+            self._wake_waiter()
+
+    def release(self):
+        """归还并发名额"""
+        self.in_flight -= 1
+        if self.in_flight < self.limit:
+            self._wake_waiter()
+
+
+class RateLimiter:
+    """
+    单个维度（API Key 或 API Key + 模型）的限流器
+
+    rps 和 max_concurrent 可以只设置其一，都不设置时不限流。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rps: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrent: Optional[int] = None
+    ):
+        self.name = name
+        self._bucket = TokenBucket(rps, burst) if rps else None
+        self._concurrency = ConcurrencyLimit(max_concurrent) if max_concurrent else None
+
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        获取许可，离开上下文时归还并发名额
+
+        Yields:
+            float: 本次排队等待的秒数
+        """
+        start = time.monotonic()
+        if self._bucket:
+            await self._bucket.acquire()
+        if self._concurrency:
+            await self._concurrency.acquire()
+        wait = time.monotonic() - start
+
+        self.acquired += 1
+        self.wait_seconds += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > 0.001:
+            self.waited += 1
+        try:
+            yield wait
+        finally:
+            if self._concurrency:
+                self._concurrency.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回限流统计（wait_seconds 为累计排队时间）"""
+        return {
+            "rps": self._bucket.rate if self._bucket else None,
+            "max_concurrent": self._concurrency.limit if self._concurrency else None,
+            "in_flight": self._concurrency.in_flight if self._concurrency else None,
+            "waiting": self._concurrency.waiting if self._concurrency else None,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_seconds": self.wait_seconds,
+            "max_wait": self.max_wait,
+        }
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """API Key 的短标识，用于统计标签（不暴露密钥本身）"""
+    if not api_key:
+        return "default"
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class RateLimiterRegistry:
+    """按 供应商 / API Key / 模型 管理限流器，配置来自 <provider>.rate_limit"""
+
+    def __init__(self):
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    def _get(self, name: str, settings: Dict[str, Any]) -> Optional[RateLimiter]:
+        if not settings.get("rps") and not settings.get("max_concurrent"):
+            return None
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = RateLimiter(
+                name,
+                rps=settings.get("rps"),
+                burst=settings.get("burst"),
+                max_concurrent=settings.get("max_concurrent")
+            )
+            self._limiters[name] = limiter
+        return limiter
+
+    def limiters_for(
+        self,
+        provider: str,
+        api_key: Optional[str],
+        model: Optional[str] = None
+    ) -> List[RateLimiter]:
+        """
+        返回一次调用需要经过的限流器（先模型级，后 Key 级）
+
+        Args:
+            provider: 供应商名称
+            api_key: 本次调用使用的 API Key
+            model: 模型名称
+        """
+        settings = get_config().get_rate_limit(provider)
+        if not settings:
+            return []
+        prefix = f"{provider}:{key_id(api_key)}"
+        limiters = []
+        model_settings = (settings.get("models") or {}).get(model) if model else None
+        if model_settings:
+            limiter = self._get(f"{prefix}:{model}", model_settings)
+            if limiter:
+                limiters.append(limiter)
+        limiter = self._get(prefix, settings)
+        if limiter:
+            limiters.append(limiter)
+        return limiters
+
+    @asynccontextmanager
+    async def acquire(self, provider: str, api_key: Optional[str], model: Optional[str] = None):
+        """
+        依次获取所有相关限流器的许可
+
+        Yields:
+            float: 总排队等待秒数
+        """
+        async with AsyncExitStack() as stack:
+            wait = 0.0
+            for limiter in self.limiters_for(provider, api_key, model):
+                wait += await stack.enter_async_context(limiter.acquire())
+            yield wait
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有限流器的统计"""
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+    def reset(self):
+        """清除所有限流器（配置变更后重新创建）"""
+        self._limiters.clear()
+
+
+_registry = RateLimiterRegistry()
+
+
+def get_rate_limiters() -> RateLimiterRegistry:
+    """获取全局限流器注册表"""
+    return _registry
@@ -0,0 +1,227 @@
+"""
+参考图片编码
+把本地文件或内存中的图片字节转换为 data URI，供接受 base64 图片的端点直接使用，省去先上传再引用的往返。
+编码结果按内容哈希缓存（LRU，按总字节数限制），批量任务中重复使用的参考图只编码一次；
+本地文件另按 (路径, 大小, 修改时间) 记录哈希，未变化的文件不会被再次读取。
+只有图片字节、os.PathLike 对象和显式的 file:// 字符串被视为本地参考图，其他字符串原样传给供应商。
+"""
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Union
+
+from .config_loader import get_config
+
+# 读取文件的块大小（3 的倍数，各块的 base64 编码可以直接拼接）
+READ_CHUNK_SIZE = 3 * 64 * 1024
+
+# 记录文件哈希的最大条目数
+MAX_FILE_ENTRIES = 4096
+
+# 本地文件路径字符串的前缀（其他字符串视为 URL，原样传给供应商）
+_FILE_PREFIX = "file://"
+
+# 文件头 -> MIME 类型
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+_SUFFIX_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".avif": "image/avif",
+}
+
+ReferenceImage = Union[str, bytes, bytearray, memoryview, os.PathLike]
+
+
+def _sniff(head: bytes, suffix: str = "") -> str:
+    """根据文件头（优先）或扩展名判断 MIME 类型"""
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return _SUFFIX_TYPES.get(suffix.lower(), "application/octet-stream")
+
+
+def is_local_reference(item: Any) -> bool:
+    """是否为需要编码的本地参考图（图片字节、os.PathLike 或 file:// 路径）"""
+    if isinstance(item, (bytes, bytearray, memoryview, os.PathLike)):
+        return True
+    return isinstance(item, str) and item.startswith(_FILE_PREFIX)
+
+
+def check_reference_paths(items: List[Any], allowed_dirs: List[str]):
+    """
+    检查 file:// 参考图是否位于允许的目录中（用于不受信任的输入，如常驻服务的 JSON 请求）
+
+    Args:
+        items: image_urls
+        allowed_dirs: 允许读取的目录列表，为空时拒绝所有本地路径
+
+    Raises:
+        ValueError: 包含不允许读取的本地路径
+    """
+    roots = [os.path.realpath(os.path.expanduser(d)) for d in allowed_dirs]
+    for item in items:
+        if not is_local_reference(item):
+            continue
+        if not isinstance(item, str):
+            raise ValueError("参考图片只能是 URL 或 file:// 路径")
+        path = os.path.realpath(os.path.expanduser(item[len(_FILE_PREFIX):]))
+        if not any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots):
+            raise ValueError(f"不允许读取的参考图片路径: {item}")
+
+
+class ReferenceEncoder:
+    """
+    参考图片编码器
+
+    data URI 按内容 sha256 缓存，缓存总大小超过 max_bytes 时淘汰最久未使用的条目。
+    可在线程池中并发调用：文件读取和编码在锁外进行，只有缓存读写持有锁。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._encoded: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        # (路径, 大小, 修改时间) -> sha256
+        self._files: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.encoded_bytes = 0
+
+    def encode(self, item: ReferenceImage) -> str:
+        """
+        将参考图转换为可放入请求载荷的字符串
+
+        Args:
+            item: URL（原样返回）、file:// 路径、os.PathLike 或图片字节
+
+        Returns:
+            str: URL 或 data URI
+
+        Raises:
+            FileNotFoundError: 本地文件不存在
+        """
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            return self._encode_bytes(bytes(item) if isinstance(item, memoryview) else item)
+        if isinstance(item, str):
+            if not item.startswith(_FILE_PREFIX):
+                return item
+            item = item[len(_FILE_PREFIX):]
+        return self._encode_file(Path(item).expanduser())
+
+    def _lookup(self, digest: str) -> Optional[str]:
+        with self._lock:
+            encoded = self._encoded.get(digest)
+            if encoded is not None:
+                self._encoded.move_to_end(digest)
+                self.hits += 1
+            return encoded
+
+    def _store(self, digest: str, encoded: str) -> str:
+        with self._lock:
+            self.misses += 1
+            self.encoded_bytes += len(encoded)
+            if len(encoded) > self.max_bytes:
+                # 超过缓存上限的图片不缓存
+                return encoded
+            if digest not in self._encoded:
+                self._encoded[digest] = encoded
+                self._size += len(encoded)
+            while self._size > self.max_bytes:
+                _, evicted = self._encoded.popitem(last=False)
+                self._size -= len(evicted)
+            return encoded
+
+    def _encode_bytes(self, data: Union[bytes, bytearray]) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        encoded = self._lookup(digest)
+        if encoded is None:
+            prefix = f"data:{_sniff(bytes(data[:16]))};base64,"
+            encoded = self._store(digest, prefix + base64.b64encode(data).decode("ascii"))
+        return encoded
+
+    def _encode_file(self, path: Path) -> str:
+        stat = path.stat()
+        if not path.is_file():
+            raise ValueError(f"参考图片不是文件: {path}")
+        file_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._files.get(file_key)
+        if digest is not None:
+            encoded = self._lookup(digest)
+            if encoded is not None:
+                return encoded
+
+        # 单次读取：逐块计算哈希并编码，最后只拼接一次字符串
+        hasher = hashlib.sha256()
+        parts: List[bytes] = []
+        head = b""
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if not head:
+                    head = chunk[:16]
+                hasher.update(chunk)
+                parts.append(base64.b64encode(chunk))
+        digest = hasher.hexdigest()
+        with self._lock:
+            if len(self._files) >= MAX_FILE_ENTRIES:
+                self._files.clear()
+            self._files[file_key] = digest
+
+        encoded = self._lookup(digest)
+        if encoded is None:
+            prefix = f"data:{_sniff(head, path.suffix)};base64,"
+            encoded = self._store(digest, prefix + b"".join(parts).decode("ascii"))
+        return encoded
+
+    def encode_all(self, items: List[ReferenceImage]) -> List[str]:
+        """转换一组参考图，顺序不变"""
+        return [self.encode(item) for item in items]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._encoded.clear()
+            self._files.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计"""
+        return {
+            "entries": len(self._encoded),
+            "cached_bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "encoded_bytes": self.encoded_bytes,
+        }
+
+
+_encoder: Optional[ReferenceEncoder] = None
+
+
+def get_reference_encoder() -> ReferenceEncoder:
+    """获取全局参考图编码器（首次调用时按配置创建）"""
+    global _encoder
+    if _encoder is None:
+        _encoder = ReferenceEncoder(max_bytes=get_config().get_reference_cache_max_bytes())
+    return _encoder
@@ -0,0 +1,287 @@
+"""
+生成结果缓存
+两级缓存：进程内 LRU（带 TTL）+ 跨进程共享的磁盘缓存（SQLite）
+缓存键由最终发往供应商的请求载荷计算，相同的 prompt/model/size/参考图只付费一次
+sqlite3 在首次访问磁盘缓存时才导入
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from .config_loader import get_config
+
+
+def make_cache_key(provider: str, endpoint: str, payload: Dict[str, Any]) -> str:
+    """
+    计算缓存键
+
+    Args:
+        provider: Provider 名称
+        endpoint: API 端点路径
+        payload: 经过参数标准化和适配器构建后的最终请求载荷
+
+    Returns:
+        str: sha256 十六进制摘要
+    """
+    canonical = json.dumps(
+        {"provider": provider, "endpoint": endpoint, "payload": payload},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """进程内 LRU 缓存，条目在 ttl 秒后过期"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取条目，过期或不存在返回 None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], expires_at: Optional[float] = None):
+        """写入条目，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (expires_at or time.time() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    基于 SQLite 的磁盘缓存
+    多个进程可以共享同一个数据库文件（WAL 模式）
+
+    其他进程持有写锁时 SQLite 最多等待 5 秒，异步调用方应通过 run() 在专用线程中访问，
+    避免阻塞事件循环上的其他请求。
+    """
+
+    def __init__(self, path: str, ttl: float = 3600):
+        self.path = Path(path).expanduser()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional["sqlite3.Connection"] = None
+        self._pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    async def run(self, fn, *args):
+        """在专用线程中执行磁盘操作（如 run(cache.get, key)）"""
+        # fork 后的子进程中，父进程的工作线程已不存在
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-cache")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> "sqlite3.Connection":
+        import sqlite3
+
+        # fork 后的子进程不能复用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        """
+        读取条目
+
+        Returns:
+            Optional[tuple]: (过期时间, 值)，过期或不存在返回 None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return row[1], json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """写入条目，同时顺带清理过期条目"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl)
+            )
+            conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+            conn.commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM results")
+            conn.commit()
+
+
+class ResultCache:
+    """
+    两级结果缓存
+
+    读取顺序：内存 -> 磁盘（命中后回填内存）；写入时两级同时写入。
+    只缓存成功的生成结果。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        ttl: float = 3600,
+        max_entries: int = 1024,
+        disk_path: Optional[str] = None
+    ):
+        self.enabled = enabled
+        self.memory = MemoryCache(max_entries=max_entries, ttl=ttl)
+        self.disk = DiskCache(disk_path, ttl=ttl) if disk_path else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的结果（磁盘层在当前线程中访问，供同步调用方使用）"""
+        value = self._get_memory(key)
+        if value is None and self.disk is not None:
+            value = self._fill(key, self._get_disk(key))
+        if value is None:
+            self.misses += 1
+        return value
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的结果：内存层同步读取，磁盘层在专用线程中访问，不阻塞事件循环"""
+        value = self._get_memory(key)
+        if value is None and self.disk is not None:
+            value = self._fill(key, await self.disk.run(self._get_disk, key))
+        if value is None:
+            self.misses += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """写入结果（磁盘层在当前线程中写入，供同步调用方使用）"""
+        self._set_memory(key, value)
+        if self.disk is not None:
+            self._set_disk(key, value)
+
+    async def aset(self, key: str, value: Dict[str, Any]):
+        """写入结果：内存层同步写入，磁盘层在专用线程中写入"""
+        self._set_memory(key, value)
+        if self.disk is not None:
+            await self.disk.run(self._set_disk, key, value)
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+        return value
+
+    def _get_disk(self, key: str) -> Optional[tuple]:
+        import sqlite3
+
+        try:
+            return self.disk.get(key)
+        except (sqlite3.Error, OSError, ValueError):
+            # 磁盘缓存不可用时退化为仅内存缓存
+            self.errors += 1
+            return None
+
+    def _fill(self, key: str, item: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        """磁盘命中后回填内存"""
+        if item is None:
+            return None
+        expires_at, value = item
+        self.memory.set(key, value, expires_at=expires_at)
+        self.disk_hits += 1
+        return value
+
+    def _set_memory(self, key: str, value: Dict[str, Any]):
+        self.sets += 1
+        self.memory.set(key, value)
+
+    def _set_disk(self, key: str, value: Dict[str, Any]):
+        import sqlite3
+
+        try:
+            self.disk.set(key, value)
+        except (sqlite3.Error, OSError, TypeError):
+            self.errors += 1
+
+    def clear(self):
+        """清空两级缓存"""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率等统计信息"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "sets": self.sets,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "errors": self.errors,
+        }
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """获取全局结果缓存（首次调用时按配置创建）"""
+    global _cache
+    if _cache is None:
+        config = get_config()
+        _cache = ResultCache(
+            enabled=config.get_cache_enabled(),
+            ttl=config.get_cache_ttl(),
+            max_entries=config.get_cache_max_entries(),
+            disk_path=config.get_cache_disk_path()
+        )
+    return _cache
@@ -0,0 +1,203 @@
+"""
+重试策略
+对可重试的错误（429/502/503/504、连接失败等）进行指数退避重试，支持 Retry-After 和重试预算
+"""
+import asyncio
+import random
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple, Iterable
+
+from .config_loader import get_config
+from .http_client import HttpStatusError, HttpConnectionError, HttpTimeoutError
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    Args:
+        value: 秒数（如 "5"）或 HTTP 日期（如 "Wed, 21 Oct 2015 07:28:00 GMT"）
+
+    Returns:
+        Optional[float]: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # 日期格式很少见，用到时才导入 email 包
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryBudget:
+    """
+    重试预算（令牌桶）
+
+    每个请求存入 ratio 个令牌，每次重试取出 1 个，令牌上限为 min_retries。
+    上游大面积故障时重试量被限制在请求量的 ratio 倍以内，避免重试风暴。
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        self.capacity = float(min_retries)
+        self._tokens = float(min_retries)
+
+    def deposit(self):
+        """记录一个新请求"""
+        self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """申请一次重试，预算不足返回 False"""
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class RetryPolicy:
+    """
+    重试策略
+
+    - 只重试可重试的错误：配置的状态码、连接失败，以及（可选）超时
+    - 退避时间为 [0, min(max_delay, base_delay * 2^n)] 内的随机值（full jitter）
+    - 有 Retry-After 时按其等待
+    - 单个请求的重试等待总时间不超过 max_elapsed
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_elapsed: float = 120.0,
+        statuses: Iterable[int] = (429, 502, 503, 504),
+        retry_on_timeout: bool = False,
+        budget: Optional[RetryBudget] = None
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.statuses = set(statuses)
+        self.retry_on_timeout = retry_on_timeout
+        self.budget = budget or RetryBudget()
+
+        self.calls = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """判断错误是否可以重试"""
+        if isinstance(error, HttpStatusError):
+            return error.status in self.statuses
+        if isinstance(error, HttpTimeoutError):
+            return self.retry_on_timeout
+        return isinstance(error, HttpConnectionError)
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的退避时间（full jitter）"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def next_delay(self, error: BaseException, attempt: int, elapsed: float) -> Optional[float]:
+        """
+        计算下一次重试前的等待时间
+
+        Args:
+            error: 本次失败的异常
+            attempt: 已经进行的尝试次数
+            elapsed: 本请求已用于等待重试的时间
+
+        Returns:
+            Optional[float]: 等待秒数，不应重试时返回 None
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return None
+
+        delay = None
+        # 已换用其他 API Key 时，Retry-After 只针对原来的 Key
+        if isinstance(error, HttpStatusError) and not getattr(error, "key_rotated", False):
+            delay = parse_retry_after(error.headers.get("retry-after"))
+        if delay is None:
+            delay = self.backoff(attempt)
+
+        if elapsed + delay > self.max_elapsed:
+            return None
+        if not self.budget.withdraw():
+            self.budget_exhausted += 1
+            return None
+        return delay
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, int]:
+        """
+        按策略执行并重试
+
+        Args:
+            fn: 每次尝试时调用的协程工厂
+
+        Returns:
+            Tuple[结果, 尝试次数]
+
+        Raises:
+            最后一次尝试的异常，其 attempts 属性为尝试次数
+        """
+        self.calls += 1
+        self.budget.deposit()
+        attempt = 0
+        waited = 0.0
+        while True:
+            attempt += 1
+            try:
+                return await fn(), attempt
+            except Exception as e:
+                delay = self.next_delay(e, attempt, waited)
+                if delay is None:
+                    e.attempts = attempt
+                    raise
+                self.retries += 1
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回重试统计"""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "budget_exhausted": self.budget_exhausted,
+        }
+
+
+_policies: Dict[str, RetryPolicy] = {}
+
+
+def get_retry_policy(provider: str) -> RetryPolicy:
+    """
+    获取供应商的重试策略（每个供应商独立的重试预算）
+
+    Args:
+        provider: 供应商名称
+    """
+    policy = _policies.get(provider)
+    if policy is None:
+        config = get_config()
+        policy = RetryPolicy(
+            max_attempts=config.get_retry_max_attempts(),
+            base_delay=config.get_retry_base_delay(),
+            max_delay=config.get_retry_max_delay(),
+            max_elapsed=config.get_retry_max_elapsed(),
+            statuses=config.get_retry_statuses(),
+            retry_on_timeout=config.get_retry_on_timeout(),
+            budget=RetryBudget(ratio=config.get_retry_budget_ratio())
+        )
+        _policies[provider] = policy
+    return policy
@@ -0,0 +1,95 @@
+"""
+并发请求合并（single-flight）
+同一时刻相同键的多个调用只执行一次，其余调用等待并共享结果
+"""
+import asyncio
+from typing import Dict, Any, Callable, Awaitable, Tuple
+
+
+class _Call:
+    """一次进行中的调用及其等待者计数"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    进行中请求合并器
+
+    首个调用者（leader）真正执行，后续相同键的调用者等待同一个任务。
+    任务独立于单个调用者运行：leader 被取消不影响其他等待者，
+    只有所有等待者都放弃时才取消上游调用。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入相同键的进行中调用
+
+        Args:
+            key: 合并键
+            fn: 真正执行调用的协程工厂
+
+        Returns:
+            Tuple[结果, 是否为合并的调用]
+
+        Raises:
+            与 fn 相同的异常（所有等待者都会收到）
+        """
+        loop = asyncio.get_running_loop()
+        call = self._calls.get(key)
+        shared = (
+            call is not None
+            and not call.task.done()
+            and call.task.get_loop() is loop
+        )
+
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            call = _Call(loop.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda t, k=key, c=call: self._forget(k, c))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call):
+        """任务结束后移除键（可能已被新任务替换）"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 避免无人等待时出现 "exception was never retrieved" 警告
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """返回合并统计：coalesced 即节省的上游调用次数"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+_singleflight = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    """获取全局请求合并器"""
+    return _singleflight
@@ -0,0 +1,159 @@
+"""
+SSE（Server-Sent Events）增量解析器
+按块喂入字节流，逐帧产出事件，内存占用只与单帧大小相关
+"""
+from typing import Optional, List, AsyncIterator
+
+# 单个事件（含未完成的行）的默认大小上限（字节）
+MAX_EVENT_BYTES = 1024 * 1024
+
+
+class SSEEventTooLarge(ValueError):
+    """单个事件超过大小上限（例如服务端持续发送 data 行却从不发送空行分隔）"""
+
+
+class SSEEvent:
+    """一个 SSE 事件帧"""
+
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, data: str, event: str = "message", id: Optional[str] = None):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    @property
+    def is_done(self) -> bool:
+        """是否为 [DONE] 结束标记"""
+        return self.data.strip() == "[DONE]"
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data[:60]!r})"
+
+
+class SSEDecoder:
+    """
+    SSE 增量解码器
+
+    使用示例：
+        decoder = SSEDecoder()
+        for chunk in chunks:
+            for event in decoder.feed(chunk):
+                handle(event)
+        for event in decoder.flush():
+            handle(event)
+
+    行尾支持 \\n 和 \\r\\n；字段遵循 SSE 规范（data/event/id，":" 开头为注释）。
+    单个事件累积的数据或未完成的行超过 max_event_bytes 时抛出 SSEEventTooLarge，
+    保证内存占用不随流长度增长。
+    """
+
+    def __init__(self, max_event_bytes: int = MAX_EVENT_BYTES):
+        self.max_event_bytes = max_event_bytes
+        self._buffer = bytearray()
+        # 缓冲区中已确认不含换行符的前缀长度，避免长行被反复扫描
+        self._scanned = 0
+        self._data_lines: List[str] = []
+        self._data_size = 0
+        self._event = "message"
+        self._id: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """
+        喂入一段字节
+
+        Args:
+            chunk: 任意切分的响应体片段
+
+        Returns:
+            List[SSEEvent]: 本次片段中完成的事件
+        """
+        self._buffer += chunk
+        events = []
+        start = 0
+        search_from = self._scanned
+        while True:
+            end = self._buffer.find(b"\n", search_from)
+            if end < 0:
+                break
+            search_from = end + 1
+            line = self._buffer[start:end]
+            start = end + 1
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            event = self._process_line(line.decode("utf-8", errors="replace"))
+            if event is not None:
+                events.append(event)
+        # 只保留未完成的半行
+        del self._buffer[:start]
+        self._scanned = len(self._buffer)
+        if len(self._buffer) > self.max_event_bytes:
+            raise SSEEventTooLarge(f"SSE 行超过 {self.max_event_bytes} 字节仍未结束")
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """
+        流结束时调用，产出尚未以空行结束的最后一个事件
+        """
+        events = []
+        if self._buffer:
+            event = self._process_line(self._buffer.decode("utf-8", errors="replace"))
+            self._buffer.clear()
+            self._scanned = 0
+            if event is not None:
+                events.append(event)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(self, line: str) -> Optional[SSEEvent]:
+        """处理一行，遇到空行时分发事件"""
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None
+
+        field, sep, value = line.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+
+        if field == "data":
+            self._data_size += len(value) + 1
+            if self._data_size > self.max_event_bytes:
+                raise SSEEventTooLarge(f"SSE 事件超过 {self.max_event_bytes} 字节仍未结束")
+            self._data_lines.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            self._id = value
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        """用已累积的字段生成事件"""
+        if not self._data_lines:
+            self._event = "message"
+            return None
+        event = SSEEvent("\n".join(self._data_lines), self._event, self._id)
+        self._data_lines = []
+        self._data_size = 0
+        self._event = "message"
+        return event
+
+
+async def iter_sse_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[SSEEvent]:
+    """
+    将异步字节流转换为 SSE 事件流
+
+    Args:
+        chunks: 响应体片段的异步迭代器（如 HttpResponse.iter_chunks()）
+
+    Yields:
+        SSEEvent: 解析出的事件
+    """
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
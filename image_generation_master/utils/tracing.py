@@ -0,0 +1,195 @@
+"""
+请求追踪
+以 span 记录一次生成请求各阶段（配置、路由、参数构建、DNS/连接/TLS、首字节、响应体、解析）的耗时，
+通过 contextvars 在协程和子任务间传递父子关系，导出器可替换（内存 / JSONL 文件 / 自定义）
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, List
+
+from .config_loader import get_config
+
+
+class Span:
+    """一个追踪片段"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes", "error", "_t0"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._t0 = time.monotonic()
+
+    def set_attribute(self, key: str, value: Any):
+        """设置属性"""
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.monotonic() - self._t0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空 span"""
+
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("image_generation_span", default=None)
+
+
+class InMemoryExporter:
+    """保存在内存中的导出器（最多保留 max_spans 个），适合测试和调试"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self.spans.append(span.to_dict())
+
+    def get_trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        """返回某个追踪的所有 span（按开始时间排序）"""
+        return sorted((s for s in self.spans if s["trace_id"] == trace_id), key=lambda s: s["start"])
+
+    def clear(self):
+        self.spans.clear()
+
+
+class JsonlExporter:
+    """每个 span 写一行 JSON 到文件"""
+
+    def __init__(self, path: str):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            # fork 后的子进程重新打开文件
+            if self._file is None or self._pid != os.getpid():
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """追踪器，exporter 为 None 时不记录"""
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """
+        开启一个 span，在当前 span 之下；没有当前 span 时开启新的追踪
+
+        使用示例：
+            with tracer.span("build_request", model=model) as span:
+                ...
+                span.set_attribute("size", size)
+        """
+        exporter = self.exporter
+        if exporter is None:
+            yield _NOOP_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(
+            name,
+            parent.trace_id if parent else os.urandom(16).hex(),
+            parent.span_id if parent else None,
+            attributes
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            exporter.export(span)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def _create_exporter():
+    config = get_config()
+    if not config.get_tracing_enabled():
+        return None
+    if config.get_tracing_exporter() == "jsonl":
+        return JsonlExporter(config.get_tracing_path())
+    return InMemoryExporter()
+
+
+def get_tracer() -> Tracer:
+    """获取全局追踪器（首次调用时按配置创建）"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(_create_exporter())
+    return _tracer
+
+
+def set_exporter(exporter):
+    """
+    替换导出器（None 表示关闭追踪）
+
+    自定义导出器只需实现 export(span) 方法，span.to_dict() 可得到可序列化的字典。
+    """
+    get_tracer().exporter = exporter
+
+
+def span(name: str, **attributes):
+    """使用全局追踪器开启一个 span（见 Tracer.span）"""
+    return get_tracer().span(name, **attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    """返回当前追踪的 ID，不在追踪中时返回 None"""
+    current = _current_span.get()
+    return current.trace_id if current else None